@@ -1,73 +1,101 @@
 import asyncio
-import configparser
 import sys
-import tkinter as tk
 
 import qasync
 from PyQt5.QtWidgets import QApplication
 
-from src.serial_communication_async import (
+from src.acquisition import (
+    create_bus,
+    create_processor,
+    create_recorder,
+    create_source,
+    display_device,
+    display_policy,
+    load_config,
+)
+from src.broadcast import publish_batches
+from src.decimation import decimation_setting
+from src.gui import (
     AngularPlotter,
-    AsyncSerialManager,
     CombinedPlotter,
-    DataProcessor,
     DirectionPlotter,
     MainWindow,
     update_plots,
 )
+from src.log_config import configure_logging_from_config
+from src.metrics import pipeline_registry, start_metrics_server, stop_metrics_server
+from src.net_stream import start_stream_server, stop_stream_server
 
-config = configparser.ConfigParser()
-config.read("config/config.ini")
+config = load_config("config/config.ini")
 
-port = config.get("serial_set", "portname")
-baudrate = config.get("serial_set", "baudrate")
-timeout = config.get("serial_set", "timeout")
-stopbits = config.get("serial_set", "stopbits")
-bytesize = config.get("serial_set", "bytesize")
-parity = config.get("serial_set", "parity")
-xonxoff = config.get("serial_set", "xonxoff")
-read_wait_time = config.get("serial_set", "readwait")
+plot_history = config.getint("plot_set", "history", fallback=100)
+plot_blit = config.getboolean("plot_set", "blit", fallback=False)
+plot_options = decimation_setting(config)
 
 
 async def main():
-    asyncserialmanager = AsyncSerialManager(
-        port=port,
-        baudrate=baudrate,
-        waittime=float(read_wait_time),
-        bytesize=int(bytesize),
-        stopbits=int(stopbits),
-        parity=parity,
-        timeout=int(timeout),
-        xonxoff=bool(xonxoff),
-    )
-    dataprocessor = DataProcessor(asyncserialmanager.result_queue)
+    recorder = create_recorder(config)
+    asyncserialmanager = create_source(config, recorder)
+    dataprocessor = create_processor(config, asyncserialmanager)
+    # 解析したバッチはバスで配信し、プロットはその購読者の一つとして読む
+    bus = create_bus(config)
+    plot_subscription = bus.subscribe("plot", policy=display_policy(config))
 
     # シリアル通信のタスクを開始
     task = asyncio.create_task(asyncserialmanager.run())
 
     direction_plotter = DirectionPlotter()
-    angular_plotter = AngularPlotter()
+    angular_plotter = AngularPlotter(history=plot_history, **plot_options)
 
     combined_plotter = CombinedPlotter(
         angular_plotter,
         direction_plotter,
         [],
         [],
+        blit=plot_blit,
+        tracer=dataprocessor.tracer,
     )
 
-    # プロットの更新タスクを開始
-    update_task = asyncio.create_task(update_plots(combined_plotter, dataprocessor))
+    # 解析とプロットの更新タスクを開始
+    update_task = asyncio.gather(
+        publish_batches(dataprocessor, bus),
+        update_plots(combined_plotter, plot_subscription, display_device(config)),
+    )
+
+    # [stream] のポートを設定すると、解析済みのサンプルを他のマシンへ配信する
+    stream_server = await start_stream_server(config, bus)
+    metrics_server = await start_metrics_server(
+        config,
+        pipeline_registry(
+            asyncserialmanager, dataprocessor, combined_plotter, bus, stream_server
+        ),
+    )
 
     main_window = MainWindow(combined_plotter, task, update_task)
     main_window.show()
 
     # シリアル通信とプロット更新のタスクを待機
-    await asyncio.gather(task, update_task)
-
-    await asyncserialmanager.close_connection()
+    # (ウィンドウを閉じるとキャンセルされるので、後始末はfinallyで行う)
+    try:
+        await asyncio.gather(task, update_task)
+    finally:
+        task.cancel()
+        update_task.cancel()
+        await asyncio.gather(task, update_task, return_exceptions=True)
+        await asyncserialmanager.close_connection()
+        await stop_stream_server(stream_server)
+        await stop_metrics_server(metrics_server)
+        if recorder is not None:
+            await recorder.aclose()
 
 
 if __name__ == "__main__":
+    if config.getboolean("plot_set", "process", fallback=False):
+        # 取得・解析とGUIを別プロセスで動かす
+        from src.gui_process import main as run_in_separate_process
+
+        sys.exit(run_in_separate_process())
+    configure_logging_from_config(config)
     app = QApplication(sys.argv)
     loop = qasync.QEventLoop(app)
     asyncio.set_event_loop(loop)
@@ -0,0 +1,377 @@
+"""
+HWT905パイプラインのベンチマーク
+
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.run_benchmarks --capture captures/session.bin --compare results.json
+
+Results are written as JSON so runs of different versions can be compared.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from src.capture import CaptureReader
+from src.checksum import ALGORITHMS, verify_frames
+from src.decimation import DECIMATION_METHODS, LevelOfDetail
+from src.filters import (
+    AngleUnwrapper,
+    ComplementaryFilter,
+    ExponentialMovingAverage,
+    KalmanFilter,
+    MovingAverage,
+)
+from src.hwt905_ttl_dataparser import HWT905_TTL_Dataparser, HWT905StreamDecoder
+from src.net_stream import (
+    DATAGRAM_SIZE,
+    HEADER,
+    TCP_PAYLOAD,
+    DeviceTable,
+    encode_batch,
+    packetize,
+)
+from src.ring_buffer import RingBuffer
+from src.serial_communication_async import DataParser, DataProcessor
+from src.text_framing import TextFramer
+
+# 前回の結果から この割合以上遅くなったものを回帰として報告する
+REGRESSION_THRESHOLD = 0.10
+
+
+def synthetic_stream(frames: int, seed: int = 0) -> bytes:
+    """Build a stream cycling through 0x51-0x54 frames with random payloads."""
+    rng = np.random.default_rng(seed)
+    payloads = rng.integers(-32768, 32767, size=(frames, 4), dtype=np.int16)
+    types = 0x51 + np.arange(frames) % 4
+    return b"".join(
+        HWT905_TTL_Dataparser.build_frame(int(t), p.astype("<i2").tobytes())
+        for t, p in zip(types, payloads)
+    )
+
+
+def chunked(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def best_of(func, repeat: int = 5) -> float:
+    """Return the fastest of several runs in seconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def async_best_of(coroutine_function, repeat: int = 5) -> float:
+    """best_of for coroutines; the event loop setup is not timed."""
+
+    async def run():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await coroutine_function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    return asyncio.run(run())
+
+
+def bench_parsers(stream: bytes, chunk_size: int = 66):
+    frames = len(stream) // 11
+    # The legacy scanners fail on frames split across chunks, so chunks stay aligned.
+    chunks = chunked(stream, chunk_size)
+    results = {}
+
+    def legacy():
+        for chunk in chunks:
+            HWT905_TTL_Dataparser.protocol_angular_output(chunk)
+            HWT905_TTL_Dataparser.protocol_magnetic_field_output(chunk)
+
+    def streaming():
+        decoder = HWT905StreamDecoder()
+        for chunk in chunks:
+            decoder.feed(chunk)
+
+    results["parser.protocol_output.frames_per_s"] = frames / best_of(legacy)
+    results["parser.stream_decoder.frames_per_s"] = frames / best_of(streaming)
+    results["parser.decode_block.frames_per_s"] = frames / best_of(
+        lambda: HWT905_TTL_Dataparser.decode_block(stream)
+    )
+    return results
+
+
+def bench_checksums(stream: bytes):
+    frames = len(stream) // 11
+    results = {}
+    for name, algorithm in sorted(ALGORITHMS.items()):
+        results[f"checksum.{name}_batch.frames_per_s"] = frames / best_of(
+            lambda: algorithm.batch(stream, 11)
+        )
+    results["checksum.verify_frames.frames_per_s"] = frames / best_of(
+        lambda: verify_frames(stream, frame_length=11)
+    )
+    return results
+
+
+def bench_decimation(samples: int = 720_000, points: int = 1000):
+    """One hour of 200 Hz angles: level upkeep per sample and cost per redraw."""
+    columns = ("roll", "pitch", "yaw")
+    t = np.arange(samples) / 200.0
+    block = np.vstack((t, np.sin(t), np.cos(t), t % 7))
+
+    def fill():
+        history = RingBuffer(samples, ("time",) + columns)
+        lod = LevelOfDetail(history, columns)
+        for start in range(0, samples, 200):
+            history.extend(block[:, start : start + 200])
+            lod.update(200)
+        return lod
+
+    lod = fill()
+    results = {"decimation.update.samples_per_s": samples / best_of(fill, repeat=3)}
+    for method in DECIMATION_METHODS:
+        results[f"decimation.{method}.redraws_per_s"] = 1 / best_of(
+            lambda: lod.decimate(points, method)
+        )
+    return results
+
+
+def bench_filters(samples: int = 200_000):
+    rng = np.random.default_rng(0)
+    rates = rng.normal(size=(3, samples))
+    references = rng.normal(size=(3, samples))
+    results = {}
+    for name, item in (
+        ("unwrap", AngleUnwrapper()),
+        ("moving_average", MovingAverage(5)),
+        ("ema", ExponentialMovingAverage(0.2)),
+    ):
+        results[f"filters.{name}.samples_per_s"] = samples / best_of(
+            lambda: item.process(references)
+        )
+    for name, item in (
+        ("complementary", ComplementaryFilter()),
+        ("kalman", KalmanFilter()),
+    ):
+        results[f"filters.{name}.samples_per_s"] = samples / best_of(
+            lambda: item.process(rates, references)
+        )
+    return results
+
+
+def bench_stream_encoding(stream: bytes):
+    """Decoded records to TCP and UDP packets, done once per batch for all clients."""
+    batch = {None: HWT905StreamDecoder().decode(stream)}
+    samples = len(batch[None])
+
+    def encode():
+        encoded = encode_batch(batch, DeviceTable())
+        packetize(encoded, 0, TCP_PAYLOAD)
+        packetize(encoded, 0, DATAGRAM_SIZE - HEADER.size)
+
+    return {"stream.encode.samples_per_s": samples / best_of(encode)}
+
+
+def bench_data_parser(count: int = 20000):
+    sentence = b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n"
+    byte_list = [sentence[i : i + 1] for i in range(len(sentence))]
+
+    async def parity():
+        for _ in range(count):
+            await DataParser.parity_check(sentence, b"$", b"*")
+
+    async def ascii():
+        for _ in range(count):
+            await DataParser.byte_to_ascii(byte_list)
+
+    stream = sentence * count
+
+    def framing():
+        framer = TextFramer.nmea()
+        view = memoryview(stream)
+        for i in range(0, len(stream), 64):
+            framer.feed(view[i : i + 64])
+
+    return {
+        "data_parser.parity_check.calls_per_s": count / async_best_of(parity),
+        "data_parser.byte_to_ascii.calls_per_s": count / async_best_of(ascii),
+        "text_framer.nmea.sentences_per_s": count / best_of(framing),
+    }
+
+
+def bench_queue(stream: bytes, chunk_size: int = 66):
+    chunks = chunked(stream, chunk_size)
+
+    async def pump():
+        queue = asyncio.Queue()
+        processor = DataProcessor(queue)
+
+        async def produce():
+            for chunk in chunks:
+                await queue.put(chunk)
+
+        async def consume():
+            for _ in chunks:
+                await processor.read_sensor_data()
+
+        await asyncio.gather(produce(), consume())
+
+    async def pump_batches():
+        queue = asyncio.Queue()
+        processor = DataProcessor(queue)
+        for chunk in chunks:
+            queue.put_nowait(chunk)
+        # The whole backlog is drained and decoded in one wakeup.
+        while not queue.empty():
+            await processor.read_batch()
+
+    seconds = async_best_of(pump)
+    batch_seconds = async_best_of(pump_batches)
+    return {
+        "queue.data_processor.chunks_per_s": len(chunks) / seconds,
+        "queue.data_processor.frames_per_s": len(stream) // 11 / seconds,
+        "queue.data_processor.batch_frames_per_s": len(stream) // 11 / batch_seconds,
+    }
+
+
+def bench_pty_latency(samples: int = 200, interval: float = 0.005):
+    """Byte arrival to plot update latency over a pseudo terminal loopback."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+
+    from src.gui import AngularPlotter
+    from src.replay import PtyReplay
+    from src.serial_communication_async import AsyncSerialManager
+
+    async def run():
+        # The replay is only used for its pty; frames are written directly.
+        pty = PtyReplay(os.devnull)
+        manager = AsyncSerialManager(pty.port, 115200, event_driven=True)
+        processor = DataProcessor(manager.result_queue)
+        plotter = AngularPlotter(history=samples)
+        plotter.set_ax(Figure().add_subplot())
+        sent = {}
+        latencies = []
+        if not await manager.open_serial_connection():
+            raise RuntimeError("failed to open pty")
+
+        async def produce():
+            for seq in range(samples):
+                # The sequence number travels in the yaw field.
+                frame = HWT905_TTL_Dataparser.build_frame(
+                    0x53, b"\x00\x00\x00\x00" + seq.to_bytes(2, "little")
+                )
+                sent[seq] = time.perf_counter()
+                await pty.write(frame)
+                await asyncio.sleep(interval)
+
+        async def consume():
+            received = set()
+            while len(received) < samples:
+                # One pty read may carry several frames; every one is matched.
+                await processor.read_batch()
+                if not plotter.add_records(processor.records):
+                    continue
+                plotter.update_plot(None)
+                now = time.perf_counter()
+                for record in processor.records:
+                    seq = round(record.yaw * 32768 / 180)
+                    if seq not in received:
+                        received.add(seq)
+                        latencies.append(now - sent[seq])
+
+        try:
+            await asyncio.wait_for(asyncio.gather(produce(), consume()), 30)
+        finally:
+            manager.transport.close()
+            pty.close()
+        return latencies
+
+    latencies = np.array(asyncio.run(run())) * 1000
+    return {
+        "e2e.pty_latency.p50_ms": float(np.percentile(latencies, 50)),
+        "e2e.pty_latency.p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD):
+    """Print the change against a previous run and return the regressions."""
+    regressions = []
+    for name, value in sorted(results.items()):
+        old = baseline.get(name)
+        if not old:
+            print(f"{name:45s} {value:14.2f}")
+            continue
+        # Latencies get better when smaller, rates when larger.
+        lower_is_better = name.endswith("_ms")
+        change = (old - value) / old if lower_is_better else (value - old) / old
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:45s} {value:14.2f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run")
+    parser.add_argument("--capture", help="use a recorded capture instead of synthetic data")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--skip-pty", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.capture:
+        with CaptureReader(args.capture) as reader:
+            stream = reader.read()
+    else:
+        stream = synthetic_stream(args.frames)
+
+    results = {}
+    results.update(bench_parsers(stream))
+    results.update(bench_checksums(stream))
+    results.update(bench_data_parser())
+    results.update(bench_decimation())
+    results.update(bench_filters())
+    results.update(bench_stream_encoding(stream))
+    results.update(bench_queue(stream))
+    if not args.skip_pty and hasattr(os, "openpty"):
+        results.update(bench_pty_latency())
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "source": args.capture or f"synthetic:{args.frames}",
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+    else:
+        compare(results, {})
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,17 +2,21 @@
 シリアル通信モジュール
 """
 
+from .capture import CaptureReader, CaptureWriter
 from .constants import ascii_control_codes
-from .hwt905_ttl_dataparser import HWT905_TTL_Dataparser
+from .hwt905_records import HWT905Record, decode_frame
+from .hwt905_ttl_dataparser import (
+    HWT905_TTL_Dataparser,
+    HWT905FrameBlock,
+    HWT905StreamDecoder,
+)
+from .multi_device import MultiDeviceManager
+from .replay import CaptureReplaySource
 from .serial_communication_async import (
-    AngularPlotter,
     AsyncSerialManager,
-    CombinedPlotter,
     DataParser,
     DataProcessor,
-    DirectionPlotter,
-    MainWindow,
-    update_plots,
+    DeviceChunk,
 )
 
 __all__ = [
@@ -23,8 +27,40 @@ __all__ = [
     "CombinedPlotter",
     "ascii_control_codes",
     "HWT905_TTL_Dataparser",
+    "HWT905StreamDecoder",
+    "HWT905FrameBlock",
+    "HWT905Record",
+    "decode_frame",
     "DataProcessor",
+    "CaptureWriter",
+    "CaptureReader",
+    "CaptureReplaySource",
+    "PtyReplay",
+    "MultiDeviceManager",
+    "DeviceChunk",
     "MainWindow",
     "update_plots",
     "constans",
 ]
+
+# GUIのクラスは参照されたときにだけ読み込む (matplotlib/PyQt5なしでも取得・解析は動く)
+_GUI_NAMES = (
+    "AngularPlotter",
+    "DirectionPlotter",
+    "CombinedPlotter",
+    "MainWindow",
+    "update_plots",
+)
+
+
+def __getattr__(name):
+    if name in _GUI_NAMES:
+        from . import gui
+
+        return getattr(gui, name)
+    # 疑似端末はUnixのみなので、使うときにだけ読み込む
+    if name == "PtyReplay":
+        from .replay import PtyReplay
+
+        return PtyReplay
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,115 @@
+import configparser
+import logging
+
+from src.broadcast import BroadcastBus
+from src.capture import CaptureWriter
+from src.filters import stage_factory
+from src.hwt905_commands import baudrate_setting, sensor_settings
+from src.multi_device import DEVICE_SECTION_PREFIX, MultiDeviceManager
+from src.receive_queue import BLOCK, DROP_OLDEST
+from src.replay import CaptureReplaySource
+from src.serial_communication_async import AsyncSerialManager, DataProcessor
+from src.timing import LatencyTracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = "config/config.ini"
+
+
+# 設定ファイルから受信側 (シリアルポート、複数デバイス、リプレイ、キャプチャ) を組み立てる関数群。
+# GUIアプリとヘッドレスアプリで共通に使い、matplotlib/PyQt5には依存しない。
+def load_config(path=DEFAULT_CONFIG_PATH) -> configparser.ConfigParser:
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config
+
+
+def device_sections(config):
+    return [
+        section
+        for section in config.sections()
+        if section.startswith(DEVICE_SECTION_PREFIX)
+    ]
+
+
+def display_device(config):
+    """Device shown by the GUI: [plot_set] device, else the first [device:*]."""
+    device = config.get("plot_set", "device", fallback="") or None
+    sections = device_sections(config)
+    if device is None and sections:
+        device = sections[0][len(DEVICE_SECTION_PREFIX) :]
+    return device
+
+
+def display_policy(config):
+    """Lag policy of the GUI's bus subscription: [plot_set] overflow."""
+    return config.get("plot_set", "overflow", fallback=DROP_OLDEST)
+
+
+def create_recorder(config):
+    """Return a CaptureWriter when [capture] path is set, otherwise None."""
+    path = config.get("capture", "path", fallback="")
+    # キャプチャは単一デバイスの生データのみ記録する
+    if not path or config.get("replay", "path", fallback="") or device_sections(config):
+        return None
+    return CaptureWriter(
+        path, index_interval=config.getfloat("capture", "indexinterval", fallback=0.1)
+    )
+
+
+def create_source(config, recorder=None):
+    """Build the object that fills result_queue: a replay, several ports or one port."""
+    replay_path = config.get("replay", "path", fallback="")
+    high_water = config.getint("serial_set", "highwater", fallback=64)
+    # Raw chunks are never dropped: a lost chunk would splice the end of one
+    # frame onto an unrelated one in the decoder. Displays skip decoded
+    # batches on the bus instead (display_policy).
+    overflow = config.get("serial_set", "overflow", fallback=BLOCK)
+    if overflow != BLOCK:
+        logger.warning(
+            "[serial_set] overflow = %s is ignored; use [plot_set] overflow", overflow
+        )
+    queue = {"queue_size": config.getint("serial_set", "queuesize", fallback=0)}
+    if replay_path:
+        # センサーの代わりに記録済みのキャプチャを流す (speed = 0 で待ち時間なし)
+        return CaptureReplaySource(
+            replay_path, speed=config.getfloat("replay", "speed", fallback=1.0), **queue
+        )
+    if device_sections(config):
+        # [device:<id>] セクションがあれば、すべてのポートを一つのループで開く
+        return MultiDeviceManager.from_config(config, high_water=high_water, **queue)
+    return AsyncSerialManager(
+        port=config.get("serial_set", "portname"),
+        baudrate=baudrate_setting(config, "serial_set"),
+        waittime=config.getfloat("serial_set", "readwait", fallback=0.1),
+        bytesize=config.getint("serial_set", "bytesize", fallback=8),
+        stopbits=config.getint("serial_set", "stopbits", fallback=1),
+        parity=config.get("serial_set", "parity", fallback="N"),
+        timeout=config.getint("serial_set", "timeout", fallback=None),
+        xonxoff=config.getboolean("serial_set", "xonxoff", fallback=False),
+        event_driven=config.getboolean("serial_set", "eventdriven", fallback=False),
+        high_water=high_water,
+        recorder=recorder,
+        **queue,
+        **sensor_settings(config, "serial_set"),
+    )
+
+
+def create_processor(config, source):
+    """DataProcessor for source; [serial_set] sensortime aligns records to the
+    sensor clock, [metrics] trace records per-stage latencies and [filter]
+    sets the filter stages."""
+    tracer = None
+    if config.getboolean("metrics", "trace", fallback=False):
+        tracer = LatencyTracer()
+    return DataProcessor(
+        source.result_queue,
+        align_to_sensor=config.getboolean("serial_set", "sensortime", fallback=False),
+        tracer=tracer,
+        stage_factory=stage_factory(config),
+    )
+
+
+def create_bus(config):
+    """BroadcastBus holding the last [bus] capacity batches for the consumers."""
+    return BroadcastBus(config.getint("bus", "capacity", fallback=256))
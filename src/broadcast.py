@@ -0,0 +1,160 @@
+import asyncio
+import typing
+
+from src.receive_queue import BLOCK, DROP_OLDEST, LATEST, OVERFLOW_POLICIES
+
+
+# 解析済みのバッチを複数の購読者へ配信するバス。
+# バッチは共有のリングに一度だけ格納し、各購読者は自分のカーソルで読み進める (コピーしない)。
+# 遅れたときの動作は購読者ごとに選ぶので、遅い購読者が速い購読者を止めることはない。
+# blockを選んだ購読者だけは、追いつくまでpublishを待たせる。
+class BroadcastBus:
+    def __init__(self, capacity: int = 256) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._batches = [None] * capacity
+        # Sequence number of the next batch; batch n lives in slot n % capacity.
+        self.published = 0
+        self.subscribers = []
+        self._space = asyncio.Event()
+
+    @property
+    def oldest(self) -> int:
+        """Sequence number of the oldest batch still held."""
+        return max(0, self.published - self.capacity)
+
+    def subscribe(self, name=None, policy=DROP_OLDEST, max_lag=None):
+        """Start reading at the next published batch."""
+        subscription = Subscription(self, name, policy, max_lag)
+        self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        if subscription in self.subscribers:
+            self.subscribers.remove(subscription)
+            self._space.set()
+
+    def _blocked(self):
+        return any(
+            subscription.policy == BLOCK
+            and self.published - subscription.cursor >= self.capacity
+            for subscription in self.subscribers
+        )
+
+    async def publish(self, batch):
+        """Store a batch once for every subscriber.
+
+        Waits only while a block subscriber still has to read the slot the
+        batch would overwrite.
+        """
+        while self._blocked():
+            self._space.clear()
+            await self._space.wait()
+        self._batches[self.published % self.capacity] = batch
+        self.published += 1
+        for subscription in self.subscribers:
+            subscription._wakeup.set()
+
+
+# バスの購読者。read_batch()はDataProcessor.read_batchと同じ形で返すので、
+# update_plotsなどにDataProcessorの代わりに渡せる。
+# バッチは全購読者で共有するため、受け取ったレコードを変更してはいけない。
+class Subscription:
+    def __init__(self, bus, name=None, policy=DROP_OLDEST, max_lag=None) -> None:
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.bus = bus
+        self.name = name
+        self.policy = policy
+        if policy == LATEST:
+            max_lag = 1
+        self.max_lag = bus.capacity if max_lag is None else min(max_lag, bus.capacity)
+        self.cursor = bus.published
+        self.received = 0
+        self.skipped = 0  # batches overwritten or dropped before they were read
+        self._wakeup = asyncio.Event()
+        self._read = asyncio.Event()
+        # Same attributes as DataProcessor after read_batch.
+        self.device_id = None
+        self.records = []
+
+    @property
+    def lag(self) -> int:
+        """Batches published but not yet read."""
+        return self.bus.published - self.cursor
+
+    def _catch_up(self):
+        limit = self.max_lag if self.policy != BLOCK else self.bus.capacity
+        lag = self.lag
+        if lag > limit:
+            self.cursor += lag - limit
+            self.skipped += lag - limit
+
+    def _take(self, count):
+        bus = self.bus
+        batches = [
+            bus._batches[sequence % bus.capacity]
+            for sequence in range(self.cursor, self.cursor + count)
+        ]
+        self.cursor += count
+        self.received += count
+        if self.policy == BLOCK:
+            bus._space.set()
+        self._read.set()
+        return batches
+
+    def get_nowait(self):
+        self._catch_up()
+        if self.lag == 0:
+            raise asyncio.QueueEmpty
+        return self._take(1)[0]
+
+    async def get(self):
+        while True:
+            self._catch_up()
+            if self.lag:
+                return self._take(1)[0]
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def caught_up(self):
+        """Wait until every batch published so far has been read."""
+        while self.lag:
+            self._read.clear()
+            await self._read.wait()
+
+    def drain(self) -> typing.List:
+        """Every batch available now, oldest first."""
+        self._catch_up()
+        return self._take(self.lag)
+
+    async def read_batch(self):
+        """Wait for a batch, then merge everything published since into
+        {device_id: records}."""
+        batches = [await self.get()] + self.drain()
+        if len(batches) == 1:
+            merged = batches[0]
+        else:
+            merged = {}
+            for batch in batches:
+                for device_id, records in batch.items():
+                    merged.setdefault(device_id, []).extend(records)
+        self.device_id = next(reversed(merged), None) if merged else None
+        self.records = [record for records in merged.values() for record in records]
+        return merged
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+
+async def publish_batches(dataprocessor, bus):
+    """Decode and publish every batch; the single reader of result_queue."""
+    while True:
+        await bus.publish(await dataprocessor.read_batch())
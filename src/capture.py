@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import typing
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# キャプチャファイルの形式 (すべてリトルエンディアン)
+#   ファイルヘッダ: マジック8バイト, 作成時の壁時計[ns], 作成時の単調時計[ns]
+#   レコード: 到着時刻(単調時計)[ns] uint64, 長さ uint32, 受信データ
+# インデックスファイル (<path>.idx) には (時刻, レコードのオフセット) を一定間隔で追記する。
+CAPTURE_MAGIC = b"HWTCAP01"
+FILE_HEADER = struct.Struct("<8sqq")
+RECORD_HEADER = struct.Struct("<QI")
+INDEX_ENTRY = struct.Struct("<QQ")
+INDEX_DTYPE = np.dtype([("time", "<u8"), ("offset", "<u8")])
+
+
+def index_path(path) -> str:
+    return os.fspath(path) + ".idx"
+
+
+# 受信した生データを追記専用のバイナリファイルに記録するクラス。
+# ディスクへの書き込みはバックグラウンドスレッドで行い、イベントループを止めない。
+# 既存のファイルに追記するときは、途中で切れたレコードを取り除き、
+# 時刻が最後のレコードより後になるようにずらす (単調時計は再起動で0から数え直すため)。
+# 書き込みスレッドが失敗すると、その例外をwrite()とclose()で送出する。
+class CaptureWriter:
+    def __init__(self, path, index_interval: float = 0.1) -> None:
+        self.path = os.fspath(path)
+        self.index_interval_ns = int(index_interval * 1e9)
+        self.records_written = 0
+        self.bytes_written = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self.error = None
+        self._thread = threading.Thread(
+            target=self._run, name="capture-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, data, timestamp_ns=None):
+        """Queue one received chunk; never blocks on disk I/O."""
+        if self.error is not None:
+            raise self.error
+        if self._closed or not data:
+            return
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        self._queue.put((timestamp_ns, bytes(data)))
+
+    def close(self):
+        """Flush everything queued so far and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    async def aclose(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def _resume(self):
+        """Trim an existing capture to its last complete record.
+
+        Returns the arrival time of that record, or None for a new file.
+        """
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return None
+        with CaptureReader(self.path) as reader:
+            last_ns, end = reader.tail()
+            indexed = int(np.searchsorted(reader.index["offset"], end))
+        os.truncate(self.path, end)
+        if os.path.exists(index_path(self.path)):
+            os.truncate(index_path(self.path), indexed * INDEX_DTYPE.itemsize)
+        return last_ns
+
+    def _run(self):
+        try:
+            last_ns = self._resume()
+            shift_ns = None
+            with open(self.path, "ab") as f, open(index_path(self.path), "ab") as idx:
+                if f.tell() == 0:
+                    f.write(
+                        FILE_HEADER.pack(
+                            CAPTURE_MAGIC, time.time_ns(), time.monotonic_ns()
+                        )
+                    )
+                offset = f.tell()
+                last_index_time = None
+                stop = False
+                while not stop:
+                    items = [self._queue.get()]
+                    # Write everything that piled up while the disk was busy in one go.
+                    while True:
+                        try:
+                            items.append(self._queue.get_nowait())
+                        except queue.Empty:
+                            break
+                    for item in items:
+                        if item is None:
+                            stop = True
+                            break
+                        timestamp_ns, data = item
+                        if shift_ns is None:
+                            # Keep the file ordered when the clock restarted.
+                            shift_ns = 0
+                            if last_ns is not None and timestamp_ns <= last_ns:
+                                shift_ns = last_ns + 1 - timestamp_ns
+                        timestamp_ns += shift_ns
+                        if (
+                            last_index_time is None
+                            or timestamp_ns - last_index_time >= self.index_interval_ns
+                        ):
+                            idx.write(INDEX_ENTRY.pack(timestamp_ns, offset))
+                            last_index_time = timestamp_ns
+                        f.write(RECORD_HEADER.pack(timestamp_ns, len(data)))
+                        f.write(data)
+                        offset += RECORD_HEADER.size + len(data)
+                        self.records_written += 1
+                        self.bytes_written += len(data)
+                    f.flush()
+                    idx.flush()
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to write capture {self.path}: {e}")
+            self.error = e
+
+
+# キャプチャファイルをメモリマップで読み込むクラス。
+# インデックスを二分探索して、指定した時刻範囲のレコードへ素早く移動する。
+# 空のファイル (記録を始めた直後など) はレコードのないキャプチャとして扱う。
+class CaptureReader:
+    def __init__(self, path) -> None:
+        self.path = os.fspath(path)
+        self._file = open(self.path, "rb")
+        if os.fstat(self._file.fileno()).st_size == 0:
+            # mmap cannot map an empty file.
+            self._mmap = b""
+            self.created_wall_ns = self.created_monotonic_ns = None
+            self.index = np.empty(0, dtype=INDEX_DTYPE)
+            return
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < FILE_HEADER.size:
+            self.close()
+            raise ValueError(f"{self.path} is not a capture file")
+        magic, self.created_wall_ns, self.created_monotonic_ns = (
+            FILE_HEADER.unpack_from(self._mmap, 0)
+        )
+        if magic != CAPTURE_MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a capture file")
+        self.index = self._load_index()
+
+    def _load_index(self) -> np.ndarray:
+        path = index_path(self.path)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                raw = f.read()
+            usable = len(raw) - len(raw) % INDEX_DTYPE.itemsize
+            return np.frombuffer(raw[:usable], dtype=INDEX_DTYPE)
+        # Without a sidecar index every record is indexed by scanning once.
+        entries = [(t, offset) for t, offset, _ in self._scan(FILE_HEADER.size)]
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def _scan(self, offset: int):
+        size = len(self._mmap)
+        while offset + RECORD_HEADER.size <= size:
+            timestamp_ns, length = RECORD_HEADER.unpack_from(self._mmap, offset)
+            start = offset + RECORD_HEADER.size
+            if start + length > size:
+                # A partially written record at the end of an interrupted capture.
+                break
+            yield timestamp_ns, offset, length
+            offset = start + length
+
+    def seek_offset(self, start_ns) -> int:
+        """Return the offset of the indexed record at or before start_ns."""
+        if start_ns is None or len(self.index) == 0:
+            return FILE_HEADER.size
+        i = int(np.searchsorted(self.index["time"], start_ns, side="right")) - 1
+        if i < 0:
+            return FILE_HEADER.size
+        return int(self.index["offset"][i])
+
+    def records(
+        self, start_ns=None, end_ns=None
+    ) -> typing.Iterator[typing.Tuple[int, memoryview]]:
+        """Yield (arrival time in ns, data) for records in [start_ns, end_ns).
+
+        data is a view into the mapped file. Copy it with bytes() to keep it
+        beyond close(); the mapping stays alive until the last view is gone.
+        """
+        view = memoryview(self._mmap)
+        for timestamp_ns, offset, length in self._scan(self.seek_offset(start_ns)):
+            if start_ns is not None and timestamp_ns < start_ns:
+                continue
+            if end_ns is not None and timestamp_ns >= end_ns:
+                break
+            start = offset + RECORD_HEADER.size
+            yield timestamp_ns, view[start : start + length]
+
+    def read(self, start_ns=None, end_ns=None) -> bytes:
+        """Return the concatenated raw bytes of a time range."""
+        return b"".join(data for _, data in self.records(start_ns, end_ns))
+
+    def tail(self):
+        """(arrival time of the last complete record or None, offset just past it)."""
+        last_ns, end = None, FILE_HEADER.size
+        start = int(self.index["offset"][-1]) if len(self.index) else end
+        for timestamp_ns, offset, length in self._scan(start):
+            last_ns, end = timestamp_ns, offset + RECORD_HEADER.size + length
+        return last_ns, end
+
+    @property
+    def start_time(self):
+        if len(self.index) == 0:
+            return None
+        return int(self.index["time"][0])
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Views from records() are still alive; the mapping is
+                # released together with the last of them.
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
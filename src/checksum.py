@@ -0,0 +1,133 @@
+import operator
+import typing
+import zlib
+from functools import reduce
+
+import numpy as np
+
+# Below this size a plain loop is faster than going through NumPy.
+_NUMPY_MIN_SIZE = 64
+
+
+def _crc_table(polynomial: int, dtype) -> np.ndarray:
+    """Lookup table of a reflected CRC, one entry per byte value."""
+    table = []
+    for value in range(256):
+        for _ in range(8):
+            value = (value >> 1) ^ polynomial if value & 1 else value >> 1
+        table.append(value)
+    return np.array(table, dtype=dtype)
+
+
+CRC16_MODBUS_TABLE = _crc_table(0xA001, np.uint16)
+CRC32_TABLE = _crc_table(0xEDB88320, np.uint32)
+_CRC16_MODBUS_LIST = CRC16_MODBUS_TABLE.tolist()
+
+
+def xor8(data, initial: int = 0) -> int:
+    """XOR of every byte (NMEA sentences, the DataParser parity)."""
+    if len(data) < _NUMPY_MIN_SIZE:
+        return reduce(operator.xor, bytes(data), initial)
+    return int(np.bitwise_xor.reduce(np.frombuffer(data, dtype=np.uint8))) ^ initial
+
+
+def sum8(data, initial: int = 0) -> int:
+    """Low byte of the sum of every byte (HWT905 frames)."""
+    return (sum(data) + initial) & 0xFF
+
+
+def crc16_modbus(data, initial: int = 0xFFFF) -> int:
+    crc = initial
+    table = _CRC16_MODBUS_LIST
+    for byte in bytes(data):
+        crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc
+
+
+def crc32(data, initial: int = 0) -> int:
+    """CRC-32 (IEEE 802.3), computed by zlib's table-driven implementation."""
+    return zlib.crc32(data, initial)
+
+
+def as_frames(data, frame_length: typing.Optional[int] = None) -> np.ndarray:
+    """View frames as a (frames, bytes) uint8 array without copying.
+
+    data is a 2-D array, or a bytes-like object cut into frame_length pieces.
+    """
+    if isinstance(data, np.ndarray) and data.ndim == 2:
+        return data.astype(np.uint8, copy=False)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if frame_length is None:
+        raise ValueError("frame_length is required for a flat buffer")
+    count = raw.size // frame_length
+    return raw[: count * frame_length].reshape(count, frame_length)
+
+
+# 複数フレームをまとめて計算するバッチ版。行ごとに1つのチェックサムを返す。
+def xor8_batch(frames, frame_length=None) -> np.ndarray:
+    return np.bitwise_xor.reduce(as_frames(frames, frame_length), axis=1)
+
+
+def sum8_batch(frames, frame_length=None) -> np.ndarray:
+    frames = as_frames(frames, frame_length)
+    return (frames.sum(axis=1, dtype=np.uint32) & 0xFF).astype(np.uint8)
+
+
+def crc16_modbus_batch(frames, frame_length=None, initial=0xFFFF) -> np.ndarray:
+    # One table lookup per byte column, for all frames at once.
+    frames = as_frames(frames, frame_length)
+    crc = np.full(len(frames), initial, dtype=np.uint16)
+    for column in frames.T:
+        crc = CRC16_MODBUS_TABLE[(crc ^ column) & 0xFF] ^ (crc >> 8)
+    return crc
+
+
+def crc32_batch(frames, frame_length=None) -> np.ndarray:
+    frames = as_frames(frames, frame_length)
+    crc = np.full(len(frames), 0xFFFFFFFF, dtype=np.uint32)
+    for column in frames.T:
+        crc = CRC32_TABLE[(crc ^ column) & 0xFF] ^ (crc >> 8)
+    return crc ^ np.uint32(0xFFFFFFFF)
+
+
+def xor8_segments(data, starts, ends) -> np.ndarray:
+    """XOR of data[start:end] for many variable-length segments in one pass."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    starts = np.asarray(starts, dtype=np.intp)
+    ends = np.asarray(ends, dtype=np.intp)
+    result = np.zeros(len(starts), dtype=np.uint8)
+    filled = ends > starts
+    if raw.size and filled.any():
+        # reduceat needs indices inside the buffer; empty segments stay 0.
+        bounds = np.column_stack((starts[filled], ends[filled])).ravel()
+        padded = np.append(raw, np.uint8(0))
+        result[filled] = np.bitwise_xor.reduceat(padded, bounds)[::2]
+    return result
+
+
+class ChecksumAlgorithm(typing.NamedTuple):
+    function: typing.Callable
+    batch: typing.Callable
+    size: int  # bytes the checksum occupies in a frame
+
+
+ALGORITHMS = {
+    "xor8": ChecksumAlgorithm(xor8, xor8_batch, 1),
+    "sum8": ChecksumAlgorithm(sum8, sum8_batch, 1),
+    "crc16_modbus": ChecksumAlgorithm(crc16_modbus, crc16_modbus_batch, 2),
+    "crc32": ChecksumAlgorithm(crc32, crc32_batch, 4),
+}
+
+
+def verify_frames(frames, algorithm="sum8", frame_length=None) -> np.ndarray:
+    """Check fixed-length frames whose checksum is stored little-endian at the end.
+
+    Returns one bool per frame; thousands of frames are checked in one call.
+    """
+    spec = ALGORITHMS[algorithm]
+    frames = as_frames(frames, frame_length)
+    computed = spec.batch(frames[:, : -spec.size]).astype(np.uint32)
+    stored = np.zeros(len(frames), dtype=np.uint32)
+    for i in range(spec.size):
+        stored |= frames[:, i - spec.size].astype(np.uint32) << (8 * i)
+    return computed == stored
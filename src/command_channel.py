@@ -0,0 +1,83 @@
+import asyncio
+import collections
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# シリアルポートへの送信をキューに溜めて、まとめて書き込むクラス。
+# 同じタイミングで送られたコマンドは1回のtransport.writeに結合する。
+# transportのpause_writing/resume_writingに従い、書き込みバッファが
+# 上限を超えている間は送信を待たせる。
+class CommandChannel:
+    def __init__(self, transport, max_batch: int = 4096) -> None:
+        self.transport = transport
+        self.max_batch = max_batch
+        self._pending = collections.deque()
+        self._can_write = asyncio.Event()
+        self._can_write.set()
+        self._flushed = asyncio.Event()
+        self._flushed.set()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.commands = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.errors = 0
+
+    @property
+    def paused(self):
+        return not self._can_write.is_set()
+
+    def write(self, data):
+        """Queue data without waiting; it is written on the next loop iteration."""
+        self._pending.append(bytes(data))
+        self.commands += 1
+        self._flushed.clear()
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def drain(self):
+        """Wait until everything queued so far has been handed to the transport."""
+        await self._flushed.wait()
+
+    async def send(self, data):
+        self.write(data)
+        await self.drain()
+
+    # Called from the protocol's pause_writing / resume_writing.
+    def pause_writing(self):
+        self._can_write.clear()
+
+    def resume_writing(self):
+        self._can_write.set()
+
+    async def _run(self):
+        pending = self._pending
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while pending:
+                await self._can_write.wait()
+                batch = [pending.popleft()]
+                size = len(batch[0])
+                while pending and size + len(pending[0]) <= self.max_batch:
+                    size += len(pending[0])
+                    batch.append(pending.popleft())
+                try:
+                    self.transport.write(b"".join(batch))
+                    self.writes += 1
+                    self.bytes_written += size
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Failed to send data: {e}")
+            self._flushed.set()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._pending.clear()
+        self._flushed.set()
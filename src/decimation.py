@@ -0,0 +1,221 @@
+import typing
+
+import numpy as np
+
+from src.ring_buffer import RingBuffer
+
+MINMAX = "minmax"
+LTTB = "lttb"
+DECIMATION_METHODS = (MINMAX, LTTB)
+
+
+def minmax_buckets(x, low, high=None, buckets: int = 500, x_range=None):
+    """Reduce a line to the minimum and maximum of every x bucket (pixel column).
+
+    low/high are the per-sample minimum and maximum (the same array for raw
+    samples). Returns two points per non-empty bucket, so every spike stays
+    visible. x must be sorted.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    high = low if high is None else np.asarray(high, dtype=np.float64)
+    if len(x) == 0:
+        return x, low
+    x0, x1 = x_range if x_range is not None else (x[0], x[-1])
+    scale = buckets / (x1 - x0) if x1 > x0 else 0.0
+    index = np.clip(((x - x0) * scale).astype(np.intp), 0, buckets - 1)
+    starts = np.flatnonzero(np.concatenate(([True], index[1:] != index[:-1])))
+    # fmin/fmax skip NaN gaps unless a whole bucket is missing.
+    minimum = np.fmin.reduceat(low, starts)
+    maximum = np.fmax.reduceat(high, starts)
+    return np.repeat(x[starts], 2), np.column_stack((minimum, maximum)).ravel()
+
+
+def lttb(x, y, threshold: int):
+    """Largest-Triangle-Three-Buckets: keep threshold points of a line.
+
+    The first and last points are kept; from every bucket in between the
+    point forming the largest triangle with the previous choice and the
+    average of the next bucket is taken.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return x, y
+    # Bucket i covers edges[i]:edges[i + 1]; the first and last points are fixed.
+    edges = (np.arange(threshold - 1) * ((size - 2) / (threshold - 2))).astype(
+        np.intp
+    ) + 1
+    edges[-1] = size - 1
+    counts = np.diff(edges)
+    average_x = np.add.reduceat(x[1 : size - 1], edges[:-1] - 1) / counts
+    average_y = np.add.reduceat(y[1 : size - 1], edges[:-1] - 1) / counts
+    # The bucket after the last one is the final point.
+    average_x = np.append(average_x[1:], x[-1])
+    average_y = np.append(average_y[1:], y[-1])
+
+    # Buckets hold few points, so plain floats beat per-bucket NumPy calls.
+    xs, ys, edges = x.tolist(), y.tolist(), edges.tolist()
+    average_x, average_y = average_x.tolist(), average_y.tolist()
+    selected = [0] * threshold
+    selected[-1] = size - 1
+    a = 0
+    for i in range(threshold - 2):
+        ax, ay = xs[a], ys[a]
+        dx, dy = ax - average_x[i], average_y[i] - ay
+        best, best_area = edges[i], -1.0
+        for j in range(edges[i], edges[i + 1]):
+            # NaN areas compare False and are never chosen.
+            area = abs(dx * (ys[j] - ay) - (ax - xs[j]) * dy)
+            if area > best_area:
+                best, best_area = j, area
+        selected[i + 1] = a = best
+    return x[selected], y[selected]
+
+
+def decimation_setting(config, section="plot_set"):
+    """AngularPlotter kwargs from the decimation and points keys of a section."""
+    method = config.get(section, "decimation", fallback=MINMAX).strip().lower()
+    if method in ("", "none"):
+        method = None
+    elif method not in DECIMATION_METHODS:
+        raise ValueError(f"Unknown decimation method: {method}")
+    points = config.getint(section, "points", fallback=0)
+    return {"decimation": method, "max_points": points or None}
+
+
+# 履歴のリングバッファに対する多段の間引きデータ (レベル・オブ・ディテール)。
+# レベルiはfactor**i個のサンプルごとの最小値と最大値を保持し、
+# サンプルが追加されるたびに、そろったブロックだけを上のレベルへ集約する。
+# 描画時は表示する点数に合う粗さのレベルを選ぶので、コストは履歴の長さによらない。
+class LevelOfDetail:
+    def __init__(
+        self,
+        history: RingBuffer,
+        columns: typing.Sequence[str],
+        factor: int = 4,
+        time_column: str = "time",
+    ) -> None:
+        if factor < 2:
+            raise ValueError("factor must be at least 2")
+        self.history = history
+        self.columns = tuple(columns)
+        self.factor = factor
+        self.time_column = time_column
+        level_columns = [time_column]
+        for column in self.columns:
+            level_columns += [f"{column}_min", f"{column}_max"]
+        self.levels = []
+        block = factor
+        while history.capacity // block >= factor:
+            self.levels.append(
+                RingBuffer(history.capacity // block + factor, level_columns)
+            )
+            block *= factor
+        # Entries of each level (0: the history) not yet aggregated upwards.
+        self.pending = [0] * (len(self.levels) + 1)
+
+    def _source(self, level: int):
+        """Times and per-column (minimum, maximum) views of a level."""
+        if level == 0:
+            buffer = self.history
+            values = {column: (buffer.view(column),) * 2 for column in self.columns}
+        else:
+            buffer = self.levels[level - 1]
+            values = {
+                column: (buffer.view(f"{column}_min"), buffer.view(f"{column}_max"))
+                for column in self.columns
+            }
+        return buffer.view(self.time_column), values
+
+    def update(self, count: int):
+        """Aggregate the count samples just added to the history."""
+        if count <= 0:
+            return
+        if self.pending[0] + count > len(self.history):
+            # More than the history holds arrived at once.
+            self.rebuild()
+            return
+        factor = self.factor
+        for level, target in enumerate(self.levels):
+            size = self.pending[level] + count
+            count, self.pending[level] = divmod(size, factor)
+            if count == 0:
+                return
+            times, values = self._source(level)
+            start = len(times) - size
+            stop = start + count * factor
+            rows = [times[start:stop:factor]]
+            for low, high in values.values():
+                rows.append(np.fmin.reduce(low[start:stop].reshape(count, factor), 1))
+                rows.append(np.fmax.reduce(high[start:stop].reshape(count, factor), 1))
+            target.extend(np.vstack(rows))
+
+    def rebuild(self):
+        for level in self.levels:
+            level.clear()
+        self.pending = [0] * (len(self.levels) + 1)
+        self.update(len(self.history))
+
+    def level_for(self, points: int) -> int:
+        """The coarsest level that still has at least points entries."""
+        level = 0
+        size = len(self.history)
+        while level < len(self.levels) and size // self.factor ** (level + 1) >= points:
+            level += 1
+        return level
+
+    def window(self, points: int):
+        """Times and {column: (minimum, maximum)} covering the whole history
+        with between points and points * factor entries."""
+        level = self.level_for(points)
+        times, values = self._source(level)
+        if level == 0:
+            return times, values
+        # Entries whose first sample already left the history are replaced by
+        # the samples still held at the start of the history.
+        history_times, history_values = self._source(0)
+        first = min(int(np.searchsorted(times, history_times[0])), len(times) - 1)
+        head = int(np.searchsorted(history_times, times[first]))
+        parts = [(history_times, history_values, 0, head)]
+        parts.append((times, values, first, len(times)))
+        # Newer samples not yet aggregated into this level come from the finer ones.
+        for finer in range(level - 1, -1, -1):
+            pending = self.pending[finer]
+            if pending:
+                times, values = self._source(finer)
+                parts.append((times, values, len(times) - pending, len(times)))
+        joined = {}
+        for column in self.columns:
+            joined[column] = tuple(
+                np.concatenate([part[column][i][a:b] for _, part, a, b in parts])
+                for i in (0, 1)
+            )
+        return np.concatenate([times[a:b] for times, _, a, b in parts]), joined
+
+    def decimate(self, points: int, method: str = MINMAX):
+        """Return {column: (x, y)} with about points x positions per column.
+
+        minmax yields the two extremes of every x bucket; lttb yields points
+        samples. A history of at most 2 * points samples is returned as it is.
+        """
+        if method not in DECIMATION_METHODS:
+            raise ValueError(f"Unknown decimation method: {method}")
+        times = self.history.view(self.time_column)
+        if len(times) <= 2 * points:
+            return {
+                column: (times, self.history.view(column)) for column in self.columns
+            }
+        times, values = self.window(points)
+        x_range = (times[0], times[-1])
+        result = {}
+        for column, (low, high) in values.items():
+            if method == MINMAX:
+                result[column] = minmax_buckets(times, low, high, points, x_range)
+            else:
+                # Both extremes of every entry are candidates.
+                result[column] = lttb(
+                    np.repeat(times, 2), np.column_stack((low, high)).ravel(), points
+                )
+        return result
@@ -0,0 +1,392 @@
+import functools
+import math
+import typing
+
+import numpy as np
+
+from src.hwt905_records import (
+    AccelerationRecord,
+    AngleRecord,
+    AngularVelocityRecord,
+    MagneticFieldRecord,
+)
+
+# first_order_iir splits a block so that |decay| ** -length stays below this.
+_MAX_GROWTH = 1e6
+
+
+def first_order_iir(inputs, decay, initial) -> np.ndarray:
+    """y[n] = decay * y[n - 1] + inputs[n] along the last axis, without a
+    Python loop over samples.
+
+    inputs has shape (channels, samples); decay is a scalar or one value per
+    channel (complex values are allowed) and initial is y[-1] per channel.
+    """
+    inputs = np.asarray(inputs)
+    decay = np.broadcast_to(np.asarray(decay), inputs.shape[:1])
+    state = np.asarray(initial, dtype=np.result_type(inputs, decay, np.float64))
+    output = np.empty(inputs.shape, dtype=state.dtype)
+    if inputs.shape[1] == 0:
+        return output
+    magnitude = np.abs(decay)
+    if magnitude.min() == 0:
+        # A channel without memory just passes its input through.
+        memoryless = magnitude == 0
+        output[memoryless] = inputs[memoryless]
+        if memoryless.all():
+            return output
+        rest = ~memoryless
+        output[rest] = first_order_iir(inputs[rest], decay[rest], state[rest])
+        return output
+    smallest = magnitude.min()
+    if smallest >= 1:
+        length = inputs.shape[1]
+    else:
+        length = max(1, int(math.log(_MAX_GROWTH) / -math.log(smallest)))
+    # y[n] = decay^(n+1) * (y[-1] + sum_k inputs[k] / decay^(k+1)) inside a piece.
+    powers = decay[:, None] ** np.arange(1, min(length, inputs.shape[1]) + 1)
+    for start in range(0, inputs.shape[1], length):
+        piece = inputs[:, start : start + length]
+        p = powers[:, : piece.shape[1]]
+        output[:, start : start + piece.shape[1]] = p * (
+            state[:, None] + np.cumsum(piece / p, axis=1)
+        )
+        state = output[:, start + piece.shape[1] - 1]
+    return output
+
+
+# 角度の±180°の折り返しを取り除くフィルタ。直前のバッチの最後の値を保持するので、
+# バッチをまたいでも連続した角度になる (adjust_angular_asyncは呼び出しごとに状態を失う)。
+class AngleUnwrapper:
+    def __init__(self, period: float = 360.0) -> None:
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self.last = None  # last valid raw value per channel
+        self.offset = None  # correction added to the raw values
+
+    def process(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        channels, count = values.shape
+        if count == 0:
+            return values.copy()
+        if self.last is None:
+            self.last = np.full(channels, np.nan)
+            self.offset = np.zeros(channels)
+        # Compare every sample with the last valid one before it, across NaN gaps.
+        raw = np.concatenate((self.last[:, None], values), axis=1)
+        valid = ~np.isnan(raw)
+        index = np.where(valid, np.arange(count + 1), 0)
+        np.maximum.accumulate(index, axis=1, out=index)
+        previous = np.take_along_axis(raw, index, axis=1)[:, :-1]
+        steps = np.nan_to_num(
+            -self.period * np.round((values - previous) / self.period)
+        )
+        corrections = self.offset[:, None] + np.cumsum(steps, axis=1)
+        self.offset = corrections[:, -1]
+        self.last = np.take_along_axis(raw, index[:, -1:], axis=1)[:, 0]
+        return values + corrections
+
+
+# 移動平均。直近window-1サンプルだけを保持し、累積和で一度に計算する。
+# 最初のwindow-1サンプルは、それまでに受信したサンプルの平均になる。
+class MovingAverage:
+    def __init__(self, window: int = 5) -> None:
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.tail = None
+
+    def process(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if self.tail is None:
+            self.tail = values[:, :0]
+        data = np.concatenate((self.tail, values), axis=1)
+        sums = np.zeros((data.shape[0], data.shape[1] + 1))
+        np.cumsum(data, axis=1, out=sums[:, 1:])
+        end = np.arange(self.tail.shape[1], data.shape[1]) + 1
+        start = np.maximum(end - self.window, 0)
+        self.tail = data[:, data.shape[1] - min(self.window - 1, data.shape[1]) :]
+        return (sums[:, end] - sums[:, start]) / (end - start)
+
+
+# 指数移動平均: y[n] = alpha * x[n] + (1 - alpha) * y[n - 1]
+class ExponentialMovingAverage:
+    def __init__(self, alpha: float = 0.2) -> None:
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self.state = None
+
+    def process(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[1] == 0:
+            return values.copy()
+        if self.state is None:
+            # Start from the first sample instead of decaying up from zero.
+            self.state = values[:, 0].copy()
+        output = first_order_iir(self.alpha * values, 1 - self.alpha, self.state)
+        self.state = output[:, -1]
+        return output
+
+
+def sample_intervals(timestamps, previous_ns, dt: float) -> np.ndarray:
+    """Seconds between consecutive timestamps (ns); dt where unknown."""
+    if timestamps is None:
+        return None
+    stamps = np.asarray(timestamps, dtype=np.int64)
+    if previous_ns is None:
+        previous_ns = stamps[0] - int(dt * 1e9)
+    intervals = np.diff(stamps, prepend=previous_ns) / 1e9
+    return np.where(intervals > 0, intervals, dt)
+
+
+# 相補フィルタ: ジャイロの角速度を積分した角度 (短時間で正確) と、
+# 加速度・地磁気から求めた角度 (長時間で正確) をgainの割合で合成する。
+# angle[n] = gain * (angle[n - 1] + rate[n] * dt) + (1 - gain) * reference[n]
+class ComplementaryFilter:
+    def __init__(self, gain: float = 0.98, dt: float = 0.01) -> None:
+        self.gain = gain
+        self.dt = dt
+        self.reset()
+
+    def reset(self):
+        self.state = None
+        self.last_timestamp_ns = None
+
+    def process(self, rates, references, timestamps=None) -> np.ndarray:
+        """rates in deg/s and reference angles in degrees, shape (axes, samples).
+
+        With timestamps (ns) the integration uses the measured intervals.
+        """
+        rates = np.asarray(rates, dtype=np.float64)
+        references = np.asarray(references, dtype=np.float64)
+        if rates.shape[1] == 0:
+            return references.copy()
+        dt = sample_intervals(timestamps, self.last_timestamp_ns, self.dt)
+        if dt is None:
+            dt = self.dt
+        else:
+            self.last_timestamp_ns = int(timestamps[-1])
+        if self.state is None:
+            self.state = references[:, 0].copy()
+        gain = self.gain
+        inputs = gain * rates * dt + (1 - gain) * references
+        output = first_order_iir(inputs, gain, self.state)
+        self.state = output[:, -1]
+        return output
+
+
+# 角度とジャイロのバイアスを状態とする小さなカルマンフィルタ (各軸独立)。
+# 共分散は測定値によらないので、一定のdtで収束した定常ゲインを初めに求めておき、
+# 状態の更新を固有値分解した1次の漸化式として全サンプルまとめて計算する。
+class KalmanFilter:
+    def __init__(
+        self,
+        dt: float = 0.01,
+        q_angle: float = 0.001,
+        q_bias: float = 0.003,
+        r_measure: float = 0.03,
+    ) -> None:
+        self.dt = dt
+        transition = np.array([[1.0, -dt], [0.0, 1.0]])
+        control = np.array([dt, 0.0])
+        noise = np.diag([q_angle, q_bias]) * dt
+        # Iterate the Riccati equation to the steady-state gain.
+        covariance = np.zeros((2, 2))
+        for _ in range(100_000):
+            predicted = transition @ covariance @ transition.T + noise
+            gain = predicted[:, 0] / (predicted[0, 0] + r_measure)
+            updated = predicted - np.outer(gain, predicted[0])
+            converged = np.allclose(updated, covariance, rtol=1e-12, atol=1e-15)
+            covariance = updated
+            if converged:
+                break
+        self.gain = gain
+        self.covariance = covariance
+        correction = np.eye(2) - np.outer(gain, [1.0, 0.0])
+        # s[n] = M s[n-1] + rate[n] * G + reference[n] * K
+        self.matrix = correction @ transition
+        self.rate_input = correction @ control
+        self.eigenvalues, self.modes = np.linalg.eig(self.matrix)
+        if np.linalg.cond(self.modes) > 1e8:
+            raise ValueError("Kalman parameters give a non-diagonalizable update")
+        self.inverse_modes = np.linalg.inv(self.modes)
+        self.reset()
+
+    def reset(self):
+        self.state = None  # (2, axes): angle and gyro bias
+
+    def process(self, rates, references, timestamps=None) -> np.ndarray:
+        """rates in deg/s and reference angles in degrees, shape (axes, samples).
+
+        Samples are taken to be dt apart; timestamps are not used.
+        """
+        rates = np.asarray(rates, dtype=np.float64)
+        references = np.asarray(references, dtype=np.float64)
+        if rates.shape[1] == 0:
+            return references.copy()
+        if self.state is None:
+            self.state = np.vstack((references[:, 0], np.zeros(len(references))))
+        # Decouple the two state components into independent first-order modes.
+        inputs = (
+            self.rate_input[:, None, None] * rates
+            + self.gain[:, None, None] * references
+        )
+        mode_inputs = np.einsum("ij,jan->ian", self.inverse_modes, inputs)
+        mode_state = self.inverse_modes @ self.state
+        modes = np.stack(
+            [
+                first_order_iir(mode_inputs[i], self.eigenvalues[i], mode_state[i])
+                for i in range(2)
+            ]
+        )
+        states = np.einsum("ij,jan->ian", self.modes, modes).real
+        self.state = states[:, :, -1]
+        return states[0]
+
+    @property
+    def bias(self):
+        return None if self.state is None else self.state[1]
+
+
+def reference_angles(acceleration, magnetic) -> np.ndarray:
+    """Roll and pitch from gravity and the tilt-compensated heading, in degrees.
+
+    acceleration and magnetic have shape (3, samples).
+    """
+    ax, ay, az = acceleration
+    mx, my, mz = magnetic
+    roll = np.arctan2(ay, az)
+    pitch = np.arctan2(-ax, np.hypot(ay, az))
+    sin_roll, cos_roll = np.sin(roll), np.cos(roll)
+    sin_pitch, cos_pitch = np.sin(pitch), np.cos(pitch)
+    horizontal_x = (
+        mx * cos_pitch + my * sin_roll * sin_pitch + mz * cos_roll * sin_pitch
+    )
+    horizontal_y = my * cos_roll - mz * sin_roll
+    yaw = np.arctan2(-horizontal_y, horizontal_x)
+    return np.degrees(np.vstack((roll, pitch, yaw)))
+
+
+# DataProcessorとプロッタの間で、解析済みレコードのバッチに適用する段。
+# apply(records)はレコードのリストを受け取り、処理したリストを返す。
+# この段はAngleRecordのロール・ピッチ・ヨーを、まとめてフィルタの列に通す。
+class AngleFilterStage:
+    def __init__(self, filters: typing.Sequence) -> None:
+        self.filters = list(filters)
+
+    def apply(self, records):
+        angles = [record for record in records if type(record) is AngleRecord]
+        if not angles:
+            return records
+        block = np.array(
+            [(record.roll, record.pitch, record.yaw) for record in angles],
+            dtype=np.float64,
+        ).T
+        for item in self.filters:
+            block = item.process(block)
+        for record, (roll, pitch, yaw) in zip(angles, block.T.tolist()):
+            record.roll, record.pitch, record.yaw = roll, pitch, yaw
+        return records
+
+
+# 加速度 (0x51)・角速度 (0x52)・地磁気 (0x54) を融合して角度を求める段。
+# 角速度のフレームごとに、直前の加速度と地磁気と組み合わせて1サンプルとし、
+# センサーが出力したAngleRecordの代わりに融合したAngleRecordを返す。
+# 角度は折り返さず連続した値になる。
+class FusionStage:
+    def __init__(self, fusion_filter) -> None:
+        self.filter = fusion_filter
+        self.unwrapper = AngleUnwrapper()
+        self.acceleration = None
+        self.magnetic = None
+
+    def samples(self, records):
+        stamps, acceleration, rates, magnetic = [], [], [], []
+        for record in records:
+            kind = type(record)
+            if kind is AccelerationRecord:
+                self.acceleration = (record.x, record.y, record.z)
+            elif kind is MagneticFieldRecord:
+                self.magnetic = (record.x, record.y, record.z)
+            elif kind is AngularVelocityRecord:
+                if self.acceleration is None or self.magnetic is None:
+                    continue
+                stamps.append(record.timestamp_ns)
+                acceleration.append(self.acceleration)
+                rates.append((record.x, record.y, record.z))
+                magnetic.append(self.magnetic)
+        return stamps, acceleration, rates, magnetic
+
+    def apply(self, records):
+        stamps, acceleration, rates, magnetic = self.samples(records)
+        others = [record for record in records if type(record) is not AngleRecord]
+        if not stamps:
+            return others
+        references = self.unwrapper.process(
+            reference_angles(np.array(acceleration).T, np.array(magnetic).T)
+        )
+        timestamps = None if None in stamps else np.array(stamps, dtype=np.int64)
+        angles = self.filter.process(np.array(rates).T, references, timestamps)
+        for stamp, (roll, pitch, yaw) in zip(stamps, angles.T.tolist()):
+            record = AngleRecord(roll, pitch, yaw, 0)
+            record.timestamp_ns = stamp
+            others.append(record)
+        return others
+
+
+SMOOTHING = {
+    "moving_average": lambda config, section: MovingAverage(
+        config.getint(section, "window", fallback=5)
+    ),
+    "ema": lambda config, section: ExponentialMovingAverage(
+        config.getfloat(section, "alpha", fallback=0.2)
+    ),
+}
+
+FUSION = {
+    "complementary": lambda config, section: ComplementaryFilter(
+        config.getfloat(section, "gain", fallback=0.98),
+        config.getfloat(section, "dt", fallback=0.01),
+    ),
+    "kalman": lambda config, section: KalmanFilter(
+        config.getfloat(section, "dt", fallback=0.01)
+    ),
+}
+
+
+def build_stages(config, section="filter"):
+    """A fresh list of stages as configured in a section; empty when unset."""
+    stages = []
+    fusion = config.get(section, "fusion", fallback="none").strip().lower()
+    if fusion != "none":
+        if fusion not in FUSION:
+            raise ValueError(f"Unknown fusion filter: {fusion}")
+        stages.append(FusionStage(FUSION[fusion](config, section)))
+    filters = []
+    if fusion == "none" and config.getboolean(section, "unwrap", fallback=True):
+        filters.append(AngleUnwrapper())
+    smoothing = config.get(section, "smoothing", fallback="none").strip().lower()
+    if smoothing != "none":
+        if smoothing not in SMOOTHING:
+            raise ValueError(f"Unknown smoothing filter: {smoothing}")
+        filters.append(SMOOTHING[smoothing](config, section))
+    if filters:
+        stages.append(AngleFilterStage(filters))
+    return stages
+
+
+def stage_factory(config, section="filter"):
+    """Callable creating the stages of one device, or None when none are set."""
+    # Building them once also validates the section up front.
+    if not build_stages(config, section):
+        return None
+    return functools.partial(build_stages, config, section)
@@ -0,0 +1,519 @@
+import asyncio
+import configparser
+import sys
+import time
+import typing
+
+import matplotlib.pyplot as plt
+import numpy as np
+import qasync
+from matplotlib.animation import FuncAnimation
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from PyQt5.QtCore import QCoreApplication
+from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget
+
+from src.acquisition import create_processor
+from src.decimation import MINMAX, LevelOfDetail
+from src.hwt905_records import AngleRecord, MagneticFieldRecord
+from src.log_config import configure_logging
+from src.ring_buffer import RingBuffer
+from src.serial_communication_async import AsyncSerialManager
+
+
+# 角度データをグラフにプロットするクラス。
+# HWT905 TTL専用。ロー、ピッチ、ヨーのデータをグラフにリアルタイムでプロットする。
+# 履歴は受信時刻と一緒に固定長のリングバッファに保持する。
+# x軸は最新のサンプルを0とした時刻 [s] で、受信間隔のばらつきもそのまま表示する。
+# 履歴が表示幅の点数より長い場合は、LevelOfDetailで間引いてから描画する。
+class AngularPlotter:
+    def __init__(
+        self,
+        history: int = 100,
+        x_growth: float = 1.25,
+        decimation: typing.Optional[str] = MINMAX,
+        max_points: typing.Optional[int] = None,
+        grow_only: bool = False,
+    ) -> None:
+        self.history = RingBuffer(history, ("time", "roll", "pitch", "yaw"))
+        self.x_growth = x_growth
+        # grow_only (blit mode): widen the y limits but never shrink them, so the
+        # cached background is rarely redrawn. Otherwise y follows the data.
+        self.grow_only = grow_only
+        # decimation: "minmax", "lttb" or None; max_points None follows the axes width.
+        self.decimation = decimation
+        self.max_points = max_points
+        self.lod = None
+        if decimation is not None:
+            self.lod = LevelOfDetail(self.history, ("roll", "pitch", "yaw"))
+        self.drawn = {}
+        self.roll_line = None
+        self.pitch_line = None
+        self.yaw_line = None
+
+    @property
+    def time_data(self):
+        return self.history.view("time")
+
+    @property
+    def roll_data(self):
+        return self.history.view("roll")
+
+    @property
+    def pitch_data(self):
+        return self.history.view("pitch")
+
+    @property
+    def yaw_data(self):
+        return self.history.view("yaw")
+
+    def update_plot(self, _):
+        roll = self.history.latest("roll")
+        if roll is not None and not np.isnan(roll):
+            self.roll_text.set_text(f"Roll: {roll:.2f}")
+
+        pitch = self.history.latest("pitch")
+        if pitch is not None and not np.isnan(pitch):
+            self.pitch_text.set_text(f"Pitch: {pitch:.2f}")
+
+        yaw = self.history.latest("yaw")
+        if yaw is not None and not np.isnan(yaw):
+            self.yaw_text.set_text(f"Yaw: {yaw:.2f}")
+
+        if (
+            self.roll_line is not None
+            and self.pitch_line is not None
+            and self.yaw_line is not None
+        ):
+            self.drawn = self.decimated()
+            latest = self.history.latest("time")
+            for column, line in (
+                ("roll", self.roll_line),
+                ("pitch", self.pitch_line),
+                ("yaw", self.yaw_line),
+            ):
+                x_data, y_data = self.drawn[column]
+                line.set_data(x_data - latest if len(x_data) else x_data, y_data)
+            return self.rescale_if_needed()
+        return False
+
+    def points(self) -> int:
+        """Points per line: max_points, else one per pixel of the axes width."""
+        if self.max_points is not None:
+            return self.max_points
+        return max(int(self.ax.get_window_extent().width), 2)
+
+    def decimated(self):
+        """{column: (times, values)} to draw, reduced to about points() x values."""
+        if self.lod is None:
+            times = self.time_data
+            return {
+                column: (times, self.history.view(column))
+                for column in ("roll", "pitch", "yaw")
+            }
+        return self.lod.decimate(self.points(), self.decimation)
+
+    def rescale_if_needed(self, margin: float = 0.1):
+        """Widen the x limits only when the data leaves them; y is autoscaled,
+        or only widened with grow_only.
+
+        Returns True when the limits changed, i.e. the static background
+        (ticks, grid) has to be redrawn.
+        """
+        if len(self.history) == 0:
+            return False
+        rescaled = False
+        times = self.time_data
+        span = times[-1] - times[0]
+        x_min, _ = self.ax.get_xlim()
+        if -span < x_min:
+            # Grow in steps so a filling history does not rescale on every sample.
+            self.ax.set_xlim(-span * self.x_growth, 0)
+            rescaled = True
+
+        if not self.grow_only:
+            y_limits = self.ax.get_ylim()
+            # The drawn lines keep every extreme, and are far shorter than the history.
+            self.ax.relim()
+            self.ax.autoscale_view(scalex=False)
+            return rescaled or self.ax.get_ylim() != y_limits
+
+        y_values = [
+            values
+            for _, values in (self.drawn or self.decimated()).values()
+            if not np.isnan(values).all()
+        ]
+        if not y_values:
+            return rescaled
+        y_low = min(np.nanmin(values) for values in y_values)
+        y_high = max(np.nanmax(values) for values in y_values)
+        y_min, y_max = self.ax.get_ylim()
+        if y_low < y_min or y_high > y_max:
+            span = max(y_high, y_max) - min(y_low, y_min)
+            self.ax.set_ylim(
+                min(y_low, y_min) - span * margin, max(y_high, y_max) + span * margin
+            )
+            rescaled = True
+        return rescaled
+
+    def animated_artists(self):
+        return [
+            self.roll_line,
+            self.pitch_line,
+            self.yaw_line,
+            self.roll_text,
+            self.pitch_text,
+            self.yaw_text,
+        ]
+
+    def add_data(self, data: typing.List[float], timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.history.append(
+            (
+                timestamp,
+                np.nan if data[0] is None else data[0],
+                np.nan if data[1] is None else data[1],
+                np.nan if data[2] is None else data[2],
+            )
+        )
+        if self.lod is not None:
+            self.lod.update(1)
+
+    def add_block(self, block, timestamps=None):
+        """Append many samples at once; block has shape (3, samples)."""
+        block = np.asarray(block, dtype=np.float64)
+        if timestamps is None:
+            timestamps = np.full(block.shape[1], time.monotonic())
+        self.history.extend(np.vstack((timestamps, block)))
+        if self.lod is not None:
+            self.lod.update(block.shape[1])
+
+    def add_records(self, records):
+        """Append the roll, pitch and yaw of every AngleRecord in records,
+        at the records' timestamps."""
+        angles = [record for record in records if type(record) is AngleRecord]
+        if angles:
+            block = np.array(
+                [(record.roll, record.pitch, record.yaw) for record in angles],
+                dtype=np.float64,
+            ).T
+            now_ns = time.monotonic_ns()
+            timestamps = np.array(
+                [
+                    now_ns if record.timestamp_ns is None else record.timestamp_ns
+                    for record in angles
+                ],
+                dtype=np.int64,
+            )
+            self.add_block(block, timestamps / 1e9)
+        return len(angles)
+
+    def set_ax(self, ax):
+        self.ax = ax
+        self.ax.set_xlim(-1, 0)
+        self.ax.set_xlabel("Time [s]")
+        (self.roll_line,) = self.ax.plot([], [], label="Roll")
+        (self.pitch_line,) = self.ax.plot([], [], label="Pitch")
+        (self.yaw_line,) = self.ax.plot([], [], label="Yaw")
+
+        self.roll_text = self.ax.text(
+            0.0,
+            1.06,
+            "Roll: N/A",
+            transform=self.ax.transAxes,
+            verticalalignment="top",
+            color="blue",
+        )
+        self.pitch_text = self.ax.text(
+            0.3,
+            1.06,
+            "Pitch: N/A",
+            transform=self.ax.transAxes,
+            verticalalignment="top",
+            color="orange",
+        )
+        self.yaw_text = self.ax.text(
+            0.6,
+            1.06,
+            "Yaw: N/A",
+            transform=self.ax.transAxes,
+            verticalalignment="top",
+            color="green",
+        )
+        self.ax.legend()
+
+
+# 磁場の方向と強さをグラフにプロットする。
+# matplotlibのquiver関数を使用して、磁場の方向を矢印で表示する。磁力は数値
+class DirectionPlotter:
+    def __init__(self) -> None:
+        self.rad = 0
+        self.magnetic_strength = 0
+        self.arrow = None
+        self.magnetic_strength_text = None
+
+    def update_plot(self, _):
+        self.arrow.set_UVC(np.cos(self.rad), np.sin(self.rad))
+        self.magnetic_strength_text.set_text(
+            f"Magnetic Strength: {self.magnetic_strength:.2f}"
+        )
+        # The limits are fixed to the unit circle, so no rescale is ever needed.
+        return False
+
+    def animated_artists(self):
+        return [self.arrow, self.magnetic_strength_text]
+
+    def set_ax(self, ax):
+        self.ax = ax
+        self.setup_plot()
+
+    def setup_plot(self):
+        self.ax.set_xlim(-1, 1)
+        self.ax.set_ylim(-1, 1)
+        self.ax.grid(True)
+        self.ax.set_aspect("equal", "box")
+        self.ax.axhline(y=0, color="k")
+        self.ax.axvline(x=0, color="k")
+        self.arrow = self.ax.quiver(
+            0,
+            0,
+            np.cos(self.rad),
+            np.sin(self.rad),
+            angles="xy",
+            scale_units="xy",
+            scale=1,
+            color="r",
+        )
+        self.magnetic_strength_text = self.ax.text(
+            0.95,
+            1.06,
+            f"Magnetic Strength: {self.magnetic_strength:.2f}",
+            verticalalignment="top",
+            horizontalalignment="right",
+            transform=self.ax.transAxes,
+            color="blue",
+            fontsize=10,
+        )
+
+    def add_data(self, direction_data: typing.List[float]):
+        if not direction_data or len(direction_data) < 2:
+            return
+        self.rad = np.deg2rad(direction_data[0])
+        self.magnetic_strength = direction_data[1]
+
+    def add_records(self, records):
+        """Show the newest MagneticFieldRecord in records; the arrow has no history."""
+        for record in reversed(records):
+            if type(record) is MagneticFieldRecord:
+                self.add_data((record.direction, record.strength))
+                return True
+        return False
+
+
+# 角度プロットと磁場磁力プロットをコンバインして二つのグラフを同時に表示する為のクラス。
+# blit=Trueの場合、軸・グリッド・凡例などの静的な背景をキャッシュし、
+# 変化したライン・矢印・テキストだけを再描画する。
+class CombinedPlotter(FigureCanvas):
+    def __init__(
+        self,
+        angular_plotter,
+        direction_plotter,
+        angular_data,
+        magnetic_field_data,
+        blit=False,
+        interval=100,
+        tracer=None,
+    ) -> None:
+        self.fig, self.axs = plt.subplots(nrows=1, ncols=2, figsize=(6, 4))
+        super().__init__(self.fig)
+        self.angular_plotter = angular_plotter
+        self.direction_plotter = direction_plotter
+        self.angular_data = angular_data
+        self.magnetic_field_data = magnetic_field_data
+
+        self.angular_plotter.set_ax(self.axs[0])
+        self.direction_plotter.set_ax(self.axs[1])
+
+        self.blit_enabled = blit
+        # Blitting only pays off if the axes rarely change.
+        self.angular_plotter.grow_only = blit
+        self.background = None
+        self.data_updated = False
+        # Redraw statistics, read by src.metrics.
+        self.redraws = 0
+        self.redraw_seconds = 0.0
+        self.last_redraw_seconds = 0.0
+        # Optional LatencyTracer; arrival times of samples not yet on screen.
+        self.tracer = tracer
+        self.undrawn_ns = []
+
+        if blit:
+            self.animated = (
+                self.angular_plotter.animated_artists()
+                + self.direction_plotter.animated_artists()
+            )
+            for artist in self.animated:
+                artist.set_animated(True)
+            self.mpl_connect("draw_event", self.on_draw)
+            # FuncAnimation would request a full draw_idle() on every frame.
+            self.timer = self.new_timer(interval=interval)
+            self.timer.add_callback(self.update_plots, None)
+            self.timer.start()
+        else:
+            self.ani = FuncAnimation(
+                self.fig, self.update_plots, interval=interval, save_count=300
+            )
+
+    def add_records(self, records):
+        """Feed a decoded batch into the plot histories; drawn on the next tick."""
+        if self.tracer is not None:
+            arrivals = [r.timestamp_ns for r in records if r.timestamp_ns is not None]
+            self.tracer.since_many("plot_update", arrivals)
+            self.undrawn_ns.extend(arrivals)
+        if self.angular_plotter.add_records(records):
+            self.angular_data = tuple(
+                self.angular_plotter.history.latest(column)
+                for column in ("roll", "pitch", "yaw")
+            )
+            self.data_updated = True
+        if self.direction_plotter.add_records(records):
+            self.magnetic_field_data = (
+                np.rad2deg(self.direction_plotter.rad),
+                self.direction_plotter.magnetic_strength,
+            )
+            self.data_updated = True
+
+    # The timer only redraws; samples are pushed by add_records as they arrive.
+    def update_plots(self, frame):
+        if self.data_updated:
+            started = time.perf_counter()
+            rescaled = self.angular_plotter.update_plot(None)
+            rescaled = self.direction_plotter.update_plot(None) or rescaled
+            if self.blit_enabled and not rescaled and self.background is not None:
+                self.blit_animated()
+            else:
+                self.draw()
+            self.data_updated = False
+            self.last_redraw_seconds = time.perf_counter() - started
+            self.redraw_seconds += self.last_redraw_seconds
+            self.redraws += 1
+            if self.tracer is not None and self.undrawn_ns:
+                self.tracer.since_many("draw", self.undrawn_ns)
+                self.undrawn_ns.clear()
+
+    # Called after every full draw: cache the static background and
+    # paint the animated artists, which a full draw skips.
+    def on_draw(self, event):
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        for artist in self.animated:
+            self.fig.draw_artist(artist)
+
+    def blit_animated(self):
+        self.restore_region(self.background)
+        self.draw_animated()
+        self.blit(self.fig.bbox)
+
+    def set_data_updated(self):
+        self.data_updated = True
+
+    def show(self):
+        plt.tight_layout()
+        plt.show()
+
+
+# dataprocessorはDataProcessorかBroadcastBusの購読者 (src.broadcast.Subscription)。
+async def update_plots(combined_plotter, dataprocessor, display_device=None):
+    try:
+        while True:
+            # Everything queued since the last wakeup goes into the history at once.
+            batch = await dataprocessor.read_batch()
+            if display_device is None:
+                records = dataprocessor.records
+            else:
+                records = batch.get(display_device, [])
+            combined_plotter.add_records(records)
+    except asyncio.CancelledError as e:
+        print(f"update_plots: {e}")
+
+
+class MainWindow(QMainWindow):
+    def __init__(
+        self, combained_plotter, serial_receive_task=None, update_task=None
+    ) -> None:
+        super().__init__()
+        self.setWindowTitle("Plot")
+        self.setGeometry(100, 100, 900, 400)
+
+        self.serial_receive_task = serial_receive_task
+        self.update_task = update_task
+        self.combinedPlotter = combained_plotter
+
+        widget = QWidget(self)
+        self.setCentralWidget(widget)
+
+        layout = QVBoxLayout(widget)
+
+        layout.addWidget(combained_plotter)
+
+    def closeEvent(self, event):
+        # Without tasks the window runs in its own process (see src.gui_process).
+        if self.serial_receive_task is not None:
+            asyncio.create_task(self.async_cleanup())
+        super().closeEvent(event)
+
+    async def async_cleanup(self):
+        try:
+            self.serial_receive_task.cancel()
+            self.update_task.cancel()
+            await asyncio.gather(
+                self.serial_receive_task, self.update_task, return_exceptions=True
+            )
+
+            QCoreApplication.quit()
+            print("end")
+        except asyncio.CancelledError as e:
+            print(f"closeEvent: {e}")
+
+
+# プログラムのエントリーポイント。
+# 各クラスのインスタンスを作成してプログラムを実行する。
+async def main():
+
+    asyncserialmanager = AsyncSerialManager("COM3", 9600, waittime=0.1)
+    # Default [filter] stages, so angles are unwrapped as in the other apps.
+    dataprocessor = create_processor(configparser.ConfigParser(), asyncserialmanager)
+
+    # シリアル通信のタスクを開始
+    task = asyncio.create_task(asyncserialmanager.run())
+
+    direction_plotter = DirectionPlotter()
+    angular_plotter = AngularPlotter()
+
+    combined_plotter = CombinedPlotter(
+        angular_plotter,
+        direction_plotter,
+        [],
+        [],
+    )
+
+    # プロットの更新タスクを開始
+    update_task = asyncio.create_task(update_plots(combined_plotter, dataprocessor))
+
+    main_window = MainWindow(combined_plotter, task, update_task)
+    main_window.show()
+
+    # シリアル通信とプロット更新のタスクを待機
+    await asyncio.gather(task, update_task)
+
+    await asyncserialmanager.close_connection()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    app = QApplication(sys.argv)
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(main())
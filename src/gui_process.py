@@ -0,0 +1,205 @@
+"""
+取得・解析とGUIを別プロセスで動かすエントリーポイント
+
+    python -m src.gui_process --config config/config.ini
+
+The parent process reads the port and decodes; the plot window runs in a
+spawned child. Samples cross over through SharedRingBuffer, so a slow
+redraw no longer delays serial reads.
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+from src.acquisition import (
+    create_bus,
+    create_processor,
+    create_recorder,
+    create_source,
+    display_device,
+    display_policy,
+    load_config,
+)
+from src.broadcast import publish_batches
+from src.decimation import decimation_setting
+from src.hwt905_records import AngleRecord, MagneticFieldRecord
+from src.log_config import configure_logging_from_config
+from src.metrics import pipeline_registry, start_metrics_server, stop_metrics_server
+from src.net_stream import start_stream_server, stop_stream_server
+from src.shared_ring import SharedRingBuffer
+
+logger = logging.getLogger(__name__)
+
+ANGLE_COLUMNS = ("time", "roll", "pitch", "yaw")
+MAGNETIC_COLUMNS = ("time", "direction", "strength")
+
+
+def record_time(record, timestamp) -> float:
+    """Arrival time of a record in seconds; timestamp when it has none."""
+    if record.timestamp_ns is None:
+        return timestamp
+    return record.timestamp_ns / 1e9
+
+
+def angle_rows(records, timestamp) -> np.ndarray:
+    rows = [
+        (record_time(record, timestamp), record.roll, record.pitch, record.yaw)
+        for record in records
+        if type(record) is AngleRecord
+    ]
+    return np.array(rows, dtype=np.float64).reshape(-1, len(ANGLE_COLUMNS))
+
+
+def magnetic_rows(records, timestamp) -> np.ndarray:
+    rows = [
+        (record_time(record, timestamp), record.direction, record.strength)
+        for record in records
+        if type(record) is MagneticFieldRecord
+    ]
+    return np.array(rows, dtype=np.float64).reshape(-1, len(MAGNETIC_COLUMNS))
+
+
+# 解析したバッチを共有メモリに書き込む (取得側のプロセス)
+# subscriptionはDataProcessorかBroadcastBusの購読者。
+async def publish_records(subscription, angle_ring, magnetic_ring, device=None):
+    while True:
+        batch = await subscription.read_batch()
+        records = subscription.records if device is None else batch.get(device, [])
+        now = time.monotonic()
+        angle_ring.write(angle_rows(records, now))
+        magnetic_ring.write(magnetic_rows(records, now))
+
+
+def drain_rings(combined_plotter, angle_ring, magnetic_ring):
+    """Move every sample published since the last call into the plotters."""
+    angles = angle_ring.read()
+    if len(angles):
+        combined_plotter.angular_plotter.add_block(angles[:, 1:].T, angles[:, 0])
+        combined_plotter.set_data_updated()
+    magnetic = magnetic_ring.read()
+    if len(magnetic):
+        combined_plotter.direction_plotter.add_data(magnetic[-1, 1:])
+        combined_plotter.set_data_updated()
+
+
+# GUI側のプロセス。matplotlibとPyQt5はこのプロセスでだけ読み込む。
+def run_gui(
+    angle_name, magnetic_name, capacity, history, blit, interval, plot_options=None
+):
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+
+    from src.gui import AngularPlotter, CombinedPlotter, DirectionPlotter, MainWindow
+
+    angle_ring = SharedRingBuffer.attach(angle_name, capacity, ANGLE_COLUMNS)
+    magnetic_ring = SharedRingBuffer.attach(magnetic_name, capacity, MAGNETIC_COLUMNS)
+
+    app = QApplication(sys.argv)
+    combined_plotter = CombinedPlotter(
+        AngularPlotter(history=history, **(plot_options or {})),
+        DirectionPlotter(),
+        [],
+        [],
+        blit=blit,
+        interval=interval,
+    )
+    timer = QTimer()
+    timer.timeout.connect(
+        lambda: drain_rings(combined_plotter, angle_ring, magnetic_ring)
+    )
+    timer.start(interval)
+
+    main_window = MainWindow(combined_plotter)
+    main_window.show()
+    try:
+        app.exec_()
+    finally:
+        timer.stop()
+        angle_ring.close()
+        magnetic_ring.close()
+
+
+async def run(config, gui, angle_ring, magnetic_ring):
+    recorder = create_recorder(config)
+    source = create_source(config, recorder)
+    dataprocessor = create_processor(config, source)
+    bus = create_bus(config)
+    subscription = bus.subscribe("gui", policy=display_policy(config))
+    stream_server = await start_stream_server(config, bus)
+    # Redraw times stay in the GUI process and are not exported here.
+    metrics_server = await start_metrics_server(
+        config,
+        pipeline_registry(
+            source, dataprocessor, bus=bus, stream_server=stream_server
+        ),
+    )
+
+    source_task = asyncio.create_task(source.run())
+    decode_task = asyncio.create_task(publish_batches(dataprocessor, bus))
+    publish_task = asyncio.create_task(
+        publish_records(subscription, angle_ring, magnetic_ring, display_device(config))
+    )
+    tasks = (source_task, decode_task, publish_task)
+    try:
+        # Acquisition stops when the plot window is closed.
+        while gui.is_alive() and not source_task.done():
+            await asyncio.sleep(0.2)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await source.close_connection()
+        await stop_stream_server(stream_server)
+        await stop_metrics_server(metrics_server)
+        if recorder is not None:
+            await recorder.aclose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HWT905 plot in a separate process")
+    parser.add_argument("--config", default="config/config.ini")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    configure_logging_from_config(config)
+    capacity = config.getint("plot_set", "ringsize", fallback=4096)
+    angle_ring = SharedRingBuffer.create(capacity, ANGLE_COLUMNS)
+    magnetic_ring = SharedRingBuffer.create(capacity, MAGNETIC_COLUMNS)
+
+    # spawn: the child must not inherit the parent's event loop or open port.
+    gui = multiprocessing.get_context("spawn").Process(
+        target=run_gui,
+        args=(
+            angle_ring.name,
+            magnetic_ring.name,
+            capacity,
+            config.getint("plot_set", "history", fallback=100),
+            config.getboolean("plot_set", "blit", fallback=False),
+            config.getint("plot_set", "interval", fallback=100),
+            decimation_setting(config),
+        ),
+        daemon=True,
+    )
+    gui.start()
+    try:
+        asyncio.run(run(config, gui, angle_ring, magnetic_ring))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if gui.is_alive():
+            gui.terminate()
+        gui.join()
+        for ring in (angle_ring, magnetic_ring):
+            ring.close()
+            ring.unlink()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
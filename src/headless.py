@@ -0,0 +1,134 @@
+"""
+GUIなしでセンサーデータを取得するエントリーポイント
+
+    python -m src.headless --capture captures/session.bin
+    python -m src.headless --forward > samples.tsv
+    python -m src.headless --stream-port 9106
+
+matplotlib, PyQt5 and qasync are never imported, so this runs on hosts
+without a display and restarts quickly.
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from src.acquisition import (
+    create_bus,
+    create_processor,
+    create_recorder,
+    create_source,
+    load_config,
+)
+from src.broadcast import publish_batches
+from src.log_config import configure_logging_from_config
+from src.metrics import pipeline_registry, start_metrics_server, stop_metrics_server
+from src.net_stream import start_stream_server, stop_stream_server
+from src.receive_queue import BLOCK
+
+logger = logging.getLogger(__name__)
+
+
+def format_record(device_id, record) -> str:
+    values = "\t".join(str(value) for value in record.astuple())
+    return f"{device_id or '-'}\t{type(record).__name__}\t{values}\n"
+
+
+# 解析したレコードを1行ずつ出力する。outputがNoneの場合は解析だけ行う。
+# subscriptionはDataProcessorかBroadcastBusの購読者。
+async def forward_records(subscription, output=None):
+    while True:
+        batch = await subscription.read_batch()
+        if output is not None:
+            output.writelines(
+                format_record(device_id, record)
+                for device_id, records in batch.items()
+                for record in records
+            )
+
+
+async def drain(queue, subscription):
+    """Wait until the queued chunks are decoded and the subscriber has read them."""
+    await queue.join()
+    await subscription.caught_up()
+
+
+async def run(config, output=None):
+    recorder = create_recorder(config)
+    source = create_source(config, recorder)
+    dataprocessor = create_processor(config, source)
+    bus = create_bus(config)
+    # The forwarder must not lose records, so it holds back the bus if it lags.
+    forward = bus.subscribe("forward", policy=BLOCK)
+    stream_server = await start_stream_server(config, bus)
+    metrics_server = await start_metrics_server(
+        config,
+        pipeline_registry(
+            source, dataprocessor, bus=bus, stream_server=stream_server
+        ),
+    )
+
+    source_task = asyncio.create_task(source.run())
+    decode_task = asyncio.create_task(publish_batches(dataprocessor, bus))
+    forward_task = asyncio.create_task(forward_records(forward, output))
+    tasks = (source_task, decode_task, forward_task)
+    try:
+        await source_task
+        # Decode and forward whatever the source queued before it finished.
+        drained = asyncio.create_task(drain(source.result_queue, forward))
+        tasks += (drained,)
+        # A failed decoder or forwarder would never catch up; stop with it.
+        await asyncio.wait(
+            (drained, decode_task, forward_task),
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await source.close_connection()
+        await stop_stream_server(stream_server)
+        await stop_metrics_server(metrics_server)
+        if recorder is not None:
+            await recorder.aclose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless HWT905 acquisition")
+    parser.add_argument("--config", default="config/config.ini")
+    parser.add_argument("--capture", help="record raw data to this capture file")
+    parser.add_argument("--replay", help="read a capture file instead of the port")
+    parser.add_argument("--speed", type=float, help="replay speed (0: no waiting)")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics")
+    parser.add_argument("--stream-port", type=int, help="stream samples over TCP")
+    parser.add_argument("--stream-udp-port", type=int, help="stream samples over UDP")
+    parser.add_argument(
+        "--forward", action="store_true", help="write decoded records to stdout"
+    )
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    configure_logging_from_config(config)
+    for section, key, value in (
+        ("capture", "path", args.capture),
+        ("replay", "path", args.replay),
+        ("replay", "speed", args.speed),
+        ("metrics", "port", args.metrics_port),
+        ("stream", "tcpport", args.stream_port),
+        ("stream", "udpport", args.stream_udp_port),
+    ):
+        if value is not None:
+            if not config.has_section(section):
+                config.add_section(section)
+            config.set(section, key, str(value))
+
+    try:
+        asyncio.run(run(config, sys.stdout if args.forward else None))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
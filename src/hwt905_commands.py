@@ -0,0 +1,152 @@
+import asyncio
+import typing
+
+from src.hwt905_records import TIME_OUTPUT
+
+# HWT905の設定コマンド: 0xFF, 0xAA, レジスタ, 値の下位バイト, 値の上位バイト
+COMMAND_PREFIX = b"\xff\xaa"
+
+REGISTER_SAVE = 0x00
+REGISTER_OUTPUT_CONTENT = 0x02
+REGISTER_OUTPUT_RATE = 0x03
+REGISTER_BAUD_RATE = 0x04
+REGISTER_UNLOCK = 0x69
+
+UNLOCK_KEY = 0xB588
+
+# Output rate in Hz -> RRATE value
+OUTPUT_RATES = {
+    0.2: 0x01,
+    0.5: 0x02,
+    1: 0x03,
+    2: 0x04,
+    5: 0x05,
+    10: 0x06,
+    20: 0x07,
+    50: 0x08,
+    100: 0x09,
+    125: 0x0A,
+    200: 0x0B,
+}
+
+# Baud rate -> BAUD value
+BAUD_RATES = {
+    4800: 0x01,
+    9600: 0x02,
+    19200: 0x03,
+    38400: 0x04,
+    57600: 0x05,
+    115200: 0x06,
+    230400: 0x07,
+    460800: 0x08,
+    921600: 0x09,
+}
+
+
+def build_command(register: int, value: int = 0) -> bytes:
+    return COMMAND_PREFIX + bytes([register, value & 0xFF, (value >> 8) & 0xFF])
+
+
+def unlock_command() -> bytes:
+    return build_command(REGISTER_UNLOCK, UNLOCK_KEY)
+
+
+def save_command() -> bytes:
+    return build_command(REGISTER_SAVE, 0)
+
+
+def output_rate_command(rate_hz) -> bytes:
+    if rate_hz not in OUTPUT_RATES:
+        raise ValueError(f"Unsupported output rate: {rate_hz} Hz")
+    return build_command(REGISTER_OUTPUT_RATE, OUTPUT_RATES[rate_hz])
+
+
+def content_mask(frame_types: typing.Iterable[int]) -> int:
+    """RSW bits: bit n enables frame type 0x50 + n."""
+    mask = 0
+    for frame_type in frame_types:
+        bit = frame_type - TIME_OUTPUT
+        if not 0 <= bit <= 10:
+            raise ValueError(f"Unknown frame type: 0x{frame_type:02X}")
+        mask |= 1 << bit
+    return mask
+
+
+def output_content_command(frame_types: typing.Iterable[int]) -> bytes:
+    return build_command(REGISTER_OUTPUT_CONTENT, content_mask(frame_types))
+
+
+def baud_rate_command(baudrate: int) -> bytes:
+    if baudrate not in BAUD_RATES:
+        raise ValueError(f"Unsupported baud rate: {baudrate}")
+    return build_command(REGISTER_BAUD_RATE, BAUD_RATES[baudrate])
+
+
+def parse_frame_types(text: str) -> typing.Optional[typing.List[int]]:
+    """Parse "0x53, 0x54" into [0x53, 0x54]; an empty string means no change."""
+    if not text or not text.strip():
+        return None
+    return [int(item, 0) for item in text.split(",") if item.strip()]
+
+
+def baudrate_setting(config, section, fallback=9600):
+    """The baudrate key of a section; "auto" (None) makes the manager probe it."""
+    value = config.get(section, "baudrate", fallback=str(fallback)).strip()
+    return None if value.lower() == "auto" else int(value)
+
+
+def sensor_settings(config, section):
+    """Sensor keys of a config section as AsyncSerialManager kwargs."""
+    rate = config.get(section, "outputrate", fallback="").strip()
+    target = config.get(section, "targetbaudrate", fallback="").strip()
+    return {
+        "target_baudrate": int(target) if target else None,
+        "output_rate": float(rate) if rate else None,
+        "output_content": parse_frame_types(
+            config.get(section, "outputcontent", fallback="")
+        ),
+    }
+
+
+# 送信チャネルを使ってHWT905の設定を変更するクラス。
+# 設定レジスタは解除 (unlock) の後にだけ書き込め、saveで電源を切っても保持される。
+# センサーがコマンドを処理する時間として、各コマンドの後にdelay秒待つ。
+class HWT905Config:
+    def __init__(self, channel, delay: float = 0.1) -> None:
+        self.channel = channel
+        self.delay = delay
+
+    async def send(self, command: bytes):
+        await self.channel.send(command)
+        await asyncio.sleep(self.delay)
+
+    async def unlock(self):
+        await self.send(unlock_command())
+
+    async def save(self):
+        await self.send(save_command())
+
+    async def set_output_rate(self, rate_hz):
+        await self.send(output_rate_command(rate_hz))
+
+    async def set_output_content(self, frame_types: typing.Iterable[int]):
+        await self.send(output_content_command(frame_types))
+
+    async def set_baud_rate(self, baudrate: int):
+        await self.send(baud_rate_command(baudrate))
+
+    async def configure(self, output_rate=None, output_content=None, save=True):
+        """Unlock, apply the given settings and optionally save them."""
+        # Validate everything before the sensor is unlocked.
+        commands = []
+        if output_rate is not None:
+            commands.append(output_rate_command(output_rate))
+        if output_content is not None:
+            commands.append(output_content_command(output_content))
+        if not commands:
+            return
+        await self.unlock()
+        for command in commands:
+            await self.send(command)
+        if save:
+            await self.save()
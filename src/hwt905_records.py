@@ -0,0 +1,230 @@
+import calendar
+import math
+import struct
+
+# HWT905のフレームタイプ (0x55 の次のバイト)
+TIME_OUTPUT = 0x50
+ACCELERATION_OUTPUT = 0x51
+ANGULAR_VELOCITY_OUTPUT = 0x52
+ANGLE_OUTPUT = 0x53
+MAGNETIC_FIELD_OUTPUT = 0x54
+PORT_STATUS_OUTPUT = 0x55
+PRESSURE_OUTPUT = 0x56
+GPS_POSITION_OUTPUT = 0x57
+GPS_SPEED_OUTPUT = 0x58
+QUATERNION_OUTPUT = 0x59
+GPS_ACCURACY_OUTPUT = 0x5A
+
+_INT16X4 = struct.Struct("<hhhh")
+_UINT16X4 = struct.Struct("<HHHH")
+_INT32X2 = struct.Struct("<ii")
+_GPS_SPEED = struct.Struct("<hhi")
+_TIME = struct.Struct("<BBBBBBH")
+
+
+# 解析結果のレコードの基底クラス。
+# 長時間分のデータをバッファするため、__slots__でインスタンスを小さくしている。
+# timestamp_ns はフレームの受信時刻 (time.monotonic_ns)。値の比較には含めない。
+class HWT905Record:
+    __slots__ = ("timestamp_ns",)
+    frame_type = None
+
+    def __init__(self, *values) -> None:
+        self.timestamp_ns = None
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def astuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.astuple() == other.astuple()
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in self.__slots__
+        )
+        return f"{type(self).__name__}({fields})"
+
+
+class TimeRecord(HWT905Record):
+    __slots__ = ("year", "month", "day", "hour", "minute", "second", "millisecond")
+    frame_type = TIME_OUTPUT
+
+    def epoch_ns(self):
+        """Sensor clock in nanoseconds since the epoch, or None if it is not set."""
+        try:
+            seconds = calendar.timegm(
+                (self.year, self.month, self.day, self.hour, self.minute, self.second)
+            )
+        except ValueError:
+            return None
+        return seconds * 1_000_000_000 + self.millisecond * 1_000_000
+
+
+class AccelerationRecord(HWT905Record):
+    """Acceleration in g and temperature in degrees Celsius."""
+
+    __slots__ = ("x", "y", "z", "temperature")
+    frame_type = ACCELERATION_OUTPUT
+
+
+class AngularVelocityRecord(HWT905Record):
+    """Angular velocity in deg/s and supply voltage in volts."""
+
+    __slots__ = ("x", "y", "z", "voltage")
+    frame_type = ANGULAR_VELOCITY_OUTPUT
+
+
+class AngleRecord(HWT905Record):
+    """Roll, pitch and yaw in degrees."""
+
+    __slots__ = ("roll", "pitch", "yaw", "version")
+    frame_type = ANGLE_OUTPUT
+
+
+class MagneticFieldRecord(HWT905Record):
+    """Raw magnetic field and temperature in degrees Celsius."""
+
+    __slots__ = ("x", "y", "z", "temperature")
+    frame_type = MAGNETIC_FIELD_OUTPUT
+
+    @property
+    def direction(self):
+        direction = math.atan2(self.y, self.x) * (180 / math.pi)
+        if direction < 0:
+            direction += 360
+        return direction
+
+    @property
+    def strength(self):
+        return math.sqrt(self.x**2 + self.y**2 + self.z**2)
+
+
+class PortStatusRecord(HWT905Record):
+    __slots__ = ("d0", "d1", "d2", "d3")
+    frame_type = PORT_STATUS_OUTPUT
+
+
+class PressureRecord(HWT905Record):
+    """Air pressure in Pa and altitude in metres."""
+
+    __slots__ = ("pressure", "altitude")
+    frame_type = PRESSURE_OUTPUT
+
+
+class GpsPositionRecord(HWT905Record):
+    """Longitude and latitude in decimal degrees."""
+
+    __slots__ = ("longitude", "latitude")
+    frame_type = GPS_POSITION_OUTPUT
+
+
+class GpsSpeedRecord(HWT905Record):
+    """GPS height in m, heading in degrees and ground speed in km/h."""
+
+    __slots__ = ("height", "yaw", "ground_speed")
+    frame_type = GPS_SPEED_OUTPUT
+
+
+class QuaternionRecord(HWT905Record):
+    __slots__ = ("q0", "q1", "q2", "q3")
+    frame_type = QUATERNION_OUTPUT
+
+
+class GpsAccuracyRecord(HWT905Record):
+    __slots__ = ("satellites", "pdop", "hdop", "vdop")
+    frame_type = GPS_ACCURACY_OUTPUT
+
+
+def _degrees_from_ddmm(value):
+    # The sensor sends ddmm.mmmmm scaled by 1e5; south and west are negative.
+    sign = -1 if value < 0 else 1
+    degrees, minutes = divmod(abs(value), 10000000)
+    return sign * (degrees + minutes / 100000 / 60)
+
+
+def _decode_time(frame):
+    year, month, day, hour, minute, second, millisecond = _TIME.unpack_from(frame, 2)
+    return TimeRecord(2000 + year, month, day, hour, minute, second, millisecond)
+
+
+def _decode_acceleration(frame):
+    x, y, z, t = _INT16X4.unpack_from(frame, 2)
+    return AccelerationRecord(
+        x / 32768.0 * 16, y / 32768.0 * 16, z / 32768.0 * 16, t / 100
+    )
+
+
+def _decode_angular_velocity(frame):
+    x, y, z, v = _INT16X4.unpack_from(frame, 2)
+    return AngularVelocityRecord(
+        x / 32768.0 * 2000, y / 32768.0 * 2000, z / 32768.0 * 2000, v / 100
+    )
+
+
+def _decode_angle(frame):
+    roll, pitch, yaw, version = _INT16X4.unpack_from(frame, 2)
+    return AngleRecord(
+        roll / 32768.0 * 180, pitch / 32768.0 * 180, yaw / 32768.0 * 180, version
+    )
+
+
+def _decode_magnetic_field(frame):
+    x, y, z, t = _INT16X4.unpack_from(frame, 2)
+    return MagneticFieldRecord(x, y, z, t / 100)
+
+
+def _decode_port_status(frame):
+    return PortStatusRecord(*_UINT16X4.unpack_from(frame, 2))
+
+
+def _decode_pressure(frame):
+    pressure, height = _INT32X2.unpack_from(frame, 2)
+    return PressureRecord(pressure, height / 100)
+
+
+def _decode_gps_position(frame):
+    longitude, latitude = _INT32X2.unpack_from(frame, 2)
+    return GpsPositionRecord(
+        _degrees_from_ddmm(longitude), _degrees_from_ddmm(latitude)
+    )
+
+
+def _decode_gps_speed(frame):
+    height, yaw, speed = _GPS_SPEED.unpack_from(frame, 2)
+    return GpsSpeedRecord(height / 10, yaw / 100, speed / 1000)
+
+
+def _decode_quaternion(frame):
+    q0, q1, q2, q3 = _INT16X4.unpack_from(frame, 2)
+    return QuaternionRecord(q0 / 32768.0, q1 / 32768.0, q2 / 32768.0, q3 / 32768.0)
+
+
+def _decode_gps_accuracy(frame):
+    satellites, pdop, hdop, vdop = _INT16X4.unpack_from(frame, 2)
+    return GpsAccuracyRecord(satellites, pdop / 100, hdop / 100, vdop / 100)
+
+
+# タイプバイトをキーにしたデコーダの表。新しいタイプを追加しても走査は1回のまま。
+FRAME_DECODERS = {
+    TIME_OUTPUT: _decode_time,
+    ACCELERATION_OUTPUT: _decode_acceleration,
+    ANGULAR_VELOCITY_OUTPUT: _decode_angular_velocity,
+    ANGLE_OUTPUT: _decode_angle,
+    MAGNETIC_FIELD_OUTPUT: _decode_magnetic_field,
+    PORT_STATUS_OUTPUT: _decode_port_status,
+    PRESSURE_OUTPUT: _decode_pressure,
+    GPS_POSITION_OUTPUT: _decode_gps_position,
+    GPS_SPEED_OUTPUT: _decode_gps_speed,
+    QUATERNION_OUTPUT: _decode_quaternion,
+    GPS_ACCURACY_OUTPUT: _decode_gps_accuracy,
+}
+
+
+def decode_frame(frame):
+    """Decode one checksum-validated frame; returns None for unknown types."""
+    decoder = FRAME_DECODERS.get(frame[1])
+    if decoder is None:
+        return None
+    return decoder(frame)
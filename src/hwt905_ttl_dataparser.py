@@ -1,13 +1,53 @@
 import logging
 import math
-from logging.handlers import RotatingFileHandler
+import mmap
+import struct
+import typing
+
+import numpy as np
+
+from src.checksum import sum8
+from src.hwt905_records import (
+    ANGLE_OUTPUT,
+    FRAME_DECODERS,
+    MAGNETIC_FIELD_OUTPUT,
+    HWT905Record,
+    decode_frame,
+)
 
-handler = RotatingFileHandler("app.log", maxBytes=6000000, backupCount=5)
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.addHandler(handler)
+
+# HWT905のフレーム構造: 0x55, タイプ, データ8バイト, チェックサム(先頭10バイトの和の下位8ビット)
+FRAME_HEADER = 0x55
+FRAME_LENGTH = 11
+FRAME_TYPE_MIN = 0x50
+FRAME_TYPE_MAX = 0x5A
+
+_INT16X3 = struct.Struct("<hhh")
+
+# 11バイトのフレームをそのまま読み込むための構造化dtype (リトルエンディアンのint16 x 4)
+FRAME_DTYPE = np.dtype(
+    [
+        ("header", "u1"),
+        ("type", "u1"),
+        ("values", "<i2", (4,)),
+        ("checksum", "u1"),
+    ]
+)
+
+
+# decode_blockの結果。角度・磁場の列は、チェックサムが正しいフレームのみを含む。
+class HWT905FrameBlock(typing.NamedTuple):
+    frame_type: np.ndarray
+    valid: np.ndarray
+    roll: np.ndarray
+    pitch: np.ndarray
+    yaw: np.ndarray
+    magnetic_x: np.ndarray
+    magnetic_y: np.ndarray
+    magnetic_z: np.ndarray
+    heading: np.ndarray
+    magnetic_strength: np.ndarray
 
 
 class HWT905_TTL_Dataparser:
@@ -101,3 +141,212 @@ class HWT905_TTL_Dataparser:
                     direction += 360
 
         return direction, magnetic_strength
+
+    @staticmethod
+    def decode_angular_frame(frame):
+        """Decode one 0x53 frame into (roll, pitch, yaw) in degrees."""
+        roll, pitch, yaw = _INT16X3.unpack_from(frame, 2)
+        return (
+            roll / 32768.0 * 180,
+            pitch / 32768.0 * 180,
+            yaw / 32768.0 * 180,
+        )
+
+    @staticmethod
+    def decode_magnetic_field_frame(frame):
+        """Decode one 0x54 frame into (direction in degrees, magnetic strength)."""
+        x, y, z = _INT16X3.unpack_from(frame, 2)
+        magnetic_strength = math.sqrt(x**2 + y**2 + z**2)
+        direction = math.atan2(y, x) * (180 / math.pi)
+        if direction < 0:
+            direction += 360
+        return direction, magnetic_strength
+
+    @staticmethod
+    def decode_frame(frame) -> typing.Optional[HWT905Record]:
+        """Decode one frame of any type through the FRAME_DECODERS table."""
+        return decode_frame(frame)
+
+    @staticmethod
+    def build_frame(frame_type: int, payload: bytes) -> bytes:
+        """Build a complete frame (header, type, 8 data bytes, checksum)."""
+        body = bytes([FRAME_HEADER, frame_type]) + payload.ljust(8, b"\x00")[:8]
+        return body + bytes([sum8(body)])
+
+    @staticmethod
+    def decode_block(data) -> HWT905FrameBlock:
+        """Decode every aligned frame of a large buffer at once.
+
+        Frames are found the way HWT905StreamDecoder.feed finds them: a damaged
+        frame is kept with valid=False and the search resumes one byte after
+        its header. Unbroken runs of frames are read with np.frombuffer.
+        """
+        if not hasattr(data, "find"):
+            data = bytes(data)
+        raw = np.frombuffer(data, dtype=np.uint8)
+        starts = raw.size - FRAME_LENGTH + 1
+        if starts <= 0:
+            raw, starts = raw[:0], 0
+        types = raw[1 : starts + 1]
+        candidates = np.flatnonzero(
+            (raw[:starts] == FRAME_HEADER)
+            & (types >= FRAME_TYPE_MIN)
+            & (types <= FRAME_TYPE_MAX)
+        )
+        # Checksum of the frame at every offset, from a running byte sum.
+        totals = np.concatenate(([0], np.cumsum(raw, dtype=np.uint32)))
+        sums = totals[FRAME_LENGTH - 1 : starts + FRAME_LENGTH - 1] - totals[:starts]
+        good = (sums & 0xFF).astype(np.uint8) == raw[FRAME_LENGTH - 1 :][:starts]
+
+        segments = []
+        valid = []
+        index = 0
+        while index < candidates.size:
+            start = int(candidates[index])
+            count = _good_run(good, start)
+            if count:
+                segments.append(
+                    np.frombuffer(data, dtype=FRAME_DTYPE, count=count, offset=start)
+                )
+                valid.append(np.ones(count, dtype=bool))
+                pos = start + count * FRAME_LENGTH
+            else:
+                # データ破損。次の0x55から再同期する。
+                segments.append(
+                    np.frombuffer(data, dtype=FRAME_DTYPE, count=1, offset=start)
+                )
+                valid.append(np.zeros(1, dtype=bool))
+                pos = start + 1
+            index = int(np.searchsorted(candidates, pos))
+
+        if segments:
+            records = np.concatenate(segments)
+            valid = np.concatenate(valid)
+        else:
+            records = np.empty(0, dtype=FRAME_DTYPE)
+            valid = np.empty(0, dtype=bool)
+        frame_type = records["type"].copy()
+
+        angles = records["values"][valid & (frame_type == ANGLE_OUTPUT), :3]
+        angles = angles / 32768.0 * 180
+        magnetic = records["values"][valid & (frame_type == MAGNETIC_FIELD_OUTPUT), :3]
+        magnetic = magnetic.astype(np.float64)
+        heading = np.degrees(np.arctan2(magnetic[:, 1], magnetic[:, 0])) % 360
+        strength = np.sqrt(np.square(magnetic).sum(axis=1))
+
+        return HWT905FrameBlock(
+            frame_type=frame_type,
+            valid=valid,
+            roll=angles[:, 0],
+            pitch=angles[:, 1],
+            yaw=angles[:, 2],
+            magnetic_x=magnetic[:, 0],
+            magnetic_y=magnetic[:, 1],
+            magnetic_z=magnetic[:, 2],
+            heading=heading,
+            magnetic_strength=strength,
+        )
+
+    @staticmethod
+    def decode_file(path) -> HWT905FrameBlock:
+        """Memory-map a raw capture file and decode it with decode_block."""
+        with open(path, "rb") as f:
+            if f.seek(0, 2) == 0:
+                return HWT905_TTL_Dataparser.decode_block(b"")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return HWT905_TTL_Dataparser.decode_block(mapped)
+
+
+def _good_run(good, start) -> int:
+    """Number of back-to-back frames from start whose checksums are all good.
+
+    Checked in growing windows, so the cost follows the run, not the buffer.
+    """
+    count = 0
+    window = 64
+    while True:
+        chunk = good[start + count * FRAME_LENGTH :: FRAME_LENGTH][:window]
+        broken = np.flatnonzero(~chunk)
+        if broken.size:
+            return count + int(broken[0])
+        count += chunk.size
+        if chunk.size < window:
+            return count
+        window *= 2
+
+
+# 受信データをチャンクをまたいで連続的に解析するクラス。
+# 読み込み間で途中までのフレームを保持し、チェックサムが正しいフレームだけを返す。
+class HWT905StreamDecoder:
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self.frames_decoded = 0
+        self.checksum_errors = 0
+        # Headers followed by an invalid type byte (0x55 inside garbage).
+        self.resync_skips = 0
+        self.skipped_bytes = 0
+        self.frames_by_type = dict.fromkeys(FRAME_DECODERS, 0)
+
+    def feed(self, data) -> typing.List[bytes]:
+        """Append received bytes and return every complete, valid frame.
+
+        An incomplete frame at the end of the data is kept until the next call,
+        so each frame is returned exactly once.
+        """
+        buffer = self._buffer
+        if data:
+            buffer += data
+        frames = []
+        find = buffer.find
+        end = len(buffer)
+        pos = 0
+        while True:
+            start = find(FRAME_HEADER, pos)
+            if start < 0:
+                self.skipped_bytes += end - pos
+                pos = end
+                break
+            self.skipped_bytes += start - pos
+            if end - start < FRAME_LENGTH:
+                pos = start
+                break
+            stop = start + FRAME_LENGTH
+            if not FRAME_TYPE_MIN <= buffer[start + 1] <= FRAME_TYPE_MAX:
+                # 偽のヘッダ。次の0x55から再同期する。
+                self.resync_skips += 1
+                self.skipped_bytes += 1
+                pos = start + 1
+                continue
+            if sum(buffer[start : stop - 1]) & 0xFF != buffer[stop - 1]:
+                # データ破損。次の0x55から再同期する。
+                self.checksum_errors += 1
+                self.skipped_bytes += 1
+                pos = start + 1
+                continue
+            frames.append(bytes(buffer[start:stop]))
+            pos = stop
+        del buffer[:pos]
+        self.frames_decoded += len(frames)
+        return frames
+
+    def decode(self, data, timestamp_ns=None) -> typing.List[HWT905Record]:
+        """Feed received bytes and decode every complete frame into a record.
+
+        Records are stamped with timestamp_ns, the arrival time of the chunk
+        that completed them.
+        """
+        records = []
+        counts = self.frames_by_type
+        for frame in self.feed(data):
+            frame_type = frame[1]
+            decoder = FRAME_DECODERS.get(frame_type)
+            if decoder is not None:
+                counts[frame_type] += 1
+                record = decoder(frame)
+                record.timestamp_ns = timestamp_ns
+                records.append(record)
+        return records
+
+    def reset(self):
+        """Discard any partially received frame."""
+        self._buffer.clear()
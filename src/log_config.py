@@ -0,0 +1,133 @@
+import atexit
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DEFAULT_LOG_PATH = "logs/apps.log"
+# Per-packet messages (receive, send, write buffer) go to this logger.
+PACKET_LOGGER = "src.packets"
+
+_listener = None
+_queue_handler = None
+
+
+# 受信ごとに出るログを間引くフィルタ。
+# sample_every件に1件だけ通し、さらにrate件/秒を超えた分は捨てる。
+# 捨てた件数は次に通したログに付け足す。
+class RateLimitFilter(logging.Filter):
+    def __init__(self, rate=10.0, sample_every=1, burst=None, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate
+        self.sample_every = max(1, sample_every)
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.clock = clock
+        self.suppressed = 0
+        self._pending = 0
+        self._seen = 0
+        self._tokens = self.burst
+        self._last = clock()
+
+    def filter(self, record):
+        self._seen += 1
+        if self._seen % self.sample_every:
+            return self._suppress()
+        if self.rate > 0:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens < 1:
+                return self._suppress()
+            self._tokens -= 1
+        if self._pending and isinstance(record.args, tuple):
+            if record.args:
+                record.msg = f"{record.msg} (+%d suppressed)"
+                record.args = record.args + (self._pending,)
+            else:
+                # Without args the message is not %-formatted, so "100%" stays as is.
+                record.msg = f"{record.msg} (+{self._pending} suppressed)"
+            self._pending = 0
+        return True
+
+    def _suppress(self):
+        self.suppressed += 1
+        self._pending += 1
+        return False
+
+
+# Formatting is left to the listener thread. Only immutable arguments
+# (bytes, numbers, strings) should be passed to the loggers of this package.
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+def configure_logging(
+    path=DEFAULT_LOG_PATH,
+    level=logging.DEBUG,
+    max_bytes=6000000,
+    backup_count=5,
+    packet_rate=10.0,
+    packet_sample=1,
+):
+    """Send the logs of the src package through a background file writer.
+
+    The loggers only put records on a queue; a QueueListener thread formats
+    them and does the file I/O. Returns the listener.
+    """
+    stop_logging()
+    global _listener, _queue_handler
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    file_handler = RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = DeferredQueueHandler(log_queue)
+    package_logger = logging.getLogger("src")
+    package_logger.setLevel(level)
+    package_logger.addHandler(_queue_handler)
+
+    packet_logger = logging.getLogger(PACKET_LOGGER)
+    for old in [f for f in packet_logger.filters if isinstance(f, RateLimitFilter)]:
+        packet_logger.removeFilter(old)
+    packet_logger.addFilter(RateLimitFilter(packet_rate, packet_sample))
+
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def configure_logging_from_config(config):
+    """Read the [logging] section; an empty path leaves logging unconfigured."""
+    path = config.get("logging", "path", fallback=DEFAULT_LOG_PATH)
+    if not path:
+        return None
+    return configure_logging(
+        path,
+        level=config.get("logging", "level", fallback="DEBUG").upper(),
+        packet_rate=config.getfloat("logging", "packetrate", fallback=10.0),
+        packet_sample=config.getint("logging", "packetsample", fallback=1),
+    )
+
+
+def stop_logging():
+    """Flush the queued records and close the log file."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger("src").removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import typing
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+METRICS = {
+    "hwt905_queue_depth": ("gauge", "Chunks waiting in result_queue."),
+    "hwt905_queue_dropped_total": ("counter", "Chunks dropped by the queue policy."),
+    "hwt905_bytes_received_total": ("counter", "Bytes read from the port."),
+    "hwt905_chunks_received_total": ("counter", "Reads delivered by the port."),
+    "hwt905_port_errors_total": ("counter", "Open and read failures."),
+    "hwt905_port_connected": ("gauge", "1 while the port is open."),
+    "hwt905_reconnects_total": ("counter", "Reconnections after a failure."),
+    "hwt905_frames_decoded_total": ("counter", "Frames decoded per type."),
+    "hwt905_checksum_errors_total": ("counter", "Frames rejected by checksum."),
+    "hwt905_resync_bytes_total": ("counter", "Bytes skipped to find a header."),
+    "hwt905_resync_skips_total": ("counter", "0x55 bytes not followed by a type."),
+    "hwt905_redraws_total": ("counter", "CombinedPlotter redraws."),
+    "hwt905_redraw_seconds_total": ("counter", "Time spent redrawing."),
+    "hwt905_last_redraw_seconds": ("gauge", "Duration of the latest redraw."),
+    "hwt905_latency_seconds": ("gauge", "Latency since arrival, per stage."),
+    "hwt905_latency_frames_total": ("counter", "Frames traced per stage."),
+    "hwt905_bus_published_total": ("counter", "Batches published on the bus."),
+    "hwt905_subscriber_lag": ("gauge", "Batches published but not yet read."),
+    "hwt905_subscriber_skipped_total": ("counter", "Batches skipped by lag policy."),
+    "hwt905_stream_clients": ("gauge", "Connected network stream clients."),
+    "hwt905_stream_samples_total": ("counter", "Samples sent to stream clients."),
+    "hwt905_stream_dropped_packets_total": (
+        "counter",
+        "Packets not sent to TCP clients that fell behind.",
+    ),
+}
+
+
+class MetricSample(typing.NamedTuple):
+    name: str
+    kind: str  # "counter" or "gauge"
+    help: str
+    labels: typing.Tuple[typing.Tuple[str, str], ...]
+    value: float
+
+
+def sample(name, value, **labels) -> MetricSample:
+    kind, help = METRICS[name]
+    return MetricSample(name, kind, help, tuple(sorted(labels.items())), value)
+
+
+def series_name(name, labels) -> str:
+    if not labels:
+        return name
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels)
+    return f"{name}{{{pairs}}}"
+
+
+# パイプライン全体のカウンタとゲージを集めるクラス。
+# 各オブジェクトが既に持っているカウンタを、読み出されたときにだけ集計するので、
+# 受信・解析の処理には負荷をかけない。
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._collectors = []
+
+    def register(self, collector):
+        """collector is a callable returning an iterable of MetricSample."""
+        self._collectors.append(collector)
+        return collector
+
+    def collect(self) -> typing.List[MetricSample]:
+        samples = []
+        for collector in self._collectors:
+            samples.extend(collector())
+        return samples
+
+    def snapshot(self) -> typing.Dict[str, float]:
+        """Current values keyed by Prometheus series name."""
+        return {
+            series_name(item.name, item.labels): item.value for item in self.collect()
+        }
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        described = set()
+        for item in self.collect():
+            if item.name not in described:
+                described.add(item.name)
+                lines.append(f"# HELP {item.name} {item.help}")
+                lines.append(f"# TYPE {item.name} {item.kind}")
+            lines.append(f"{series_name(item.name, item.labels)} {float(item.value)!r}")
+        return "\n".join(lines) + "\n"
+
+    def watch_source(self, source):
+        """AsyncSerialManager, MultiDeviceManager or CaptureReplaySource."""
+        return self.register(lambda: source_metrics(source))
+
+    def watch_processor(self, dataprocessor):
+        return self.register(lambda: decoder_metrics(dataprocessor))
+
+    def watch_plotter(self, combined_plotter):
+        return self.register(lambda: plotter_metrics(combined_plotter))
+
+    def watch_tracer(self, tracer):
+        return self.register(lambda: tracer_metrics(tracer))
+
+    def watch_bus(self, bus):
+        return self.register(lambda: bus_metrics(bus))
+
+    def watch_stream(self, stream_server):
+        return self.register(lambda: stream_metrics(stream_server))
+
+
+def queue_metrics(queue, **labels):
+    yield sample("hwt905_queue_depth", queue.qsize(), **labels)
+    yield sample("hwt905_queue_dropped_total", getattr(queue, "dropped", 0), **labels)
+
+
+def source_metrics(source):
+    managers = getattr(source, "managers", None)
+    if managers is None:
+        if hasattr(source, "bytes_replayed"):
+            # Replayed captures have no port; count them under the capture path.
+            managers = {}
+            yield sample(
+                "hwt905_bytes_received_total",
+                source.bytes_replayed,
+                port=str(source.path),
+            )
+        else:
+            managers = {source.device_id: source}
+    for device_id, manager in managers.items():
+        labels = {"port": manager.port, "device": device_id or ""}
+        yield sample("hwt905_bytes_received_total", manager.bytes_received, **labels)
+        yield sample("hwt905_chunks_received_total", manager.chunks_received, **labels)
+        yield sample("hwt905_port_errors_total", manager.errors, **labels)
+        yield sample("hwt905_port_connected", int(manager.connected), **labels)
+    for device_id, count in getattr(source, "reconnects", {}).items():
+        yield sample("hwt905_reconnects_total", count, device=device_id)
+    yield from queue_metrics(source.result_queue)
+
+
+def decoder_metrics(dataprocessor):
+    for device_id, decoder in list(dataprocessor.decoders.items()):
+        device = device_id or ""
+        for frame_type, count in decoder.frames_by_type.items():
+            yield sample(
+                "hwt905_frames_decoded_total",
+                count,
+                device=device,
+                frame_type=f"0x{frame_type:02X}",
+            )
+        yield sample(
+            "hwt905_checksum_errors_total", decoder.checksum_errors, device=device
+        )
+        yield sample("hwt905_resync_bytes_total", decoder.skipped_bytes, device=device)
+        yield sample("hwt905_resync_skips_total", decoder.resync_skips, device=device)
+
+
+def plotter_metrics(combined_plotter):
+    yield sample("hwt905_redraws_total", combined_plotter.redraws)
+    yield sample("hwt905_redraw_seconds_total", combined_plotter.redraw_seconds)
+    yield sample("hwt905_last_redraw_seconds", combined_plotter.last_redraw_seconds)
+
+
+def tracer_metrics(tracer):
+    for stage, histogram in tracer.histograms.items():
+        yield sample("hwt905_latency_frames_total", histogram.count, stage=stage)
+        if histogram.count:
+            for quantile in (50, 99):
+                yield sample(
+                    "hwt905_latency_seconds",
+                    histogram.percentile(quantile),
+                    stage=stage,
+                    quantile=f"0.{quantile}",
+                )
+
+
+def bus_metrics(bus):
+    yield sample("hwt905_bus_published_total", bus.published)
+    for index, subscription in enumerate(list(bus.subscribers)):
+        name = subscription.name or str(index)
+        yield sample("hwt905_subscriber_lag", subscription.lag, subscriber=name)
+        yield sample(
+            "hwt905_subscriber_skipped_total", subscription.skipped, subscriber=name
+        )
+
+
+def stream_metrics(stream_server):
+    yield sample(
+        "hwt905_stream_clients", len(stream_server.tcp_clients), transport="tcp"
+    )
+    yield sample(
+        "hwt905_stream_clients", len(stream_server.udp_clients), transport="udp"
+    )
+    yield sample("hwt905_stream_samples_total", stream_server.samples_sent)
+    yield sample(
+        "hwt905_stream_dropped_packets_total", stream_server.dropped_packets
+    )
+
+
+def pipeline_registry(
+    source, dataprocessor, combined_plotter=None, bus=None, stream_server=None
+):
+    registry = MetricsRegistry()
+    registry.watch_source(source)
+    registry.watch_processor(dataprocessor)
+    if dataprocessor.tracer is not None:
+        registry.watch_tracer(dataprocessor.tracer)
+    if combined_plotter is not None:
+        registry.watch_plotter(combined_plotter)
+    if bus is not None:
+        registry.watch_bus(bus)
+    if stream_server is not None:
+        registry.watch_stream(stream_server)
+    return registry
+
+
+async def stop_metrics_server(server):
+    if server is not None:
+        server.close()
+        await server.wait_closed()
+
+
+# Prometheus形式のテキストをHTTPで返す。GET以外のパスは404。
+async def serve_metrics(registry, host="127.0.0.1", port=9105):
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            parts = request.split()
+            if parts[:1] == [b"GET"] and parts[1:2] in ([b"/"], [b"/metrics"]):
+                status, body = "200 OK", registry.render().encode()
+            else:
+                status, body = "404 Not Found", b""
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {PROMETHEUS_CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.debug(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+async def start_metrics_server(config, registry):
+    """Serve registry when [metrics] port is set; returns the server or None."""
+    port = config.getint("metrics", "port", fallback=0)
+    if not port:
+        return None
+    host = config.get("metrics", "host", fallback="127.0.0.1")
+    return await serve_metrics(registry, host, port)
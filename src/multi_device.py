@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import typing
+
+from src.hwt905_commands import baudrate_setting, sensor_settings
+from src.receive_queue import BLOCK, FlowControlQueue
+from src.serial_communication_async import AsyncSerialManager
+
+logger = logging.getLogger(__name__)
+
+DEVICE_SECTION_PREFIX = "device:"
+
+
+# 一つのイベントループで複数のシリアルポートを同時に扱うクラス。
+# 受信データはDeviceChunkとして共有のresult_queueに入り、一つのDataProcessorで解析する。
+# ポートごとに監視タスクを持つので、遅い・切断されたポートが他のポートを止めることはない。
+class MultiDeviceManager:
+    def __init__(
+        self,
+        devices: typing.Dict[str, dict],
+        high_water=256,
+        reconnect_delay=1.0,
+        queue_size=0,
+        overflow_policy=BLOCK,
+    ) -> None:
+        self.reconnect_delay = reconnect_delay
+        self.result_queue = FlowControlQueue(
+            high_water, maxsize=queue_size, policy=overflow_policy
+        )
+        self.managers = {
+            device_id: AsyncSerialManager(
+                **settings,
+                event_driven=True,
+                device_id=device_id,
+                result_queue=self.result_queue,
+            )
+            for device_id, settings in devices.items()
+        }
+        self.reconnects = dict.fromkeys(self.managers, 0)
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Build a manager from every [device:<id>] section of a ConfigParser."""
+        devices = {}
+        for section in config.sections():
+            if not section.startswith(DEVICE_SECTION_PREFIX):
+                continue
+            device_id = section[len(DEVICE_SECTION_PREFIX) :]
+            devices[device_id] = {
+                "port": config.get(section, "portname"),
+                "baudrate": baudrate_setting(config, section),
+                "bytesize": config.getint(section, "bytesize", fallback=8),
+                "parity": config.get(section, "parity", fallback="N"),
+                "stopbits": config.getint(section, "stopbits", fallback=1),
+                "timeout": config.getint(section, "timeout", fallback=None),
+                "xonxoff": config.getboolean(section, "xonxoff", fallback=False),
+                **sensor_settings(config, section),
+            }
+        return cls(devices, **kwargs)
+
+    async def supervise(self, device_id):
+        """Keep one port open, reopening it whenever it fails or disconnects."""
+        manager = self.managers[device_id]
+        while True:
+            try:
+                if await manager.open_serial_connection():
+                    logger.info(f"Device {device_id} connected on {manager.port}")
+                    await manager.apply_sensor_settings()
+                    await manager.protocol.closed.wait()
+                    logger.warning(f"Device {device_id} disconnected")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                manager.errors += 1
+                logger.error(f"Device {device_id} failed: {e}")
+                # Release the port, or the reopen fails because it is still busy.
+                await manager.close_connection()
+            finally:
+                self.detach(manager)
+            self.reconnects[device_id] += 1
+            await asyncio.sleep(self.reconnect_delay)
+
+    def detach(self, manager):
+        manager.connected = False
+        if manager.transport is not None:
+            self.result_queue.remove_flow_control(
+                manager.transport.pause_reading, manager.transport.resume_reading
+            )
+
+    def stats(self):
+        """Per-port throughput and error counters."""
+        return {
+            device_id: {
+                "port": manager.port,
+                "connected": manager.connected,
+                "bytes_received": manager.bytes_received,
+                "chunks_received": manager.chunks_received,
+                "errors": manager.errors,
+                "reconnects": self.reconnects[device_id],
+            }
+            for device_id, manager in self.managers.items()
+        }
+
+    async def run(self):
+        tasks = [
+            asyncio.create_task(self.supervise(device_id))
+            for device_id in self.managers
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            print("STOP")
+
+    async def close_connection(self):
+        for manager in self.managers.values():
+            if manager.transport is not None:
+                manager.transport.close()
+            manager.connected = False
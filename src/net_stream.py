@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import struct
+import time
+
+import numpy as np
+
+from src.hwt905_records import TIME_OUTPUT
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"HW"
+VERSION = 2
+SAMPLES = 0
+DEVICES = 1
+
+# パケットの先頭: マジック、バージョン、種類、シーケンス番号、ペイロードのバイト数
+HEADER = struct.Struct("<2sBBII")
+
+# 1サンプル44バイトの固定レイアウト。値は各レコードの先頭4フィールド (不足分はNaN)。
+# GPSの経度・緯度の精度を落とさないよう、値はfloat64で送る。
+SAMPLE_DTYPE = np.dtype(
+    [
+        ("timestamp_ns", "<i8"),
+        ("device", "<u2"),
+        ("frame_type", "u1"),
+        ("reserved", "u1"),
+        ("values", "<f8", (4,)),
+    ]
+)
+
+# UDPの購読要求と解除。購読はCLIENT_TIMEOUT秒以内に送り直さないと切れる。
+SUBSCRIBE = b"HWSUB"
+UNSUBSCRIBE = b"HWBYE"
+CLIENT_TIMEOUT = 10.0
+
+# 1パケットに入れるサンプル数の上限 (TCPは64KiB、UDPはMTUに収まる大きさ)
+TCP_PAYLOAD = 65516
+DATAGRAM_SIZE = 1400
+
+_PADDING = (float("nan"),) * 4
+
+
+def pack_header(kind, sequence, length) -> bytes:
+    return HEADER.pack(MAGIC, VERSION, kind, sequence & 0xFFFFFFFF, length)
+
+
+def parse_header(data):
+    """(kind, sequence, payload length) of a packet header; ValueError if foreign."""
+    magic, version, kind, sequence, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} stream packet")
+    return kind, sequence, length
+
+
+def parse_packet(data):
+    """(kind, sequence, payload) of one datagram."""
+    if len(data) < HEADER.size:
+        raise ValueError("Truncated stream packet")
+    kind, sequence, length = parse_header(data)
+    payload = data[HEADER.size :]
+    if len(payload) != length:
+        raise ValueError("Stream packet length does not match its header")
+    return kind, sequence, payload
+
+
+def decode_samples(payload) -> np.ndarray:
+    return np.frombuffer(payload, dtype=SAMPLE_DTYPE)
+
+
+def decode_devices(payload):
+    """Device ids in index order; the empty name stands for None."""
+    return [name or None for name in bytes(payload).decode("utf-8").split("\n")]
+
+
+# デバイスIDとサンプルのdevice番号の対応表。番号は現れた順に振り、変えない。
+class DeviceTable:
+    def __init__(self) -> None:
+        self.ids = []
+        self._index = {}
+        self.changed = False
+
+    def index(self, device_id) -> int:
+        index = self._index.get(device_id)
+        if index is None:
+            index = self._index[device_id] = len(self.ids)
+            self.ids.append(device_id)
+            self.changed = True
+        return index
+
+    def payload(self) -> bytes:
+        return "\n".join(device_id or "" for device_id in self.ids).encode("utf-8")
+
+
+def encode_batch(batch, devices) -> np.ndarray:
+    """Samples of a {device_id: records} batch in the fixed layout.
+
+    Time frames are left out; every sample carries its arrival time instead.
+    """
+    rows = [
+        (
+            record.timestamp_ns or 0,
+            index,
+            record.frame_type,
+            0,
+            (record.astuple() + _PADDING)[:4],
+        )
+        for device_id, records in batch.items()
+        for index in (devices.index(device_id),)
+        for record in records
+        if record.frame_type != TIME_OUTPUT
+    ]
+    return np.array(rows, dtype=SAMPLE_DTYPE)
+
+
+def packetize(samples, sequence, payload_size):
+    """Split samples into packets of at most payload_size bytes of samples."""
+    per_packet = max(1, payload_size // SAMPLE_DTYPE.itemsize)
+    packets = []
+    for start in range(0, len(samples), per_packet):
+        payload = samples[start : start + per_packet].tobytes()
+        packets.append(pack_header(SAMPLES, sequence, len(payload)) + payload)
+        sequence += 1
+    return packets, sequence
+
+
+# 解析済みのサンプルをTCPとUDPで配信するサーバー。バスの購読者の一つとして読む。
+# バッチはトランスポートごとに一度だけエンコードし、同じバイト列を全クライアントへ送る。
+# 送信バッファがhigh_waterを超えたTCPクライアントには、追いつくまでバッチを送らない
+# (クライアントはシーケンス番号の欠けで気付く)。遅いクライアントが他を待たせることはない。
+# UDPは購読要求 (SUBSCRIBE) を送ってきたアドレスへ送り、要求が途絶えたら外す。
+class StreamServer:
+    def __init__(
+        self,
+        bus,
+        host="127.0.0.1",
+        tcp_port=None,
+        udp_port=None,
+        high_water=1 << 20,
+        datagram_size=DATAGRAM_SIZE,
+        client_timeout=CLIENT_TIMEOUT,
+    ) -> None:
+        self.bus = bus
+        self.host = host
+        self.tcp_port = tcp_port
+        self.udp_port = udp_port
+        self.high_water = high_water
+        self.datagram_size = datagram_size
+        self.client_timeout = client_timeout
+        self.devices = DeviceTable()
+        self.tcp_clients = set()
+        self._handlers = set()
+        self.udp_clients = {}  # address -> time of the last subscribe request
+        self.samples_sent = 0
+        self.dropped_packets = 0
+        self._tcp_sequence = 0
+        self._udp_sequence = 0
+        self._tcp_server = None
+        self._udp_transport = None
+        self._subscription = None
+        self._task = None
+
+    @property
+    def tcp_address(self):
+        return self._tcp_server.sockets[0].getsockname()[:2]
+
+    @property
+    def udp_address(self):
+        return self._udp_transport.get_extra_info("sockname")[:2]
+
+    async def start(self):
+        if self.tcp_port is not None:
+            self._tcp_server = await asyncio.start_server(
+                self._serve_tcp, self.host, self.tcp_port
+            )
+            logger.info("Streaming over TCP on %s:%d", *self.tcp_address)
+        if self.udp_port is not None:
+            loop = asyncio.get_running_loop()
+            self._udp_transport, _ = await loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self), local_addr=(self.host, self.udp_port)
+            )
+            logger.info("Streaming over UDP on %s:%d", *self.udp_address)
+        self._subscription = self.bus.subscribe("stream")
+        self._task = asyncio.create_task(self._forward())
+        return self
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._subscription.close()
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            for writer in list(self.tcp_clients):
+                writer.close()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._tcp_server.wait_closed()
+        if self._udp_transport is not None:
+            self._udp_transport.close()
+
+    async def _forward(self):
+        while True:
+            self.broadcast(await self._subscription.read_batch())
+
+    def _device_packet(self, sequence) -> bytes:
+        payload = self.devices.payload()
+        return pack_header(DEVICES, sequence, len(payload)) + payload
+
+    def broadcast(self, batch):
+        """Encode a batch once per transport and send it to every client."""
+        samples = encode_batch(batch, self.devices)
+        if self.devices.changed:
+            self.devices.changed = False
+            self._send_tcp(self._device_packet(self._tcp_sequence), 0)
+            self._send_udp([self._device_packet(self._udp_sequence)])
+        if not len(samples):
+            return
+        self.samples_sent += len(samples)
+        if self.tcp_clients:
+            packets, self._tcp_sequence = packetize(
+                samples, self._tcp_sequence, TCP_PAYLOAD
+            )
+            self._send_tcp(b"".join(packets), len(packets))
+        self._expire_udp_clients()
+        if self.udp_clients:
+            packets, self._udp_sequence = packetize(
+                samples, self._udp_sequence, self.datagram_size - HEADER.size
+            )
+            self._send_udp(packets)
+
+    def _send_tcp(self, data, packets):
+        for writer in list(self.tcp_clients):
+            if writer.is_closing():
+                self.tcp_clients.discard(writer)
+            elif packets and writer.transport.get_write_buffer_size() > self.high_water:
+                self.dropped_packets += packets
+            else:
+                writer.write(data)
+
+    def _send_udp(self, packets):
+        for address in list(self.udp_clients):
+            for packet in packets:
+                self._udp_transport.sendto(packet, address)
+
+    def _expire_udp_clients(self):
+        deadline = time.monotonic() - self.client_timeout
+        for address, seen in list(self.udp_clients.items()):
+            if seen < deadline:
+                logger.info("UDP stream client %s timed out", address)
+                del self.udp_clients[address]
+
+    async def _serve_tcp(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        logger.info("TCP stream client %s connected", peer)
+        writer.write(self._device_packet(self._tcp_sequence))
+        self.tcp_clients.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            # Clients send nothing; reading only notices that they went away.
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self.tcp_clients.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+            logger.info("TCP stream client %s disconnected", peer)
+
+    def _datagram(self, data, address):
+        if data == SUBSCRIBE:
+            if address not in self.udp_clients:
+                logger.info("UDP stream client %s subscribed", address)
+            self.udp_clients[address] = time.monotonic()
+            # Resent on every renewal so a lost device table is recovered.
+            self._udp_transport.sendto(
+                self._device_packet(self._udp_sequence), address
+            )
+        elif data == UNSUBSCRIBE:
+            self.udp_clients.pop(address, None)
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server) -> None:
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server._datagram(data, addr)
+
+    def error_received(self, exc):
+        logger.debug("UDP stream error: %s", exc)
+
+
+async def start_stream_server(config, bus):
+    """Stream bus batches when [stream] tcpport or udpport is set; else None."""
+    tcp_port = config.getint("stream", "tcpport", fallback=0) or None
+    udp_port = config.getint("stream", "udpport", fallback=0) or None
+    if tcp_port is None and udp_port is None:
+        return None
+    server = StreamServer(
+        bus,
+        config.get("stream", "host", fallback="127.0.0.1"),
+        tcp_port,
+        udp_port,
+        high_water=config.getint("stream", "highwater", fallback=1 << 20),
+        datagram_size=config.getint("stream", "datagram", fallback=DATAGRAM_SIZE),
+    )
+    return await server.start()
+
+
+async def stop_stream_server(server):
+    if server is not None:
+        await server.close()
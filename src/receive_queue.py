@@ -0,0 +1,86 @@
+import asyncio
+
+# キューが一杯になったときの動作
+BLOCK = "block"  # 生産側を待たせる (読み込みを一時停止する)
+DROP_OLDEST = "drop_oldest"  # 最も古いデータを捨てる
+LATEST = "latest"  # 最新の1件だけを保持する (表示用)
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, LATEST)
+
+
+# 受信データ用のキュー。
+# 溜まったデータ量に応じてシリアルの読み込みを一時停止・再開し、固定のスリープではなく
+# 消費側の速度でフロー制御を行う。maxsizeを指定すると、policyに従って上限を守る。
+class FlowControlQueue(asyncio.Queue):
+    def __init__(
+        self,
+        high_water: int = 64,
+        low_water=None,
+        maxsize: int = 0,
+        policy: str = BLOCK,
+    ) -> None:
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {policy}")
+        if policy == LATEST:
+            maxsize = 1
+        super().__init__(maxsize)
+        self.policy = policy
+        if maxsize > 0:
+            # Pause the reader before the hard limit is reached.
+            high_water = min(high_water, maxsize)
+        self.high_water = high_water
+        self.low_water = high_water // 2 if low_water is None else low_water
+        self.paused = False
+        self.dropped = 0
+        self._producers = []
+
+    def set_flow_control(self, pause_reading, resume_reading):
+        """Register the callbacks used to throttle a producer.
+
+        Several producers (e.g. one per serial port) may share the queue.
+        Only the block policy applies backpressure; the others drop data instead.
+        """
+        if self.policy != BLOCK:
+            return
+        self._producers.append((pause_reading, resume_reading))
+        if self.paused:
+            pause_reading()
+
+    def remove_flow_control(self, pause_reading, resume_reading):
+        if (pause_reading, resume_reading) in self._producers:
+            self._producers.remove((pause_reading, resume_reading))
+
+    async def put(self, item):
+        if self.policy == BLOCK:
+            await super().put(item)
+        else:
+            self.put_nowait(item)
+
+    def put_nowait(self, item):
+        if self.policy != BLOCK and self.full():
+            # Bypass get_nowait() so dropping never resumes a paused reader.
+            super().get_nowait()
+            self.task_done()  # a dropped chunk is never processed; keep join() honest
+            self.dropped += 1
+        super().put_nowait(item)
+        if not self.paused and self._producers and self.qsize() >= self.high_water:
+            self.paused = True
+            for pause_reading, _ in self._producers:
+                pause_reading()
+
+    def offer(self, item) -> bool:
+        """put_nowait() for callbacks that cannot wait: count instead of raising."""
+        try:
+            self.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    def get_nowait(self):
+        # asyncio.Queue.get() also ends up here, so both paths resume the reader.
+        item = super().get_nowait()
+        if self.paused and self.qsize() <= self.low_water:
+            self.paused = False
+            for _, resume_reading in self._producers:
+                resume_reading()
+        return item
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import time
+
+from src.capture import CaptureReader
+from src.receive_queue import BLOCK, FlowControlQueue
+from src.serial_communication_async import DeviceChunk
+
+logger = logging.getLogger(__name__)
+
+
+# キャプチャファイルのレコードを、記録時の間隔に合わせて順に返す。
+# speed=1.0で記録時と同じ速さ、speed=Nで N 倍速、speed=None または 0 で待ち時間なし。
+async def paced_records(path, speed=1.0, start_ns=None, end_ns=None):
+    loop = asyncio.get_running_loop()
+    with CaptureReader(path) as reader:
+        records = reader.records(start_ns, end_ns)
+        try:
+            first_time = None
+            started = loop.time()
+            for timestamp_ns, data in records:
+                chunk = bytes(data)
+                # The slice pins the memory map; drop it before suspending.
+                data.release()
+                if first_time is None:
+                    first_time = timestamp_ns
+                if speed:
+                    delay = (timestamp_ns - first_time) / 1e9 / speed - (
+                        loop.time() - started
+                    )
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                yield chunk
+        finally:
+            records.close()
+
+
+# 記録したストリームを、AsyncSerialManagerの代わりにresult_queueへ流すクラス。
+# DataProcessorやプロッタはそのまま使えるので、センサーなしで現象の再現や最大スループットの計測ができる。
+class CaptureReplaySource:
+    def __init__(
+        self,
+        path,
+        speed=1.0,
+        start_ns=None,
+        end_ns=None,
+        queue_size=0,
+        overflow_policy=BLOCK,
+    ) -> None:
+        self.path = path
+        self.speed = speed
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.chunks_replayed = 0
+        self.bytes_replayed = 0
+        # With the block policy a bounded queue paces an as-fast-as-possible replay.
+        self.result_queue = FlowControlQueue(maxsize=queue_size, policy=overflow_policy)
+
+    async def run(self):
+        records = paced_records(self.path, self.speed, self.start_ns, self.end_ns)
+        try:
+            async for chunk in records:
+                # Stamped on the replay clock, like data_received does live.
+                chunk = DeviceChunk(None, time.monotonic_ns(), chunk)
+                await self.result_queue.put(chunk)
+                self.chunks_replayed += 1
+                self.bytes_replayed += len(chunk.data)
+                if not self.speed:
+                    # Let consumers run even when nothing is paced.
+                    await asyncio.sleep(0)
+            logger.info(f"Replay finished: {self.chunks_replayed} chunks")
+        except asyncio.CancelledError:
+            print("STOP")
+        finally:
+            await records.aclose()
+
+    async def close_connection(self):
+        pass
+
+
+# 記録したストリームを疑似端末(pty)に書き込むクラス。
+# portに表示されるデバイス名をAsyncSerialManagerに渡すと、serial_asyncioの経路をそのまま試験できる。
+class PtyReplay:
+    def __init__(self, path, speed=1.0, start_ns=None, end_ns=None) -> None:
+        self.path = path
+        self.speed = speed
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.chunks_replayed = 0
+        self.bytes_replayed = 0
+        # tty/termios exist only on Unix; import here so Windows can load the module.
+        import tty
+
+        self.master_fd, self.slave_fd = os.openpty()
+        # Raw mode: no echo and no CR/LF translation of the binary stream.
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port = os.ttyname(self.slave_fd)
+
+    async def write(self, data: bytes):
+        loop = asyncio.get_running_loop()
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self.master_fd, view)
+                view = view[written:]
+            except BlockingIOError:
+                # The pty buffer is full until the reader drains it.
+                writable = loop.create_future()
+                loop.add_writer(
+                    self.master_fd, lambda: writable.done() or writable.set_result(None)
+                )
+                try:
+                    await writable
+                finally:
+                    loop.remove_writer(self.master_fd)
+
+    async def run(self):
+        records = paced_records(self.path, self.speed, self.start_ns, self.end_ns)
+        try:
+            async for chunk in records:
+                await self.write(chunk)
+                self.chunks_replayed += 1
+                self.bytes_replayed += len(chunk)
+            logger.info(f"Replay finished: {self.chunks_replayed} chunks")
+        except asyncio.CancelledError:
+            print("STOP")
+        finally:
+            await records.aclose()
+
+    def close(self):
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
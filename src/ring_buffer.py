@@ -0,0 +1,62 @@
+import typing
+
+import numpy as np
+
+
+# 固定長のリングバッファ。複数の列 (時刻、ロール、ピッチ、ヨーなど) をまとめて保持する。
+# 各サンプルを2か所に書き込むことで、最新size件を常に連続したビューとして返せる。
+class RingBuffer:
+    def __init__(
+        self, capacity: int, columns: typing.Sequence[str], dtype=np.float64
+    ) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self._column_index = {name: i for i, name in enumerate(self.columns)}
+        self._data = np.full((len(self.columns), 2 * capacity), np.nan, dtype=dtype)
+        self._head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, values: typing.Sequence[float]):
+        """Store one sample; values are given in column order."""
+        head = self._head
+        self._data[:, head] = values
+        self._data[:, head + self.capacity] = values
+        self._head = (head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def extend(self, block):
+        """Store many samples at once; block has shape (columns, samples)."""
+        block = np.asarray(block, dtype=self._data.dtype)
+        count = block.shape[1]
+        if count == 0:
+            return
+        if count > self.capacity:
+            block = block[:, -self.capacity :]
+            self._head = (self._head + count - self.capacity) % self.capacity
+            count = self.capacity
+        positions = (self._head + np.arange(count)) % self.capacity
+        self._data[:, positions] = block
+        self._data[:, positions + self.capacity] = block
+        self._head = (self._head + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def view(self, column: str) -> np.ndarray:
+        """Return the stored samples of a column, oldest first, without copying."""
+        end = self._head + self.capacity
+        return self._data[self._column_index[column], end - self.size : end]
+
+    def latest(self, column: str):
+        if self.size == 0:
+            return None
+        return self._data[self._column_index[column], self._head + self.capacity - 1]
+
+    def clear(self):
+        self._data.fill(np.nan)
+        self._head = 0
+        self.size = 0
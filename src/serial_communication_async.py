@@ -1,63 +1,91 @@
 import asyncio
+import collections
+import functools
 import logging
-import sys
+import time
 import typing
-from logging.handlers import RotatingFileHandler
 
-import matplotlib.pyplot as plt
-import numpy as np
-import qasync
 import serial
 import serial_asyncio
-from matplotlib.animation import FuncAnimation
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from PyQt5.QtCore import QCoreApplication
-from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget
 
+from src.checksum import xor8
+from src.command_channel import CommandChannel
 from src.constants import ascii_control_codes
-from src.hwt905_ttl_dataparser import HWT905_TTL_Dataparser
-
-handler = RotatingFileHandler("logs/apps.log", maxBytes=6000000, backupCount=5)
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
+from src.hwt905_commands import HWT905Config
+from src.hwt905_records import AngleRecord, MagneticFieldRecord
+from src.hwt905_ttl_dataparser import HWT905_TTL_Dataparser, HWT905StreamDecoder
+from src.log_config import PACKET_LOGGER
+from src.receive_queue import BLOCK, FlowControlQueue
+from src.text_framing import TextFramer, decode_text
+from src.timing import SensorClock
+
+# Rates tried by AsyncSerialManager.probe_baudrate, the factory default first.
+PROBE_BAUDRATES = (9600, 115200, 230400, 460800, 921600, 57600, 38400, 19200, 4800)
+
+# Handlers are attached by src.log_config.configure_logging at startup.
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-logger.addHandler(handler)
+# Rate-limited logger for messages emitted per received or sent packet.
+packet_logger = logging.getLogger(PACKET_LOGGER)
 
 
 # 非同期IOを使用してシリアル通信を行うためのクラス。
 # asyncio.Protocolを継承しており、非同期IOのコールバックメソッドをオーバーライドしている、
 class AsyncSerialCommunicator(asyncio.Protocol):
+    # "data_callback" is called with every received chunk in event-driven mode.
+    # Without it, reading is paused and data is polled by SerialCommunication.
+    def __init__(self, data_callback=None) -> None:
+        self.data_callback = data_callback
+        self.opened = asyncio.Event()
+        self.closed = asyncio.Event()
+
     # called by asyncio when establishment a connection.
     # Save transport object to instance variable and Make instance of SrialCommunication class.
     # "Request to send" to disable.
     def connection_made(self, transport):
         self.transport = transport
         logger.info(f"Port Opened: {transport}")
-        transport.serial.rts = False
+        try:
+            transport.serial.rts = False
+        except (OSError, serial.SerialException) as e:
+            # Pseudo terminals (e.g. PtyReplay) have no modem control lines.
+            logger.warning(f"Failed to disable RTS: {e}")
         self.serial_communication = SerialCommunication(transport)
+        self.opened.set()
 
     # data-received-class is for data receive. data-received-class called by asyncio.
-    # This method displays receive data. data reading paused.
+    # In event-driven mode the data is handed to the callback as it arrives.
+    # Otherwise this method displays receive data and data reading is paused.
     def data_received(self, data):
-        logger.info(f"data received: {repr(data)}")
+        if self.data_callback is not None:
+            self.data_callback(data)
+            return
+        packet_logger.debug("data received: %r", data)
         self.pause_reading()
 
     # called by asyncio when connection lost. "exc" parameter is an exception object.
     # if the connection is correctly closed,no exception will occur.
+    # In event-driven mode the owner waits on "closed" instead, so that
+    # one lost port (e.g. among several devices) does not stop the loop.
     def connection_lost(self, exc):
-        self.transport.loop.stop()
+        self.closed.set()
+        if self.data_callback is None:
+            self.transport.loop.stop()
 
     # if writing buffer is upper limmit,called by asyncio.
+    # Queued commands wait until resume_writing.
     def pause_writing(self):
-        logger.info("pause writing")
-        logger.info(self.transport.get_write_buffer_size())
+        packet_logger.debug(
+            "pause writing: %d bytes buffered", self.transport.get_write_buffer_size()
+        )
+        self.serial_communication.channel.pause_writing()
 
     # Called by asyncio when writing buffer is the acceptable range.
     # This method is used to resume writing.
     def resume_writing(self):
-        logger.info(self.transport.get_write_buffer_size())
-        logger.info("resume writing")
+        packet_logger.debug(
+            "resume writing: %d bytes buffered", self.transport.get_write_buffer_size()
+        )
+        self.serial_communication.channel.resume_writing()
 
     # This method is used to pause data reading.
     # If data processing data takes a long time, or buffer overflow prevents reading, reading may be paused.
@@ -74,12 +102,16 @@ class AsyncSerialCommunicator(asyncio.Protocol):
 class SerialCommunication:
     def __init__(self, transport) -> None:
         self.transport = transport
+        # Outgoing data is queued and coalesced; see CommandChannel.
+        self.channel = CommandChannel(transport)
+        # Lines for read_message; replace with e.g. TextFramer.nmea() as needed.
+        self.framer = TextFramer(end=b"\n", checksum_marker=None)
+        self._messages = collections.deque()
 
     async def send_string_as_byte(self, writestr: str):
-        loop = asyncio.get_running_loop()
         try:
-            await loop.run_in_executor(None, self.transport.write, writestr.encode())
-            logger.info(f"Send: {self.transport}")
+            await self.channel.send(writestr.encode())
+            packet_logger.debug("Send: %s", self.transport)
             return True
         except Exception as e:
             logger.error(f"Failed to send data: {e}")
@@ -97,16 +129,31 @@ class SerialCommunication:
             logger.error(f"Failed to receive data: {e}")
             return False
 
+    async def read_message(self, timeout=None, poll_interval=0.005):
+        """Return the next line framed by self.framer, or None on timeout.
+
+        Only the bytes already waiting are read, so the event loop never
+        blocks in readline().
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while not self._messages:
+            data = await self.read_serial_data_as_byte_list()
+            if data:
+                self._messages.extend(self.framer.feed(data))
+                continue
+            if data is False or (deadline is not None and loop.time() >= deadline):
+                return None
+            await asyncio.sleep(poll_interval)
+        return self._messages.popleft()
+
     async def read_line_as_bytes(self):
-        bytelist = []
-        try:
-            byteall = self.transport.serial.readline()
-            for i in byteall:
-                bytelist.append(i.to_bytes(1, "big"))
-            return bytelist
-        except Exception as e:
-            logger.error(f"Failed to receive data: {e}")
-            return bytelist
+        """Legacy form of read_message: the line as a list of 1-byte bytes."""
+        message = await self.read_message(self.transport.serial.timeout)
+        if message is None:
+            return []
+        line = message.body + self.framer.end
+        return [line[i : i + 1] for i in range(len(line))]
 
     def close_port(self):
         if self.transport:
@@ -130,15 +177,19 @@ class DataParser:
             logger.error("byteData is None")
             return None
 
-        decodelist = []
         try:
-            for i in byteData:
-                if ascii_control_codes.get(i) is not None:
-                    decodelist.append(ascii_control_codes.get(i))
-                if i == endText:
-                    break
-                decodelist.append(i.decode(dec))
-            return "".join(decodelist)
+            if isinstance(byteData, list):
+                # A list of single bytes, as returned by read_line_as_bytes.
+                byteData = b"".join(byteData)
+            elif not hasattr(byteData, "find"):
+                byteData = bytes(byteData)
+            end = byteData.find(endText)
+            if end < 0:
+                return decode_text(byteData, dec)
+            # The end marker itself is shown by name only.
+            return decode_text(byteData[:end], dec) + ascii_control_codes.get(
+                endText, ""
+            )
         except Exception as e:
             logger.error(f"No data: {e}")
             return None
@@ -152,206 +203,47 @@ class DataParser:
     ):
         """Generates a checksum between starttext and endtext.
         starttext and endtext specify start data and end data.
+        Without starttext the checksum starts at the first byte.
         """
         if byteData is None:
             logger.error("byteData is None")
             return False
 
         try:
-            processing = True if startText is None else False
-            checkValue = initialValue
-
-            for byte in byteData:
-                if byte == startText:
-                    processing = True
-                    continue
-                elif byte == endText:
-                    break
-                if processing:
-                    checkValue ^= ord(byte)
-            return format(checkValue, "02x")
+            if isinstance(byteData, list):
+                # A list of single bytes, as returned by read_line_as_bytes.
+                byteData = b"".join(byteData)
+            elif not hasattr(byteData, "find"):
+                byteData = bytes(byteData)
+            data = memoryview(byteData).cast("B")
+            start = 0
+            if startText is not None:
+                start = byteData.find(startText)
+                if start < 0:
+                    return format(initialValue, "02x")
+                start += len(startText)
+            end = byteData.find(endText, start)
+            if end < 0:
+                end = len(data)
+            return format(xor8(data[start:end], initialValue), "02x")
         except Exception as e:
             logger.error(f"Fail parity check: {e}")
             return False
 
 
-# 角度データをグラフにプロットするクラス。
-# HWT905 TTL専用。ロー、ピッチ、ヨーのデータをグラフにリアルタイムでプロットする。
-class AngularPlotter:
-    def __init__(self) -> None:
-        self.roll_data = []
-        self.pitch_data = []
-        self.yaw_data = []
-        self.roll_line = None
-        self.pitch_line = None
-        self.yaw_line = None
-
-    def update_plot(self, _):
-        if self.roll_data and self.roll_data[-1] is not None:
-            self.roll_text.set_text(f"Roll: {self.roll_data[-1]:.2f}")
-
-        if self.pitch_data and self.pitch_data[-1] is not None:
-            self.pitch_text.set_text(f"Pitch: {self.pitch_data[-1]:.2f}")
-
-        if self.yaw_data and self.yaw_data[-1] is not None:
-            self.yaw_text.set_text(f"Yaw: {self.yaw_data[-1]:.2f}")
-
-        if (
-            self.roll_line is not None
-            and self.pitch_line is not None
-            and self.yaw_line is not None
-        ):
-            self.roll_line.set_data(range(len(self.roll_data)), self.roll_data)
-            self.pitch_line.set_data(range(len(self.pitch_data)), self.pitch_data)
-            self.yaw_line.set_data(range(len(self.yaw_data)), self.yaw_data)
-            self.ax.relim()
-            self.ax.autoscale_view()
-
-    def add_data(self, data: typing.List[float]):
-        self.roll_data.append(data[0])
-        self.pitch_data.append(data[1])
-        self.yaw_data.append(data[2])
-
-        if len(self.roll_data) > 100:
-            self.roll_data.pop(0)
-            self.pitch_data.pop(0)
-            self.yaw_data.pop(0)
-
-    def set_ax(self, ax):
-        self.ax = ax
-        (self.roll_line,) = self.ax.plot([], [], label="Roll")
-        (self.pitch_line,) = self.ax.plot([], [], label="Pitch")
-        (self.yaw_line,) = self.ax.plot([], [], label="Yaw")
-
-        self.roll_text = self.ax.text(
-            0.0,
-            1.06,
-            "Roll: N/A",
-            transform=self.ax.transAxes,
-            verticalalignment="top",
-            color="blue",
-        )
-        self.pitch_text = self.ax.text(
-            0.3,
-            1.06,
-            "Pitch: N/A",
-            transform=self.ax.transAxes,
-            verticalalignment="top",
-            color="orange",
-        )
-        self.yaw_text = self.ax.text(
-            0.6,
-            1.06,
-            "Yaw: N/A",
-            transform=self.ax.transAxes,
-            verticalalignment="top",
-            color="green",
-        )
-        self.ax.legend()
-
-
-# 磁場の方向と強さをグラフにプロットする。
-# matplotlibのquiver関数を使用して、磁場の方向を矢印で表示する。磁力は数値
-class DirectionPlotter:
-    def __init__(self) -> None:
-        self.rad = 0
-        self.magnetic_strength = 0
-        self.arrow = None
-
-    def update_plot(self, _):
-        if self.arrow is None:
-            self.arrow = self.ax.quiver(
-                0,
-                0,
-                np.cos(self.rad),
-                np.sin(self.rad),
-                angles="xy",
-                scale_units="xy",
-                scale=1,
-                color="r",
-            )
-        else:
-            self.arrow.set_UVC(np.cos(self.rad), np.sin(self.rad))
-
-        if hasattr(self, "magnetic_strength_text"):
-            self.magnetic_strength_text.set_text(
-                f"Magnetic Strength: {self.magnetic_strength:.2f}"
-            )
-        else:
-            self.magnetic_strength_text = self.ax.text(
-                0.95,
-                1.06,
-                f"Magnetic Strength: {self.magnetic_strength:.2f}",
-                verticalalignment="top",
-                horizontalalignment="right",
-                transform=self.ax.transAxes,
-                color="blue",
-                fontsize=10,
-            )
-
-    def set_ax(self, ax):
-        self.ax = ax
-        self.setup_plot()
-
-    def setup_plot(self):
-        self.ax.set_xlim(-1, 1)
-        self.ax.set_ylim(-1, 1)
-        self.ax.grid(True)
-        self.ax.set_aspect("equal", "box")
-        self.ax.axhline(y=0, color="k")
-        self.ax.axvline(x=0, color="k")
-
-    def add_data(self, direction_data: typing.List[float]):
-        if not direction_data or len(direction_data) < 2:
-            return
-        self.rad = np.deg2rad(direction_data[0])
-        self.magnetic_strength = direction_data[1]
-
-
-# 角度プロットと磁場磁力プロットをコンバインして二つのグラフを同時に表示する為のクラス。
-class CombinedPlotter(FigureCanvas):
-    def __init__(
-        self,
-        angular_plotter,
-        direction_plotter,
-        angular_data,
-        magnetic_field_data,
-    ) -> None:
-        self.fig, self.axs = plt.subplots(nrows=1, ncols=2, figsize=(6, 4))
-        super().__init__(self.fig)
-        self.angular_plotter = angular_plotter
-        self.direction_plotter = direction_plotter
-        self.angular_data = angular_data
-        self.magnetic_field_data = magnetic_field_data
-
-        self.angular_plotter.set_ax(self.axs[0])
-        self.direction_plotter.set_ax(self.axs[1])
-
-        self.ani = FuncAnimation(
-            self.fig, self.update_plots, interval=100, save_count=300
-        )
-
-        self.data_updated = False
-
-    def update_plots(self, frame):
-        if self.data_updated:
-            self.angular_plotter.add_data(self.angular_data)
-            self.direction_plotter.add_data(self.magnetic_field_data)
-            self.angular_plotter.update_plot(None)
-            self.direction_plotter.update_plot(None)
-            self.draw()
-            self.data_updated = False
-
-    def set_data_updated(self):
-        self.data_updated = True
-
-    def show(self):
-        plt.tight_layout()
-        plt.show()
+# キューに入る受信データ。デバイスID (単一デバイスではNone) と到着時刻を付ける。
+class DeviceChunk(typing.NamedTuple):
+    device_id: typing.Optional[str]
+    timestamp_ns: int
+    data: bytes
 
 
 # 非同期IOを使用してシリアルポートを管理し、データの送受信を行うためのクラス。
 # asyncioとserial_asyncioを使用して非同期にシリアル通信を行う。
+# event_driven=Trueの場合、受信データはdata_receivedから直接result_queueに入り、
+# キューの溜まり具合で読み込みを一時停止・再開する。
+# queue_sizeを指定するとresult_queueの上限になり、overflow_policyで溢れたときの動作を選ぶ。
+# 生データのチャンクを捨てるとフレームがつながらなくなるため、設定ファイルからは常にblockを使う。
 class AsyncSerialManager:
     def __init__(
         self,
@@ -365,6 +257,17 @@ class AsyncSerialManager:
         rtscts=False,
         dsrdtr=False,
         waittime=0.1,
+        event_driven=False,
+        high_water=64,
+        recorder=None,
+        device_id=None,
+        result_queue=None,
+        queue_size=0,
+        overflow_policy=BLOCK,
+        output_rate=None,
+        output_content=None,
+        target_baudrate=None,
+        probe_baudrates=PROBE_BAUDRATES,
     ) -> None:
         self.port = port
         self.baudrate = baudrate
@@ -376,35 +279,108 @@ class AsyncSerialManager:
         self.rtscts = rtscts
         self.dsrdtr = dsrdtr
         self.waittime = waittime
+        self.event_driven = event_driven
+        # Optional CaptureWriter; every received chunk is recorded before decoding.
+        self.recorder = recorder
+        # With a device ID, received data is queued as DeviceChunk.
+        self.device_id = device_id
+        # Sensor settings (Hz, frame types) written when the port is opened.
+        self.output_rate = output_rate
+        self.output_content = output_content
+        # baudrate=None probes probe_baudrates; target_baudrate is switched to on open.
+        self.target_baudrate = target_baudrate
+        self.probe_baudrates = probe_baudrates
 
         self.protocol = None
         self.transport = None
+        self.connected = False
+        self.bytes_received = 0
+        self.chunks_received = 0
+        self.errors = 0
         self.loop = asyncio.get_event_loop()
-        self.result_queue = asyncio.Queue()
+        if result_queue is not None:
+            # A FlowControlQueue shared with other managers.
+            self.result_queue = result_queue
+        else:
+            self.result_queue = FlowControlQueue(
+                high_water, maxsize=queue_size, policy=overflow_policy
+            )
+
+    async def create_connection(self, protocol_factory, baudrate):
+        return await serial_asyncio.create_serial_connection(
+            asyncio.get_event_loop(),
+            protocol_factory,
+            self.port,
+            baudrate=baudrate,
+            bytesize=self.bytesize,
+            parity=self.parity,
+            stopbits=self.stopbits,
+            timeout=self.timeout,
+            xonxoff=self.xonxoff,
+            rtscts=self.rtscts,
+            dsrdtr=self.dsrdtr,
+        )
 
     async def open_serial_connection(self):
-        loop = asyncio.get_event_loop()
+        if self.baudrate is None:
+            # baudrate = auto: find the rate the sensor is currently using.
+            self.baudrate = await self.probe_baudrate()
+            if self.baudrate is None:
+                self.errors += 1
+                logger.error(f"No HWT905 frames on {self.port} at any baud rate")
+                return False
+        if self.event_driven:
+            protocol_factory = functools.partial(
+                AsyncSerialCommunicator, data_callback=self.on_data_received
+            )
+        else:
+            protocol_factory = AsyncSerialCommunicator
         try:
-            self.transport, self.protocol = (
-                await serial_asyncio.create_serial_connection(
-                    loop,
-                    AsyncSerialCommunicator,
-                    self.port,
-                    baudrate=self.baudrate,
-                    bytesize=self.bytesize,
-                    parity=self.parity,
-                    stopbits=self.stopbits,
-                    timeout=self.timeout,
-                    xonxoff=self.xonxoff,
-                    rtscts=self.rtscts,
-                    dsrdtr=self.dsrdtr,
-                )
+            self.transport, self.protocol = await self.create_connection(
+                protocol_factory, self.baudrate
             )
+            # connection_made is scheduled with call_soon; wait for it so that
+            # the channel exists when this returns.
+            await self.protocol.opened.wait()
+            if self.event_driven:
+                self.result_queue.set_flow_control(
+                    self.transport.pause_reading, self.transport.resume_reading
+                )
+            self.connected = True
             return True
         except serial.SerialException as e:
+            self.errors += 1
             logger.error(f"Failed to open serial port {self.port}: {e}")
             return False
 
+    def tag(self, data):
+        """Stamp received data with its device ID and monotonic arrival time."""
+        return DeviceChunk(self.device_id, time.monotonic_ns(), data)
+
+    # Receive callback of the event-driven mode.
+    def on_data_received(self, data):
+        self.bytes_received += len(data)
+        self.chunks_received += 1
+        chunk = self.tag(data)
+        # A full queue (block policy without flow control) counts a drop.
+        self.result_queue.offer(chunk)
+        self.record(chunk)
+
+    def record(self, chunk):
+        """Write a queued chunk to the recorder.
+
+        A failing recorder is logged, counted in errors and detached; it never
+        stops acquisition.
+        """
+        if self.recorder is None or not chunk.data:
+            return
+        try:
+            self.recorder.write(chunk.data, chunk.timestamp_ns)
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            self.recorder = None
+            logger.error(f"Capture stopped for {self.port}: {e}")
+
     async def read_data(self):
         await asyncio.sleep(self.waittime)
         raw_data = None
@@ -413,12 +389,129 @@ class AsyncSerialManager:
                 await self.protocol.serial_communication.read_serial_data_as_byte_list()
             )
         except Exception as e:
+            self.errors += 1
             logger.error(f"Data none {e}")
 
         return raw_data
 
+    @property
+    def channel(self):
+        """CommandChannel of the open port."""
+        return self.protocol.serial_communication.channel
+
+    async def configure_sensor(self, output_rate=None, output_content=None, save=True):
+        """Change the HWT905 output rate (Hz) and output frame types at runtime."""
+        await HWT905Config(self.channel).configure(output_rate, output_content, save)
+
+    async def count_valid_frames(self, baudrate, duration):
+        """Open the port at baudrate and count the valid frames received."""
+        decoder = HWT905StreamDecoder()
+        try:
+            transport, protocol = await self.create_connection(
+                functools.partial(AsyncSerialCommunicator, data_callback=decoder.feed),
+                baudrate,
+            )
+        except serial.SerialException as e:
+            logger.error(f"Failed to open serial port {self.port}: {e}")
+            return 0
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            transport.close()
+            await protocol.closed.wait()
+        return decoder.frames_decoded
+
+    async def probe_baudrate(self, candidates=None, duration=0.3, min_frames=3):
+        """Try each candidate rate and return the first one that yields
+        checksum-valid 0x55 frames, or None. The port must not be open."""
+        for baudrate in candidates or self.probe_baudrates:
+            frames = await self.count_valid_frames(baudrate, duration)
+            logger.info(f"Probe {self.port} at {baudrate} baud: {frames} frames")
+            if frames >= min_frames:
+                return baudrate
+        return None
+
+    async def drain_output(self, timeout=1.0):
+        """Wait until the queued commands have left the UART."""
+        await self.channel.drain()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.transport.get_write_buffer_size() and loop.time() < deadline:
+            await asyncio.sleep(0.005)
+        # The transport buffer is empty; flush() waits for the driver (tcdrain).
+        await loop.run_in_executor(None, self.transport.serial.flush)
+
+    async def count_frames_received(self, duration):
+        """Count the valid frames arriving on the open port for duration seconds.
+
+        Received data is still recorded and queued as usual.
+        """
+        decoder = HWT905StreamDecoder()
+        if self.event_driven:
+            forward = self.protocol.data_callback
+
+            def tap(data):
+                decoder.feed(data)
+                forward(data)
+
+            self.protocol.data_callback = tap
+            try:
+                await asyncio.sleep(duration)
+            finally:
+                self.protocol.data_callback = forward
+        else:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + duration
+            while loop.time() < deadline:
+                data = await self.read_data()
+                if data:
+                    decoder.feed(data)
+                    self.on_data_received(data)
+        return decoder.frames_decoded
+
+    async def switch_baudrate(self, baudrate, save=True, confirm=0.3, min_frames=3):
+        """Command the sensor to a new baud rate and follow it on the open port.
+
+        The sensor changes its rate as soon as it receives the command, so
+        the port is reconfigured once the command has left the UART. Unless
+        confirm is None, valid frames must then arrive at the new rate for
+        confirm seconds; otherwise the port goes back to the old rate and
+        False is returned. The save is sent at the new rate.
+        """
+        config = HWT905Config(self.channel)
+        await config.unlock()
+        await config.set_baud_rate(baudrate)
+        await self.drain_output()
+        previous = self.baudrate
+        # Bytes received around the switch are garbage; the decoder resyncs.
+        self.transport.serial.baudrate = baudrate
+        if confirm is not None:
+            frames = await self.count_frames_received(confirm)
+            if frames < min_frames:
+                self.transport.serial.baudrate = previous
+                self.errors += 1
+                logger.error(
+                    f"No HWT905 frames on {self.port} at {baudrate} baud; "
+                    f"staying at {previous}"
+                )
+                return False
+        self.baudrate = baudrate
+        logger.info(f"Switched {self.port} to {baudrate} baud")
+        if save:
+            await config.unlock()
+            await config.save()
+        return True
+
+    async def apply_sensor_settings(self):
+        if self.target_baudrate is not None and self.target_baudrate != self.baudrate:
+            await self.switch_baudrate(self.target_baudrate)
+        if self.output_rate is not None or self.output_content is not None:
+            await self.configure_sensor(self.output_rate, self.output_content)
+
     async def close_connection(self):
+        self.connected = False
         if self.protocol is not None:
+            await self.channel.close()
             self.protocol.serial_communication.close_port()
             logger.info("Closed port for protocol")
         if self.transport is not None:
@@ -431,119 +524,158 @@ class AsyncSerialManager:
             logger.error("Failed to open serial connection")
             return
         try:
+            await self.apply_sensor_settings()
+            if self.event_driven:
+                # Data is pushed by data_received; just wait for the port to close.
+                await self.protocol.closed.wait()
+                self.connected = False
+                return
             while True:
                 data = await self.read_data()
-                await self.result_queue.put(data)
+                if data:
+                    self.bytes_received += len(data)
+                    self.chunks_received += 1
+                chunk = self.tag(data)
+                await self.result_queue.put(chunk)
+                self.record(chunk)
         except asyncio.CancelledError:
             print("STOP")
 
 
 # 受信したデータを処理し、解析結果をCombinedPlotterクラスに渡すためのクラス。
-# 受信データキューからデータを取得し、HWT905_TTL_Dataparserクラスを使用して解析を行う。
+# 受信データキューからデータを取得し、HWT905StreamDecoderでフレーム単位に解析を行う。
+# DeviceChunkを受け取った場合は、デバイスごとのデコーダで解析する。
 class DataProcessor:
-    def __init__(self, read_data_queue) -> None:
+    def __init__(
+        self, read_data_queue, align_to_sensor=False, tracer=None, stage_factory=None
+    ) -> None:
         self.read_data_queue = read_data_queue
+        self.decoder = HWT905StreamDecoder()
+        self.decoders = {None: self.decoder}
+        # Optional: SensorClock per device and a LatencyTracer.
+        self.align_to_sensor = align_to_sensor
+        self.clocks = {}
+        self.tracer = tracer
+        # Optional: callable returning the filter stages (src.filters) of a device.
+        self.stage_factory = stage_factory
+        self.stages = {}
+        # Device and records of the last read, of all frame types.
+        self.device_id = None
+        self.records = []
+
+    def decoder_for(self, device_id):
+        decoder = self.decoders.get(device_id)
+        if decoder is None:
+            decoder = self.decoders[device_id] = HWT905StreamDecoder()
+        return decoder
+
+    def stages_for(self, device_id):
+        stages = self.stages.get(device_id)
+        if stages is None:
+            stages = self.stages[device_id] = list(self.stage_factory())
+        return stages
+
+    def filter_records(self, device_id, records):
+        """Run a device's decoded batch through its filter stages."""
+        if self.stage_factory is None:
+            return records
+        for stage in self.stages_for(device_id):
+            records = stage.apply(records)
+        return records
+
+    def decode_chunk(self, device_id, timestamp_ns, data):
+        records = self.decoder_for(device_id).decode(data, timestamp_ns)
+        if self.align_to_sensor:
+            clock = self.clocks.get(device_id)
+            if clock is None:
+                clock = self.clocks[device_id] = SensorClock()
+            clock.align(records)
+        return records
 
     async def read_sensor_data(self):
         sensor_data = await self.read_data_queue.get()
-
-        angular_output_data = HWT905_TTL_Dataparser.protocol_angular_output(
-            sensor_data
-        )
-
-        magnetic_field_output = HWT905_TTL_Dataparser.protocol_magnetic_field_output(
-            sensor_data
+        self.device_id = None
+        self.records = []
+        timestamp_ns = None
+        if isinstance(sensor_data, DeviceChunk):
+            self.device_id = sensor_data.device_id
+            timestamp_ns = sensor_data.timestamp_ns
+            sensor_data = sensor_data.data
+
+        angular_output_data = (None, None, None)
+        magnetic_field_output = (0, 0)
+        if not sensor_data:
+            return angular_output_data, magnetic_field_output
+
+        # Frames split across reads are completed by the decoder's carry-over buffer.
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        self.records = self.filter_records(
+            self.device_id,
+            self.decode_chunk(self.device_id, timestamp_ns, sensor_data),
         )
+        for record in self.records:
+            if type(record) is AngleRecord:
+                angular_output_data = (record.roll, record.pitch, record.yaw)
+            elif type(record) is MagneticFieldRecord:
+                magnetic_field_output = (record.direction, record.strength)
 
         return angular_output_data, magnetic_field_output
 
+    async def read_batch(self):
+        """Wait for data, then drain and decode everything queued so far.
 
-async def update_plots(combined_plotter, dataprocessor):
-    try:
-        while True:
-            angular_output_data, magnetic_field_output = (
-                await dataprocessor.read_sensor_data()
-            )
-
-            if angular_output_data and magnetic_field_output:
-                combined_plotter.angular_data = angular_output_data
-                combined_plotter.magnetic_field_data = magnetic_field_output
-                combined_plotter.set_data_updated()
-
-            await asyncio.sleep(0.1)
-    except asyncio.CancelledError as e:
-        print(f"update_plots: {e}")
-
-
-class MainWindow(QMainWindow):
-    def __init__(self, combained_plotter, serial_receive_task, update_task) -> None:
-        super().__init__()
-        self.setWindowTitle("Plot")
-        self.setGeometry(100, 100, 900, 400)
-
-        self.serial_receive_task = serial_receive_task
-        self.update_task = update_task
-        self.combinedPlotter = combained_plotter
-
-        widget = QWidget(self)
-        self.setCentralWidget(widget)
-
-        layout = QVBoxLayout(widget)
-
-        layout.addWidget(combained_plotter)
-
-    def closeEvent(self, event):
-        asyncio.create_task(self.async_cleanup())
-        super().closeEvent(event)
-
-    async def async_cleanup(self):
-        try:
-            self.serial_receive_task.cancel()
-            self.update_task.cancel()
-            await asyncio.gather(
-                self.serial_receive_task, self.update_task, return_exceptions=True
-            )
-
-            QCoreApplication.quit()
-            print("end")
-        except asyncio.CancelledError as e:
-            print(f"closeEvent: {e}")
-
-
-# プログラムのエントリーポイント。
-# 各クラスのインスタンスを作成してプログラムを実行する。
-async def main():
-
-    asyncserialmanager = AsyncSerialManager("COM3", 9600, waittime=0.1)
-    dataprocessor = DataProcessor(asyncserialmanager.result_queue)
-
-    # シリアル通信のタスクを開始
-    task = asyncio.create_task(asyncserialmanager.run())
-
-    direction_plotter = DirectionPlotter()
-    angular_plotter = AngularPlotter()
-
-    combined_plotter = CombinedPlotter(
-        angular_plotter,
-        direction_plotter,
-        [],
-        [],
-    )
-
-    # プロットの更新タスクを開始
-    update_task = asyncio.create_task(update_plots(combined_plotter, dataprocessor))
-
-    main_window = MainWindow(combined_plotter, task, update_task)
-    main_window.show()
-
-    # シリアル通信とプロット更新のタスクを待機
-    await asyncio.gather(task, update_task)
-
-    await asyncserialmanager.close_connection()
-
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    loop = qasync.QEventLoop(app)
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(main())
+        Returns {device_id: records}. Every record carries the arrival time
+        of its chunk; bare bytes are stamped when they are dequeued. The
+        chunks are marked done once decoded, so read_data_queue.join()
+        waits for them.
+        """
+        chunks = [await self.read_data_queue.get()]
+        while not self.read_data_queue.empty():
+            chunks.append(self.read_data_queue.get_nowait())
+        dequeued_ns = time.monotonic_ns()
+
+        batch = {}
+        tracer = self.tracer
+        device_id = None
+        for chunk in chunks:
+            device_id, timestamp_ns = None, dequeued_ns
+            if isinstance(chunk, DeviceChunk):
+                device_id, timestamp_ns, chunk = chunk
+                if timestamp_ns is None:
+                    timestamp_ns = dequeued_ns
+            if not chunk:
+                continue
+            records = self.decode_chunk(device_id, timestamp_ns, chunk)
+            batch.setdefault(device_id, []).extend(records)
+            if tracer is not None and records:
+                # Latencies are measured from arrival, per decoded frame.
+                tracer.since("queue", timestamp_ns, len(records), dequeued_ns)
+                tracer.since("decode", timestamp_ns, len(records))
+        for device, records in batch.items():
+            batch[device] = self.filter_records(device, records)
+        for _ in chunks:
+            self.read_data_queue.task_done()
+        self.device_id = device_id
+        self.records = [record for records in batch.values() for record in records]
+        return batch
+
+
+# GUIのクラスはsrc.guiに移動した。matplotlibとPyQt5は、これらの名前が
+# 初めて参照されたときにだけ読み込む。
+_GUI_NAMES = (
+    "AngularPlotter",
+    "DirectionPlotter",
+    "CombinedPlotter",
+    "MainWindow",
+    "update_plots",
+    "main",
+)
+
+
+def __getattr__(name):
+    if name in _GUI_NAMES:
+        from src import gui
+
+        return getattr(gui, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,114 @@
+import os
+import typing
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Rows written in total, rows being written up to, then the rows themselves.
+_HEADER_SIZE = 16
+
+
+def _attach_untracked(name):
+    """Open an existing segment without handing it to this process's tracker."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the segment as if it were ours.
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# プロセス間で解析済みのサンプルを受け渡す共有メモリのリングバッファ。
+# 書き込み側は1プロセスだけで、シーケンスロックで読み込み側と同期する。
+# 行を上書きする前に「書き込み中の終端」を、書き込んだ後に書き込み総数を更新するので、
+# 読み込み側はコピーの前後で2つを確かめ、コピー中に上書きされた行を捨てられる。
+# ロックもサンプルごとのpickleも発生しない。
+class SharedRingBuffer:
+    def __init__(
+        self,
+        shm: shared_memory.SharedMemory,
+        capacity: int,
+        columns: typing.Sequence[str],
+    ) -> None:
+        self._shm = shm
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self._written = np.ndarray((1,), dtype=np.int64, buffer=shm.buf)
+        self._writing = np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=8)
+        self._data = np.ndarray(
+            (capacity, len(self.columns)),
+            dtype=np.float64,
+            buffer=shm.buf,
+            offset=_HEADER_SIZE,
+        )
+        # Reader side: next row to read, and rows overwritten before being read.
+        self.cursor = 0
+        self.overruns = 0
+
+    @classmethod
+    def create(cls, capacity: int, columns: typing.Sequence[str], name=None):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        size = _HEADER_SIZE + capacity * len(columns) * 8
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+        return cls(shm, capacity, columns)
+
+    @classmethod
+    def attach(cls, name: str, capacity: int, columns: typing.Sequence[str]):
+        # The creator owns the segment; a reader must not unlink it on exit.
+        return cls(_attach_untracked(name), capacity, columns)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def written(self):
+        return int(self._written[0])
+
+    def write(self, rows):
+        """Append rows of shape (samples, columns). Only one process may write."""
+        rows = np.asarray(rows, dtype=np.float64)
+        count = len(rows)
+        if count == 0:
+            return
+        start = self.written
+        end = start + count
+        if count > self.capacity:
+            rows = rows[-self.capacity :]
+        positions = np.arange(end - len(rows), end) % self.capacity
+        # Announce the rows about to be overwritten, then publish them once in place.
+        self._writing[0] = end
+        self._data[positions] = rows
+        self._written[0] = end
+
+    def read(self) -> np.ndarray:
+        """Copy out the rows written since the last read, oldest first."""
+        end = self.written
+        start = max(self.cursor, end - self.capacity)
+        self.overruns += start - self.cursor
+        self.cursor = end
+        if start >= end:
+            return np.empty((0, len(self.columns)))
+        rows = self._data[np.arange(start, end) % self.capacity]
+        # Drop rows a write started during the copy may have overwritten.
+        oldest_intact = int(self._writing[0]) - self.capacity
+        if oldest_intact > start:
+            self.overruns += oldest_intact - start
+            rows = rows[oldest_intact - start :]
+        return rows
+
+    def close(self):
+        # The array views must be released before the mapping can be closed.
+        del self._written, self._writing, self._data
+        self._shm.close()
+
+    def unlink(self):
+        # A reader sharing our resource tracker may have dropped the entry;
+        # register it again so the unregister inside unlink() always matches.
+        if os.name == "posix":
+            resource_tracker.register(self._shm._name, "shared_memory")
+        self._shm.unlink()
@@ -0,0 +1,182 @@
+import abc
+import asyncio
+import logging
+
+from src.hwt905_records import HWT905Record
+from src.net_stream import (
+    DEVICES,
+    HEADER,
+    SUBSCRIBE,
+    UNSUBSCRIBE,
+    decode_devices,
+    decode_samples,
+    parse_header,
+    parse_packet,
+)
+
+logger = logging.getLogger(__name__)
+
+RECORD_TYPES = {cls.frame_type: cls for cls in HWT905Record.__subclasses__()}
+
+
+# ストリームから受け取った1パケット分のサンプル。
+# samplesはSAMPLE_DTYPEの構造化配列で、受信バッファをコピーせずに参照する。
+class StreamBatch:
+    __slots__ = ("sequence", "samples", "devices")
+
+    def __init__(self, sequence, samples, devices) -> None:
+        self.sequence = sequence
+        self.samples = samples
+        self.devices = devices
+
+    def __len__(self):
+        return len(self.samples)
+
+    def records(self):
+        """{device_id: records} like DataProcessor.read_batch.
+
+        Values come back as float64 and timestamps are the server's
+        monotonic clock.
+        """
+        batch = {}
+        for timestamp_ns, device, frame_type, _, values in self.samples.tolist():
+            cls = RECORD_TYPES.get(frame_type)
+            if cls is None:
+                continue
+            record = cls(*values[: len(cls.__slots__)])
+            record.timestamp_ns = timestamp_ns
+            batch.setdefault(self.devices[device], []).append(record)
+        return batch
+
+
+# TCPとUDPのクライアントに共通の処理。デバイス表を保持し、シーケンス番号の欠けを数える。
+# パケットの読み方はサブクラスが_read_packetで決める。
+class StreamClient(abc.ABC):
+    def __init__(self) -> None:
+        self.devices = []
+        self.received = 0
+        self.lost = 0  # sample packets the server skipped or the network dropped
+        self._next_sequence = None
+
+    @abc.abstractmethod
+    async def _read_packet(self):
+        """(kind, sequence, payload) of the next packet; EOFError at the end."""
+
+    def _accept(self, kind, sequence, payload):
+        if kind == DEVICES:
+            self.devices = decode_devices(payload)
+            # The device table carries the sequence of the next sample packet.
+            if self._next_sequence is None:
+                self._next_sequence = sequence
+            return None
+        if self._next_sequence is not None:
+            gap = (sequence - self._next_sequence) & 0xFFFFFFFF
+            # Anything far "behind" is a reordered datagram, not a gap.
+            if gap < 0x80000000:
+                self.lost += gap
+        self._next_sequence = (sequence + 1) & 0xFFFFFFFF
+        self.received += 1
+        return StreamBatch(sequence, decode_samples(payload), self.devices)
+
+    async def read(self) -> StreamBatch:
+        """Next packet of samples; EOFError once the stream has ended."""
+        while True:
+            batch = self._accept(*await self._read_packet())
+            if batch is not None:
+                return batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.read()
+        except EOFError:
+            raise StopAsyncIteration from None
+
+
+class TcpStreamClient(StreamClient):
+    def __init__(self, reader, writer) -> None:
+        super().__init__()
+        self.reader = reader
+        self.writer = writer
+
+    async def _read_packet(self):
+        # IncompleteReadError is an EOFError.
+        kind, sequence, length = parse_header(
+            await self.reader.readexactly(HEADER.size)
+        )
+        return kind, sequence, await self.reader.readexactly(length)
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+# UDPのクライアント。接続時とrefresh秒ごとに購読要求を送る。
+# 読み出しが追いつかないときは古いパケットから捨てる (lostには含めずdroppedで数える)。
+class UdpStreamClient(StreamClient, asyncio.DatagramProtocol):
+    def __init__(self, refresh=2.0, queue_size=1024) -> None:
+        super().__init__()
+        self.refresh = refresh
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.transport = None
+        self._packets = asyncio.Queue()
+        self._refresh_task = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.sendto(SUBSCRIBE)
+        self._refresh_task = asyncio.get_running_loop().create_task(self._renew())
+
+    def datagram_received(self, data, addr):
+        try:
+            packet = parse_packet(data)
+        except ValueError as e:
+            logger.debug("Ignoring datagram from %s: %s", addr, e)
+            return
+        if self._packets.qsize() >= self.queue_size:
+            self._packets.get_nowait()
+            self.dropped += 1
+        self._packets.put_nowait(packet)
+
+    def error_received(self, exc):
+        logger.debug("UDP stream error: %s", exc)
+
+    def connection_lost(self, exc):
+        self._packets.put_nowait(None)
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.refresh)
+            self.transport.sendto(SUBSCRIBE)
+
+    async def _read_packet(self):
+        packet = await self._packets.get()
+        if packet is None:
+            raise EOFError("UDP stream closed")
+        return packet
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(UNSUBSCRIBE)
+            self.transport.close()
+
+
+async def open_tcp_stream(host, port) -> TcpStreamClient:
+    reader, writer = await asyncio.open_connection(host, port)
+    return TcpStreamClient(reader, writer)
+
+
+async def open_udp_stream(host, port, refresh=2.0) -> UdpStreamClient:
+    loop = asyncio.get_running_loop()
+    _, client = await loop.create_datagram_endpoint(
+        lambda: UdpStreamClient(refresh), remote_addr=(host, port)
+    )
+    return client
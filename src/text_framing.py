@@ -0,0 +1,149 @@
+import codecs
+import typing
+
+from src.checksum import xor8
+from src.constants import ascii_control_codes
+
+STX = b"\x02"
+ETX = b"\x03"
+CRLF = b"\r\n"
+
+# str.translate table: each control character is preceded by its name,
+# as DataParser.byte_to_ascii has always printed them.
+CONTROL_CODE_TABLE = {
+    ord(code): name + code.decode("ascii") for code, name in ascii_control_codes.items()
+}
+
+
+def decode_text(data, encoding: str = "utf-8", errors: str = "strict") -> str:
+    """Decode a complete message and name its control characters."""
+    return codecs.decode(bytes(data), encoding, errors).translate(CONTROL_CODE_TABLE)
+
+
+# テキストを受信チャンク単位で文字列に変換するクラス。
+# マルチバイト文字がチャンクをまたいでも、インクリメンタルデコーダが続きを待つ。
+class TextDecoder:
+    def __init__(self, encoding: str = "utf-8", errors: str = "replace") -> None:
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors)
+
+    def decode(self, data, final: bool = False) -> str:
+        return self._decoder.decode(data, final).translate(CONTROL_CODE_TABLE)
+
+    def reset(self):
+        self._decoder.reset()
+
+
+class TextMessage(typing.NamedTuple):
+    body: bytes  # everything between the delimiters
+    payload: bytes  # body without the "*hh" checksum
+    checksum: typing.Optional[int]  # None when the message carries no checksum
+    valid: typing.Optional[bool]
+
+    def text(self, encoding: str = "utf-8") -> str:
+        return decode_text(self.payload, encoding, errors="replace")
+
+
+# STX/ETXやCR/LFで区切られたテキストのメッセージを切り出すクラス。
+# 読み込みをまたいだメッセージは次のfeedまで保持する。
+# "*hh" で終わるメッセージ (NMEAなど) はXORチェックサムを検証する。
+class TextFramer:
+    def __init__(
+        self,
+        start: typing.Optional[bytes] = None,
+        end: bytes = CRLF,
+        checksum_marker: typing.Optional[bytes] = b"*",
+        max_length: int = 4096,
+    ) -> None:
+        self.start = start
+        self.end = end
+        self.checksum_marker = checksum_marker
+        self.max_length = max_length
+        self._buffer = bytearray()
+        self.messages = 0
+        self.checksum_errors = 0
+        self.skipped_bytes = 0
+
+    @classmethod
+    def nmea(cls):
+        """NMEA 0183: "$...*hh" terminated by CR/LF."""
+        return cls(start=b"$", end=CRLF)
+
+    @classmethod
+    def stx_etx(cls):
+        return cls(start=STX, end=ETX, checksum_marker=None)
+
+    def feed(self, data) -> typing.List[TextMessage]:
+        """Append received bytes (bytes, bytearray or memoryview) and return
+        every complete message."""
+        buffer = self._buffer
+        if data:
+            buffer += data
+        messages = []
+        find = buffer.find
+        start, end = self.start, self.end
+        pos = 0
+        while True:
+            if start is not None:
+                first = find(start, pos)
+                if first < 0:
+                    # Keep a partial start delimiter at the end of the buffer.
+                    keep = max(pos, len(buffer) - len(start) + 1)
+                    self.skipped_bytes += keep - pos
+                    pos = keep
+                    break
+                self.skipped_bytes += first - pos
+                pos = first
+                body_start = first + len(start)
+            else:
+                body_start = pos
+            stop = find(end, body_start)
+            if stop < 0:
+                if len(buffer) - body_start > self.max_length:
+                    # No terminator within max_length: drop the garbage.
+                    self.skipped_bytes += len(buffer) - pos
+                    pos = len(buffer)
+                break
+            if start is not None:
+                # A second start before the end means the first message was cut.
+                restart = buffer.rfind(start, body_start, stop)
+                if restart >= 0:
+                    self.skipped_bytes += restart - pos
+                    body_start = restart + len(start)
+            pos = stop + len(end)
+            if stop - body_start > self.max_length:
+                self.skipped_bytes += pos - body_start
+                continue
+            messages.append(self.parse(bytes(buffer[body_start:stop])))
+        del buffer[:pos]
+        self.messages += len(messages)
+        return messages
+
+    def parse(self, body: bytes) -> TextMessage:
+        marker = self.checksum_marker
+        if marker is not None:
+            index = body.rfind(marker)
+            digits = body[index + len(marker) :]
+            if index >= 0 and len(digits) == 2:
+                try:
+                    checksum = int(digits, 16)
+                except ValueError:
+                    checksum = None
+                if checksum is not None:
+                    payload = body[:index]
+                    valid = xor8(payload) == checksum
+                    if not valid:
+                        self.checksum_errors += 1
+                    return TextMessage(body, payload, checksum, valid)
+        return TextMessage(body, body, None, None)
+
+    def reset(self):
+        self._buffer.clear()
+
+
+async def iter_messages(queue, framer: TextFramer):
+    """Yield messages framed from the chunks of an asyncio.Queue as they arrive."""
+    while True:
+        chunk = await queue.get()
+        # DeviceChunk carries the bytes in .data.
+        for message in framer.feed(getattr(chunk, "data", chunk)):
+            yield message
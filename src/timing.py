@@ -0,0 +1,134 @@
+import math
+import time
+import typing
+
+import numpy as np
+
+from src.hwt905_records import TimeRecord
+
+
+# センサーの時刻フレーム (0x50) を使って、受信時刻のばらつきを取り除くクラス。
+# 受信時刻 - センサー時刻 の最小値 (最も遅延の小さかったフレーム) を
+# 時計のずれとして保持し、以降のレコードの時刻を センサー時刻 + ずれ にそろえる。
+# 時計の進み方の差に追従できるよう、ずれは1フレームごとにslew_nsだけ大きくなれる。
+class SensorClock:
+    def __init__(self, slew_ns: int = 100_000) -> None:
+        self.slew_ns = slew_ns
+        self.offset_ns = None
+        self.sensor_ns = None
+
+    def align(self, records):
+        """Replace arrival timestamps with sensor time mapped to the monotonic clock.
+
+        Records before the first time frame keep their arrival time.
+        """
+        for record in records:
+            if type(record) is TimeRecord and record.timestamp_ns is not None:
+                sensor_ns = record.epoch_ns()
+                if sensor_ns is not None:
+                    offset = record.timestamp_ns - sensor_ns
+                    if self.offset_ns is None:
+                        self.offset_ns = offset
+                    else:
+                        self.offset_ns = min(offset, self.offset_ns + self.slew_ns)
+                    self.sensor_ns = sensor_ns
+            if self.sensor_ns is not None:
+                record.timestamp_ns = self.sensor_ns + self.offset_ns
+        return records
+
+
+# 遅延のヒストグラム。対数間隔のビン (1桁あたりbins_per_decade個) に数えるので、
+# 記録はO(1)で、p50やp99はビンの境界の精度で求める。
+class LatencyHistogram:
+    def __init__(
+        self, minimum: float = 1e-6, maximum: float = 10.0, bins_per_decade: int = 20
+    ) -> None:
+        self.minimum = minimum
+        self.bins_per_decade = bins_per_decade
+        decades = math.log10(maximum / minimum)
+        size = int(math.ceil(decades * bins_per_decade)) + 1
+        # Upper edge of every bin; values above maximum land in the last one.
+        self.edges = minimum * 10 ** (np.arange(1, size + 1) / bins_per_decade)
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float, count: int = 1):
+        if seconds <= self.minimum:
+            index = 0
+        else:
+            index = int(math.log10(seconds / self.minimum) * self.bins_per_decade)
+            index = min(index, len(self.counts) - 1)
+        self.counts[index] += count
+        self.count += count
+        self.total += seconds * count
+        if seconds > self.max:
+            self.max = seconds
+
+    def record_many(self, seconds):
+        seconds = np.asarray(seconds, dtype=np.float64)
+        if seconds.size == 0:
+            return
+        ratio = np.maximum(seconds / self.minimum, 1.0)
+        indices = (np.log10(ratio) * self.bins_per_decade).astype(np.intp)
+        np.add.at(self.counts, np.minimum(indices, len(self.counts) - 1), 1)
+        self.count += seconds.size
+        self.total += float(seconds.sum())
+        self.max = max(self.max, float(seconds.max()))
+
+    def percentile(self, q: float) -> float:
+        """Upper edge of the bin holding the q-th percentile (q in 0..100)."""
+        if self.count == 0:
+            return math.nan
+        rank = q / 100 * self.count
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return float(min(self.edges[min(index, len(self.edges) - 1)], self.max))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    def reset(self):
+        self.counts.fill(0)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+# Stages traced between data_received and the finished draw.
+TRACE_STAGES = ("queue", "decode", "plot_update", "draw")
+
+
+# 受信からの遅延を段階ごとのヒストグラムに記録するクラス。
+# DataProcessorやCombinedPlotterにtracerを渡したときだけ記録する。
+class LatencyTracer:
+    def __init__(self, stages: typing.Sequence[str] = TRACE_STAGES) -> None:
+        self.histograms = {stage: LatencyHistogram() for stage in stages}
+
+    def record(self, stage: str, seconds: float, count: int = 1):
+        self.histograms[stage].record(seconds, count)
+
+    def since(self, stage: str, start_ns: int, count: int = 1, now_ns=None):
+        """Record the time from start_ns (monotonic) until now."""
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        self.histograms[stage].record((now_ns - start_ns) / 1e9, count)
+
+    def since_many(self, stage: str, start_ns, now_ns=None):
+        """since() for an array of start times, one per frame."""
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        start_ns = np.asarray(start_ns, dtype=np.int64)
+        self.histograms[stage].record_many((now_ns - start_ns) / 1e9)
+
+    def summary(self) -> typing.Dict[str, typing.Dict[str, float]]:
+        return {
+            stage: {
+                "count": histogram.count,
+                "p50": histogram.percentile(50),
+                "p99": histogram.percentile(99),
+                "max": histogram.max,
+            }
+            for stage, histogram in self.histograms.items()
+        }
@@ -0,0 +1,97 @@
+import asyncio
+import os
+
+import pytest
+
+from src.hwt905_commands import baud_rate_command, save_command, unlock_command
+from src.hwt905_ttl_dataparser import ANGLE_OUTPUT, HWT905_TTL_Dataparser
+from src.replay import PtyReplay
+from src.serial_communication_async import AsyncSerialManager
+
+ANGLE_FRAME = HWT905_TTL_Dataparser.build_frame(
+    ANGLE_OUTPUT, b"\x00\x40\x00\xc0\x00\x20"
+)
+
+
+class ScriptedManager(AsyncSerialManager):
+    """Frames received per baud rate, without a port."""
+
+    def __init__(self, frames_by_rate, **kwargs) -> None:
+        super().__init__("COM9", None, **kwargs)
+        self.frames_by_rate = frames_by_rate
+        self.tried = []
+
+    async def count_valid_frames(self, baudrate, duration):
+        self.tried.append(baudrate)
+        return self.frames_by_rate.get(baudrate, 0)
+
+
+@pytest.mark.asyncio
+async def test_probe_returns_first_rate_with_valid_frames():
+    manager = ScriptedManager({9600: 1, 115200: 0, 230400: 12, 921600: 30})
+
+    # 9600ではフレームが少なすぎるので、次の候補に進む
+    assert await manager.probe_baudrate((9600, 115200, 230400, 921600)) == 230400
+    assert manager.tried == [9600, 115200, 230400]
+
+
+@pytest.mark.asyncio
+async def test_open_fails_when_no_rate_matches():
+    manager = ScriptedManager({}, probe_baudrates=(9600, 115200))
+
+    assert await manager.open_serial_connection() is False
+    assert manager.baudrate is None
+    assert manager.errors == 1
+
+
+@pytest.mark.asyncio
+async def test_probe_and_switch_over_pty():
+    replay = PtyReplay(os.devnull)
+
+    async def sensor():
+        while True:
+            await replay.write(ANGLE_FRAME)
+            await asyncio.sleep(0.01)
+
+    sensor_task = asyncio.create_task(sensor())
+    manager = AsyncSerialManager(
+        replay.port, None, event_driven=True, probe_baudrates=(9600,)
+    )
+    try:
+        assert await manager.open_serial_connection()
+        assert manager.baudrate == 9600
+
+        assert await manager.switch_baudrate(115200)
+
+        assert manager.transport.serial.baudrate == 115200
+        assert manager.baudrate == 115200
+        # センサー側に届いたコマンド: 解除、ボーレート変更、新しいレートで解除と保存
+        assert os.read(replay.master_fd, 100) == b"".join(
+            (unlock_command(), baud_rate_command(115200), unlock_command(), save_command())
+        )
+    finally:
+        sensor_task.cancel()
+        await asyncio.gather(sensor_task, return_exceptions=True)
+        await manager.close_connection()
+        replay.close()
+
+
+@pytest.mark.asyncio
+async def test_switch_rolls_back_without_frames_at_new_rate():
+    # センサーが新しいレートで何も送ってこない
+    replay = PtyReplay(os.devnull)
+    manager = AsyncSerialManager(replay.port, 9600, event_driven=True)
+    try:
+        assert await manager.open_serial_connection()
+
+        assert await manager.switch_baudrate(115200, confirm=0.1) is False
+
+        assert manager.transport.serial.baudrate == 9600
+        assert manager.baudrate == 9600
+        # 保存コマンドは送らない
+        assert os.read(replay.master_fd, 100) == unlock_command() + baud_rate_command(
+            115200
+        )
+    finally:
+        await manager.close_connection()
+        replay.close()
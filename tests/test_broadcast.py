@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from src.broadcast import BroadcastBus, publish_batches
+from src.hwt905_ttl_dataparser import ANGLE_OUTPUT, HWT905_TTL_Dataparser
+from src.metrics import MetricsRegistry
+from src.receive_queue import BLOCK, LATEST
+from src.serial_communication_async import DataProcessor
+
+ANGLE = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\xc0\x00\x20")
+
+
+@pytest.mark.asyncio
+async def test_every_subscriber_reads_the_same_batch():
+    bus = BroadcastBus(capacity=4)
+    first, second = bus.subscribe("a"), bus.subscribe("b")
+    batch = {None: ["record"]}
+
+    await bus.publish(batch)
+    # コピーせず、同じオブジェクトを共有する
+    assert await first.get() is batch
+    assert await second.get() is batch
+    with pytest.raises(asyncio.QueueEmpty):
+        first.get_nowait()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_skips_without_holding_back_others():
+    bus = BroadcastBus(capacity=4)
+    fast = bus.subscribe("fast")
+    slow = bus.subscribe("slow")
+    bounded = bus.subscribe("bounded", max_lag=2)
+    latest = bus.subscribe("latest", policy=LATEST)
+
+    for i in range(10):
+        await bus.publish({None: [i]})
+        assert fast.get_nowait() == {None: [i]}
+
+    # 容量を超えた分は読み飛ばして数える
+    assert [batch[None][0] for batch in slow.drain()] == [6, 7, 8, 9]
+    assert slow.skipped == 6
+    assert [batch[None][0] for batch in bounded.drain()] == [8, 9]
+    assert [batch[None][0] for batch in latest.drain()] == [9]
+    assert fast.skipped == 0 and fast.lag == 0
+
+
+@pytest.mark.asyncio
+async def test_block_subscriber_holds_back_the_publisher():
+    bus = BroadcastBus(capacity=2)
+    recorder = bus.subscribe("recorder", policy=BLOCK)
+    await bus.publish({None: [0]})
+    await bus.publish({None: [1]})
+
+    publish = asyncio.create_task(bus.publish({None: [2]}))
+    await asyncio.sleep(0.01)
+    assert not publish.done()
+
+    assert recorder.get_nowait() == {None: [0]}
+    await asyncio.wait_for(publish, 1)
+    assert [batch[None][0] for batch in recorder.drain()] == [1, 2]
+    assert recorder.skipped == 0
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_decoder_and_subscriber():
+    queue = asyncio.Queue()
+    bus = BroadcastBus()
+    forward = bus.subscribe("forward")
+    decoder = asyncio.create_task(publish_batches(DataProcessor(queue), bus))
+    try:
+        queue.put_nowait(ANGLE)
+        queue.put_nowait(ANGLE * 2)
+        # デコードが終わるまでjoin()は返らない
+        await asyncio.wait_for(queue.join(), 1)
+        assert bus.published == 1
+
+        caught_up = asyncio.create_task(forward.caught_up())
+        await asyncio.sleep(0.01)
+        assert not caught_up.done()
+        assert len((await forward.read_batch())[None]) == 3
+        await asyncio.wait_for(caught_up, 1)
+    finally:
+        decoder.cancel()
+        await asyncio.gather(decoder, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_subscription_reads_like_a_data_processor():
+    queue = asyncio.Queue()
+    bus = BroadcastBus()
+    plot, forward = bus.subscribe("plot"), bus.subscribe("forward")
+    decoder = asyncio.create_task(publish_batches(DataProcessor(queue), bus))
+    try:
+        queue.put_nowait(ANGLE * 2)
+        await asyncio.sleep(0)
+        queue.put_nowait(ANGLE)
+        await asyncio.sleep(0.01)
+
+        batch = await asyncio.wait_for(plot.read_batch(), 1)
+        assert len(batch[None]) == 3
+        assert len(plot.records) == 3
+        assert [len(b[None]) for b in forward.drain()] == [2, 1]
+    finally:
+        decoder.cancel()
+        await asyncio.gather(decoder, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_bus_metrics():
+    bus = BroadcastBus(capacity=2)
+    bus.subscribe("plot")
+    registry = MetricsRegistry()
+    registry.watch_bus(bus)
+    for i in range(3):
+        await bus.publish({None: [i]})
+
+    snapshot = registry.snapshot()
+    assert snapshot["hwt905_bus_published_total"] == 3
+    assert snapshot['hwt905_subscriber_lag{subscriber="plot"}'] == 3
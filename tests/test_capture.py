@@ -0,0 +1,129 @@
+import os
+
+import pytest
+
+from src.capture import CaptureReader, CaptureWriter, index_path
+from src.serial_communication_async import AsyncSerialManager
+
+
+def write_capture(path, records, index_interval=0.0):
+    writer = CaptureWriter(path, index_interval=index_interval)
+    for timestamp_ns, data in records:
+        writer.write(data, timestamp_ns)
+    writer.close()
+    return writer
+
+
+def test_write_and_read_back(tmp_path):
+    path = tmp_path / "capture.bin"
+    records = [(1000, b"UQ\x01"), (2000, b"\x02\x03"), (3000, b"US")]
+    writer = write_capture(path, records)
+
+    assert writer.records_written == 3
+    assert writer.bytes_written == 7
+    with CaptureReader(path) as reader:
+        assert [(t, bytes(data)) for t, data in reader.records()] == records
+        assert reader.start_time == 1000
+        # 時刻範囲でシークできる
+        assert reader.read(2000, 3000) == b"\x02\x03"
+        assert reader.read(1500) == b"\x02\x03US"
+
+
+def test_sparse_index_and_rebuild(tmp_path):
+    path = tmp_path / "capture.bin"
+    records = [(i * 1_000_000, bytes([i])) for i in range(100)]
+    # 10ms間隔のインデックス -> 10件に1件だけ登録される
+    write_capture(path, records, index_interval=0.01)
+
+    with CaptureReader(path) as reader:
+        assert len(reader.index) == 10
+        assert reader.read(55_000_000, 58_000_000) == bytes([55, 56, 57])
+
+    os.remove(index_path(path))
+    with CaptureReader(path) as reader:
+        assert len(reader.index) == 100
+        assert reader.read(55_000_000, 58_000_000) == bytes([55, 56, 57])
+
+
+def test_truncated_record_is_ignored(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, [(1, b"abc"), (2, b"defg")])
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 2)
+
+    with CaptureReader(path) as reader:
+        assert reader.read() == b"abc"
+
+
+def test_append_to_existing_capture(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, [(1, b"a")])
+    write_capture(path, [(2, b"b")])
+
+    with CaptureReader(path) as reader:
+        # ファイルヘッダは先頭に一度だけ書かれる
+        assert [t for t, _ in reader.records()] == [1, 2]
+        assert reader.read() == b"ab"
+
+
+def test_append_after_clock_restart_stays_ordered(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, [(5_000, b"a"), (6_000, b"b")])
+    with open(path, "ab") as f:
+        f.write(b"\x00\x01")  # 中断されたレコードの断片
+    # 再起動後の単調時計は前回より小さい値から始まる
+    write_capture(path, [(100, b"c"), (200, b"d")])
+
+    with CaptureReader(path) as reader:
+        times = [t for t, _ in reader.records()]
+        assert times == [5_000, 6_000, 6_001, 6_101]
+        assert reader.read() == b"abcd"
+        assert reader.read(6_001) == b"cd"
+
+
+def test_empty_and_header_only_captures(tmp_path):
+    path = tmp_path / "capture.bin"
+    path.touch()
+    with CaptureReader(path) as reader:
+        assert reader.read() == b"" and reader.start_time is None
+
+    write_capture(path, [])
+    with CaptureReader(path) as reader:
+        assert list(reader.records()) == []
+
+
+def test_close_with_live_views(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, [(1, b"abc")])
+    reader = CaptureReader(path)
+    (_, data), = reader.records()
+    reader.close()
+    # 残っているビューは最後の参照がなくなるまで有効
+    assert bytes(data) == b"abc"
+
+
+def test_failed_writer_raises(tmp_path):
+    # ディレクトリには書き込めない
+    writer = CaptureWriter(tmp_path)
+    writer._thread.join()
+    with pytest.raises(OSError):
+        writer.write(b"abc")
+    with pytest.raises(OSError):
+        writer.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_writer_does_not_stop_acquisition(tmp_path):
+    writer = CaptureWriter(tmp_path)
+    writer._thread.join()
+    manager = AsyncSerialManager("COM9", 9600, recorder=writer)
+
+    # 記録に失敗しても受信データはキューに入り、記録だけを止める
+    manager.on_data_received(b"abc")
+    manager.on_data_received(b"def")
+    assert [manager.result_queue.get_nowait().data for _ in range(2)] == [
+        b"abc",
+        b"def",
+    ]
+    assert manager.recorder is None
+    assert manager.errors == 1
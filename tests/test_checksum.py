@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.checksum import (
+    ALGORITHMS,
+    crc16_modbus,
+    crc32,
+    sum8,
+    verify_frames,
+    xor8,
+    xor8_segments,
+)
+from src.hwt905_ttl_dataparser import ANGLE_OUTPUT, HWT905_TTL_Dataparser
+
+CHECK = b"123456789"
+
+
+def test_known_check_values():
+    assert crc16_modbus(CHECK) == 0x4B37
+    assert crc32(CHECK) == 0xCBF43926
+    assert sum8(CHECK) == sum(CHECK) & 0xFF
+    assert xor8(CHECK) == 0x31
+    # NumPyを使う長いデータでも同じ結果になる
+    assert xor8(CHECK * 9) == 0x31
+
+
+@pytest.mark.parametrize("name", sorted(ALGORITHMS))
+def test_batch_matches_scalar(name):
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, size=(500, 13), dtype=np.uint8)
+    algorithm = ALGORITHMS[name]
+
+    batch = algorithm.batch(frames)
+
+    assert batch.tolist() == [algorithm.function(row.tobytes()) for row in frames]
+    # 連続したバッファとフレーム長でも渡せる
+    assert algorithm.batch(frames.tobytes(), 13).tolist() == batch.tolist()
+
+
+def test_verify_frames():
+    frame = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\xc0")
+    broken = frame[:-1] + b"\x00"
+    assert verify_frames(frame + broken + frame, frame_length=11).tolist() == [
+        True,
+        False,
+        True,
+    ]
+
+    # Modbus RTUと同じく、CRC-16は下位バイトが先
+    body = b"\x01\x03\x00\x00\x00\x0a"
+    modbus = body + crc16_modbus(body).to_bytes(2, "little")
+    assert verify_frames(modbus, "crc16_modbus", len(modbus)).tolist() == [True]
+
+
+def test_xor8_segments():
+    data = b"$GPA*00$GPBB*00$*00"
+    starts = [1, 8, 16]
+    ends = [4, 12, 16]
+
+    assert xor8_segments(data, starts, ends).tolist() == [
+        xor8(data[1:4]),
+        xor8(data[8:12]),
+        0,
+    ]
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from src.command_channel import CommandChannel
+from src.hwt905_commands import (
+    HWT905Config,
+    baud_rate_command,
+    output_content_command,
+    output_rate_command,
+    parse_frame_types,
+    save_command,
+    unlock_command,
+)
+from src.hwt905_records import ANGLE_OUTPUT, MAGNETIC_FIELD_OUTPUT
+
+
+class FakeTransport:
+    def __init__(self) -> None:
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+
+
+@pytest.mark.asyncio
+async def test_writes_are_coalesced():
+    transport = FakeTransport()
+    channel = CommandChannel(transport)
+
+    for command in (b"AB", b"CD", b"EF"):
+        channel.write(command)
+    await channel.drain()
+
+    # 同じタイミングのコマンドは1回の書き込みにまとめる
+    assert transport.writes == [b"ABCDEF"]
+    assert (channel.commands, channel.writes, channel.bytes_written) == (3, 1, 6)
+    await channel.close()
+
+
+@pytest.mark.asyncio
+async def test_paused_transport_holds_writes():
+    transport = FakeTransport()
+    channel = CommandChannel(transport)
+    channel.pause_writing()
+
+    sender = asyncio.create_task(channel.send(b"\xff\xaa\x00\x00\x00"))
+    await asyncio.sleep(0.01)
+    assert transport.writes == []
+    assert not sender.done()
+
+    channel.resume_writing()
+    await asyncio.wait_for(sender, 1)
+    assert transport.writes == [b"\xff\xaa\x00\x00\x00"]
+    await channel.close()
+
+
+def test_hwt905_command_bytes():
+    assert unlock_command() == b"\xff\xaa\x69\x88\xb5"
+    assert save_command() == b"\xff\xaa\x00\x00\x00"
+    assert output_rate_command(100) == b"\xff\xaa\x03\x09\x00"
+    # RSWのビットnがフレームタイプ0x50+nに対応する
+    assert output_content_command([ANGLE_OUTPUT, MAGNETIC_FIELD_OUTPUT]) == (
+        b"\xff\xaa\x02\x18\x00"
+    )
+    assert output_content_command([0x50, 0x5A]) == b"\xff\xaa\x02\x01\x04"
+    assert baud_rate_command(115200) == b"\xff\xaa\x04\x06\x00"
+    assert parse_frame_types("0x53, 0x54") == [0x53, 0x54]
+
+    with pytest.raises(ValueError):
+        output_rate_command(3)
+
+
+@pytest.mark.asyncio
+async def test_configure_sends_unlock_settings_and_save():
+    transport = FakeTransport()
+    channel = CommandChannel(transport)
+    config = HWT905Config(channel, delay=0)
+
+    await config.configure(output_rate=50, output_content=[ANGLE_OUTPUT])
+
+    assert transport.writes == [
+        unlock_command(),
+        output_rate_command(50),
+        output_content_command([ANGLE_OUTPUT]),
+        save_command(),
+    ]
+    await channel.close()
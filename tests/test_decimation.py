@@ -0,0 +1,111 @@
+import configparser
+
+import numpy as np
+import pytest
+from matplotlib.figure import Figure
+
+from src.decimation import (
+    LTTB,
+    LevelOfDetail,
+    decimation_setting,
+    lttb,
+    minmax_buckets,
+)
+from src.gui import AngularPlotter
+from src.ring_buffer import RingBuffer
+
+COLUMNS = ("roll", "pitch", "yaw")
+
+
+def fill(history, lod, samples, chunk):
+    for start in range(0, samples, chunk):
+        t = np.arange(start, min(start + chunk, samples)) / 200.0
+        history.extend(np.vstack((t, np.sin(t), np.cos(t), t % 7)))
+        lod.update(len(t))
+
+
+def test_minmax_buckets_keep_spikes():
+    x = np.arange(10000, dtype=np.float64)
+    y = np.zeros(10000)
+    y[4321] = 5.0
+    y[8000] = -3.0
+
+    x_out, y_out = minmax_buckets(x, y, buckets=100)
+    assert len(x_out) == 200
+    assert y_out.max() == 5.0 and y_out.min() == -3.0
+    assert x_out[0] == 0.0 and np.all(np.diff(x_out) >= 0)
+
+
+def test_lttb_keeps_endpoints_and_peak():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50.0)
+    y[500] = 10.0
+
+    x_out, y_out = lttb(x, y, 50)
+    assert len(x_out) == 50
+    assert (x_out[0], x_out[-1]) == (0.0, 999.0)
+    assert 10.0 in y_out
+    # しきい値より短い線はそのまま返す
+    assert len(lttb(x[:10], y[:10], 50)[0]) == 10
+
+
+def test_levels_update_incrementally():
+    history = RingBuffer(100_000, ("time",) + COLUMNS)
+    lod = LevelOfDetail(history, COLUMNS)
+    fill(history, lod, 64_000, 7)
+
+    rebuilt = LevelOfDetail(history, COLUMNS)
+    rebuilt.rebuild()
+    # 7件ずつ追加しても、まとめて作り直した結果と一致する
+    for level, expected in zip(lod.levels, rebuilt.levels):
+        assert np.array_equal(level.view("yaw_max"), expected.view("yaw_max"))
+        assert np.array_equal(level.view("time"), expected.view("time"))
+    assert lod.pending == rebuilt.pending
+
+
+@pytest.mark.parametrize("method", ["minmax", LTTB])
+def test_decimate_cost_follows_points_not_history(method):
+    # 1時間分の200Hzデータ
+    history = RingBuffer(720_000, ("time",) + COLUMNS)
+    lod = LevelOfDetail(history, COLUMNS)
+    fill(history, lod, 900_000, 1000)
+
+    lines = lod.decimate(800, method)
+    x, yaw = lines["yaw"]
+    assert len(x) <= 1600
+    assert x[0] == history.view("time")[0]
+    assert np.all(np.diff(x) >= 0)
+    if method == "minmax":
+        assert yaw.max() == history.view("yaw").max()
+        assert yaw.min() == history.view("yaw").min()
+
+
+def test_short_history_is_not_decimated():
+    history = RingBuffer(1000, ("time",) + COLUMNS)
+    lod = LevelOfDetail(history, COLUMNS)
+    fill(history, lod, 100, 10)
+
+    x, roll = lod.decimate(800)["roll"]
+    assert np.array_equal(roll, history.view("roll"))
+
+
+def test_angular_plotter_draws_about_one_point_per_pixel():
+    plotter = AngularPlotter(history=50_000, max_points=300)
+    plotter.set_ax(Figure().add_subplot())
+    t = np.arange(50_000) / 200.0
+    plotter.add_block(np.vstack((np.sin(t), np.cos(t), t % 7)), t)
+
+    plotter.update_plot(None)
+    assert len(plotter.roll_line.get_xdata()) <= 600
+    assert plotter.roll_line.get_xdata()[0] == pytest.approx(-t[-1])
+    # 間引いても極値で軸の範囲を決める
+    assert plotter.ax.get_ylim()[1] > 6.9
+
+
+def test_decimation_setting():
+    config = configparser.ConfigParser()
+    config.read_string("[plot_set]\ndecimation = none\n")
+    assert decimation_setting(config) == {"decimation": None, "max_points": None}
+
+    config.read_string("[plot_set]\ndecimation = LTTB\npoints = 400\n")
+    assert decimation_setting(config) == {"decimation": LTTB, "max_points": 400}
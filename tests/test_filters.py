@@ -0,0 +1,174 @@
+import asyncio
+import configparser
+
+import numpy as np
+import pytest
+
+from src.filters import (
+    AngleFilterStage,
+    AngleUnwrapper,
+    ComplementaryFilter,
+    ExponentialMovingAverage,
+    FusionStage,
+    KalmanFilter,
+    MovingAverage,
+    build_stages,
+    first_order_iir,
+    stage_factory,
+)
+from src.hwt905_records import (
+    AccelerationRecord,
+    AngleRecord,
+    AngularVelocityRecord,
+    MagneticFieldRecord,
+)
+from src.hwt905_ttl_dataparser import ANGLE_OUTPUT, HWT905_TTL_Dataparser
+from src.serial_communication_async import DataProcessor
+
+RNG = np.random.default_rng(0)
+
+
+def in_batches(item, block, sizes):
+    """Run a filter over block split at sizes, as consecutive batches."""
+    edges = np.cumsum([0] + list(sizes) + [block.shape[1]])
+    return np.concatenate(
+        [item.process(block[:, a:b]) for a, b in zip(edges[:-1], edges[1:])], axis=1
+    )
+
+
+def test_first_order_iir_matches_recurrence():
+    inputs = RNG.normal(size=(2, 3000))
+    decay = np.array([0.5, 0.999])
+    output = first_order_iir(inputs, decay, np.array([1.0, -2.0]))
+
+    state = np.array([1.0, -2.0])
+    for n in range(inputs.shape[1]):
+        state = decay * state + inputs[:, n]
+        assert output[:, n] == pytest.approx(state)
+
+
+def test_unwrapper_keeps_state_across_batches():
+    angles = np.linspace(0, 1000, 500)[None, :]
+    wrapped = (angles + 180) % 360 - 180
+    wrapped[0, 100] = np.nan
+
+    unwrapped = in_batches(AngleUnwrapper(), wrapped, [3, 250])
+    expected = angles.copy()
+    expected[0, 100] = np.nan
+    np.testing.assert_allclose(unwrapped, expected, atol=1e-9)
+
+
+def test_moving_average_and_ema_across_batches():
+    samples = RNG.normal(size=(3, 400))
+
+    average = in_batches(MovingAverage(7), samples, [2, 100])
+    expected = [samples[:, max(0, n - 6) : n + 1].mean(axis=1) for n in range(400)]
+    np.testing.assert_allclose(average, np.array(expected).T)
+
+    ema = in_batches(ExponentialMovingAverage(0.3), samples, [1, 50])
+    state = samples[:, 0]
+    for n in range(400):
+        state = 0.3 * samples[:, n] + 0.7 * state
+    np.testing.assert_allclose(ema[:, -1], state)
+
+
+def test_complementary_and_kalman_match_their_recurrences():
+    rates = RNG.normal(size=(3, 2000)) * 10
+    references = np.cumsum(rates, axis=1) * 0.01 + RNG.normal(size=(3, 2000))
+
+    complementary = ComplementaryFilter(gain=0.98, dt=0.01)
+    output = complementary.process(rates, references)
+    state = references[:, 0]
+    for n in range(2000):
+        state = 0.98 * (state + rates[:, n] * 0.01) + 0.02 * references[:, n]
+    np.testing.assert_allclose(output[:, -1], state)
+
+    kalman = KalmanFilter(dt=0.01)
+    first = kalman.process(rates[:, :700], references[:, :700])
+    second = kalman.process(rates[:, 700:], references[:, 700:])
+    state = np.vstack((references[:, 0], np.zeros(3)))
+    for n in range(2000):
+        state = (
+            kalman.matrix @ state
+            + np.outer(kalman.rate_input, rates[:, n])
+            + np.outer(kalman.gain, references[:, n])
+        )
+    np.testing.assert_allclose(second[:, -1], state[0])
+    assert first.shape == (3, 700)
+
+
+def test_kalman_estimates_gyro_bias():
+    # 静止したセンサー: ジャイロだけが2deg/sのバイアスを持つ
+    kalman = KalmanFilter(dt=0.01)
+    rates = np.full((3, 5000), 2.0)
+    references = RNG.normal(scale=0.5, size=(3, 5000))
+
+    angles = kalman.process(rates, references)
+    np.testing.assert_allclose(kalman.bias, 2.0, atol=0.2)
+    assert np.abs(angles[:, -1000:]).mean() < 0.5
+
+
+def test_fusion_stage_replaces_sensor_angles():
+    stage = FusionStage(ComplementaryFilter(gain=0.5))
+    records = []
+    for i in range(10):
+        for record in (
+            AccelerationRecord(0.0, 0.0, 1.0, 25.0),
+            AngularVelocityRecord(0.0, 0.0, 0.0, 5.0),
+            AngleRecord(99.0, 99.0, 99.0, 1),
+            MagneticFieldRecord(100, 0, 0, 25.0),
+        ):
+            record.timestamp_ns = i * 10_000_000
+            records.append(record)
+
+    fused = stage.apply(records)
+    angles = [record for record in fused if type(record) is AngleRecord]
+    # 最初の地磁気より前の角速度は使わない
+    assert len(angles) == 9
+    assert angles[-1].astuple() == pytest.approx((0.0, 0.0, 0.0, 0))
+    assert angles[0].timestamp_ns == 10_000_000
+
+
+def test_angle_filter_stage_updates_records_in_place():
+    stage = AngleFilterStage([AngleUnwrapper(), MovingAverage(2)])
+    first = [AngleRecord(170.0, 0.0, 0.0, 1)]
+    second = [AngleRecord(-170.0, 0.0, 0.0, 1)]
+
+    stage.apply(first)
+    stage.apply(second)
+    # -170°は190°に展開してから平均する
+    assert second[0].roll == pytest.approx(180.0)
+
+
+@pytest.mark.asyncio
+async def test_data_processor_runs_stages_per_device():
+    config = configparser.ConfigParser()
+    config.read_string("[filter]\nunwrap = True\nsmoothing = ema\nalpha = 0.5\n")
+    queue = asyncio.Queue()
+    processor = DataProcessor(queue, stage_factory=stage_factory(config))
+    frame = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\x00")
+
+    queue.put_nowait(frame)
+    await processor.read_batch()
+    queue.put_nowait(HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\xc0"))
+    batch = await processor.read_batch()
+
+    assert batch[None][0].roll == pytest.approx(0.5 * 90.0 + 0.5 * -90.0)
+    assert len(processor.stages[None]) == 1
+
+
+def test_build_stages_from_config():
+    config = configparser.ConfigParser()
+    # 角度の展開は既定で有効
+    assert [type(stage) for stage in build_stages(config)] == [AngleFilterStage]
+    config.read_string("[filter]\nunwrap = False\n")
+    assert stage_factory(config) is None
+
+    config.read_string("[filter]\nfusion = kalman\nsmoothing = moving_average\n")
+    stages = build_stages(config)
+    assert [type(stage) for stage in stages] == [FusionStage, AngleFilterStage]
+    assert isinstance(stages[0].filter, KalmanFilter)
+
+    config.read_string("[filter]\nfusion = magic\n")
+    with pytest.raises(ValueError):
+        build_stages(config)
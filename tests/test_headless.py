@@ -0,0 +1,78 @@
+import configparser
+import io
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+from src.acquisition import create_source, display_policy
+from src.capture import CaptureWriter
+from src.headless import run
+from src.hwt905_ttl_dataparser import HWT905_TTL_Dataparser
+from src.receive_queue import BLOCK, LATEST
+
+
+def test_core_import_does_not_load_gui():
+    code = (
+        "import sys\n"
+        "from src import HWT905_TTL_Dataparser, AsyncSerialManager, DataProcessor\n"
+        "import src.headless\n"
+        "gui = [m for m in sys.modules if m.split('.')[0] in "
+        "('matplotlib', 'PyQt5', 'qasync')]\n"
+        "assert not gui, gui\n"
+    )
+    root = pathlib.Path(__file__).resolve().parents[1]
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=root)
+
+
+def test_core_import_works_without_tty():
+    # Windowsにはttyがない (termiosはこの環境のpyserialが使うので残す)
+    code = (
+        "import sys\n"
+        "sys.modules['tty'] = None\n"
+        "import src, src.acquisition, src.headless, src.replay\n"
+    )
+    root = pathlib.Path(__file__).resolve().parents[1]
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=root)
+
+
+@pytest.mark.asyncio
+async def test_headless_forwards_replayed_records(tmp_path):
+    path = tmp_path / "capture.bin"
+    writer = CaptureWriter(path)
+    writer.write(HWT905_TTL_Dataparser.build_frame(0x53, b"\x00\x40"), 1)
+    writer.write(HWT905_TTL_Dataparser.build_frame(0x56, b"\x01\x00\x00\x00"), 2)
+    writer.close()
+
+    config = configparser.ConfigParser()
+    config.read_dict({"replay": {"path": str(path), "speed": "0"}})
+    output = io.StringIO()
+
+    await run(config, output)
+
+    lines = output.getvalue().splitlines()
+    assert lines == [
+        "-\tAngleRecord\t90.0\t0.0\t0.0\t0",
+        "-\tPressureRecord\t1\t0.0",
+    ]
+
+
+def test_raw_queue_never_drops_chunks(tmp_path, caplog):
+    path = tmp_path / "capture.bin"
+    CaptureWriter(path).close()
+    config = configparser.ConfigParser()
+    config.read_dict(
+        {
+            "replay": {"path": str(path)},
+            "serial_set": {"queuesize": "4", "overflow": "latest"},
+            "plot_set": {"overflow": "latest"},
+        }
+    )
+
+    # 生データのキューは常にblockで、捨てる動作は表示用の購読者に適用する
+    source = create_source(config)
+    assert source.result_queue.policy == BLOCK
+    assert source.result_queue.maxsize == 4
+    assert "ignored" in caplog.text
+    assert display_policy(config) == LATEST
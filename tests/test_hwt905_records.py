@@ -0,0 +1,134 @@
+import struct
+
+import pytest
+
+from src.hwt905_records import (
+    FRAME_DECODERS,
+    AccelerationRecord,
+    AngleRecord,
+    AngularVelocityRecord,
+    GpsAccuracyRecord,
+    GpsPositionRecord,
+    GpsSpeedRecord,
+    MagneticFieldRecord,
+    PortStatusRecord,
+    PressureRecord,
+    QuaternionRecord,
+    TimeRecord,
+)
+from src.hwt905_ttl_dataparser import HWT905_TTL_Dataparser, HWT905StreamDecoder
+
+build_frame = HWT905_TTL_Dataparser.build_frame
+
+
+@pytest.mark.parametrize(
+    "frame_type, payload, expected",
+    [
+        (
+            0x50,
+            struct.pack("<BBBBBBH", 24, 5, 6, 7, 8, 9, 500),
+            TimeRecord(2024, 5, 6, 7, 8, 9, 500),
+        ),
+        (
+            0x51,
+            struct.pack("<hhhh", 2048, -2048, 16384, 2500),
+            AccelerationRecord(1.0, -1.0, 8.0, 25.0),
+        ),
+        (
+            0x52,
+            struct.pack("<hhhh", 16384, 0, -16384, 500),
+            AngularVelocityRecord(1000.0, 0.0, -1000.0, 5.0),
+        ),
+        (
+            0x53,
+            struct.pack("<hhhh", 16384, -16384, 8192, 3),
+            AngleRecord(90.0, -90.0, 45.0, 3),
+        ),
+        (
+            0x54,
+            struct.pack("<hhhh", 3, 4, 0, 2000),
+            MagneticFieldRecord(3, 4, 0, 20.0),
+        ),
+        (0x55, struct.pack("<HHHH", 1, 2, 3, 4), PortStatusRecord(1, 2, 3, 4)),
+        (
+            0x56,
+            struct.pack("<ii", 101325, 12345),
+            PressureRecord(101325, 123.45),
+        ),
+        (
+            0x57,
+            struct.pack("<ii", 1393000000, 353000000),
+            GpsPositionRecord(139.5, 35.5),
+        ),
+        (
+            0x57,
+            struct.pack("<ii", -1393000000, -353000000),
+            GpsPositionRecord(-139.5, -35.5),
+        ),
+        (
+            0x58,
+            struct.pack("<hhi", 123, 9000, 36000),
+            GpsSpeedRecord(12.3, 90.0, 36.0),
+        ),
+        (
+            0x59,
+            struct.pack("<hhhh", 32767, 0, -16384, 16384),
+            QuaternionRecord(32767 / 32768, 0.0, -0.5, 0.5),
+        ),
+        (
+            0x5A,
+            struct.pack("<hhhh", 8, 120, 90, 150),
+            GpsAccuracyRecord(8, 1.2, 0.9, 1.5),
+        ),
+    ],
+)
+def test_decode_every_frame_type(frame_type, payload, expected):
+    record = HWT905_TTL_Dataparser.decode_frame(build_frame(frame_type, payload))
+    assert record == expected
+    assert record.frame_type == frame_type
+
+
+def test_west_and_south_positions_keep_their_minutes():
+    # divmodで負の値を割ると分が補数になる (-123.09になっていた)
+    frame = build_frame(0x57, struct.pack("<ii", -1234567890, -353045678))
+    record = HWT905_TTL_Dataparser.decode_frame(frame)
+    assert record.longitude == pytest.approx(-(123 + 45.6789 / 60))
+    assert record.latitude == pytest.approx(-(35 + 30.45678 / 60))
+
+
+def test_every_type_has_a_decoder():
+    assert sorted(FRAME_DECODERS) == list(range(0x50, 0x5B))
+
+
+def test_records_use_slots():
+    record = AngleRecord(1.0, 2.0, 3.0, 0)
+    assert not hasattr(record, "__dict__")
+    with pytest.raises(AttributeError):
+        record.extra = 1
+
+
+def test_magnetic_field_direction_and_strength():
+    record = MagneticFieldRecord(0, 16, 0, 0.0)
+    assert record.direction == 90.0
+    assert record.strength == 16.0
+
+
+def test_stream_decoder_dispatches_in_one_pass():
+    decoder = HWT905StreamDecoder()
+    data = (
+        build_frame(0x51, b"")
+        + build_frame(0x53, b"")
+        + build_frame(0x59, b"")
+        + build_frame(0x53, b"")
+    )
+
+    records = decoder.decode(data)
+
+    assert [type(record) for record in records] == [
+        AccelerationRecord,
+        AngleRecord,
+        QuaternionRecord,
+        AngleRecord,
+    ]
+    assert decoder.frames_by_type[0x53] == 2
+    assert decoder.frames_by_type[0x54] == 0
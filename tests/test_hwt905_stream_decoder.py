@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from src.hwt905_ttl_dataparser import (
+    ANGLE_OUTPUT,
+    MAGNETIC_FIELD_OUTPUT,
+    HWT905_TTL_Dataparser,
+    HWT905StreamDecoder,
+)
+from src.serial_communication_async import DataProcessor
+
+TEST_DATA = b"UQ'\x00g\xff\x05\x08~\t\xc7UR\x00\x00\xff\xff\x00\x00~\t,US\x1e\xfc=\xff\x17\xd6\xccF\xfdUT\xf6\xfbI\x03\xa1\xf3\x00\x00z"
+
+
+def test_feed_real_data():
+    decoder = HWT905StreamDecoder()
+    frames = decoder.feed(TEST_DATA)
+
+    assert [frame[1] for frame in frames] == [0x51, 0x52, 0x53, 0x54]
+    assert decoder.checksum_errors == 0
+    assert decoder.skipped_bytes == 0
+
+
+def test_feed_frame_split_across_reads():
+    decoder = HWT905StreamDecoder()
+    frames = []
+    # 1バイトずつ渡しても、全フレームが一度だけ返される
+    for i in range(len(TEST_DATA)):
+        frames.extend(decoder.feed(TEST_DATA[i : i + 1]))
+
+    assert frames == HWT905StreamDecoder().feed(TEST_DATA)
+    assert decoder.frames_decoded == 4
+
+
+def test_feed_rejects_bad_checksum_and_resyncs():
+    decoder = HWT905StreamDecoder()
+    angle = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\xc0\x00\x20")
+    corrupted = angle[:-1] + bytes([(angle[-1] + 1) & 0xFF])
+
+    frames = decoder.feed(b"\x01\x02" + corrupted + angle)
+
+    assert frames == [angle]
+    assert decoder.checksum_errors == 1
+
+
+def test_false_header_is_not_a_checksum_error():
+    decoder = HWT905StreamDecoder()
+    angle = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\xc0\x00\x20")
+
+    # 0x55の後のタイプバイトが範囲外
+    assert decoder.feed(b"\x55\x01" + bytes(9) + angle) == [angle]
+    assert decoder.checksum_errors == 0
+    assert decoder.resync_skips == 1
+
+
+def test_decode_frames():
+    angle = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\xc0\x00\x20")
+    roll, pitch, yaw = HWT905_TTL_Dataparser.decode_angular_frame(angle)
+    assert (roll, pitch, yaw) == (90.0, -90.0, 45.0)
+
+    magnetic = HWT905_TTL_Dataparser.build_frame(
+        MAGNETIC_FIELD_OUTPUT, b"\x00\x00\x10\x00\x00\x00"
+    )
+    direction, strength = HWT905_TTL_Dataparser.decode_magnetic_field_frame(magnetic)
+    assert direction == 90.0
+    assert strength == 16.0
+
+
+@pytest.mark.asyncio
+async def test_data_processor_keeps_partial_frame():
+    queue = asyncio.Queue()
+    processor = DataProcessor(queue)
+    await queue.put(TEST_DATA[:30])
+    await queue.put(TEST_DATA[30:])
+
+    first = await processor.read_sensor_data()
+    second = await processor.read_sensor_data()
+
+    assert first[0] == (None, None, None)
+    assert second[0][0] is not None
+    assert second[1][1] > 0
+
+
+@pytest.mark.asyncio
+async def test_data_processor_read_batch_drains_queue():
+    queue = asyncio.Queue()
+    processor = DataProcessor(queue)
+    angle = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\xc0\x00\x20")
+    # フレームが分割されていても、溜まった分をまとめて解析する
+    for chunk in (TEST_DATA[:30], TEST_DATA[30:], angle[:5], angle[5:], angle):
+        queue.put_nowait(chunk)
+
+    batch = await processor.read_batch()
+
+    assert queue.empty()
+    assert list(batch) == [None]
+    assert [record.frame_type for record in batch[None]] == [
+        0x51, 0x52, 0x53, 0x54, 0x53, 0x53
+    ]
+    assert processor.records == batch[None]
+
+
+def test_decode_block_matches_frame_decoders(tmp_path):
+    angle = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\xc0\x00\x20")
+    magnetic = HWT905_TTL_Dataparser.build_frame(
+        MAGNETIC_FIELD_OUTPUT, b"\x00\x00\x10\x00\x00\x00"
+    )
+    corrupted = angle[:-1] + b"\x00"
+    # 先頭のゴミと途中の壊れたヘッダの後でも再同期できること
+    data = b"\x01" + TEST_DATA + angle + b"\x02\x03" + magnetic + corrupted
+
+    block = HWT905_TTL_Dataparser.decode_block(data)
+
+    assert list(block.frame_type) == [0x51, 0x52, 0x53, 0x54, 0x53, 0x54, 0x53]
+    assert list(block.valid) == [True] * 6 + [False]
+    assert block.roll[-1] == 90.0
+    assert block.pitch[-1] == -90.0
+    assert block.yaw[-1] == 45.0
+    assert block.heading[-1] == 90.0
+    assert block.magnetic_strength[-1] == 16.0
+    for frame, roll in zip(HWT905StreamDecoder().feed(TEST_DATA)[2:3], block.roll):
+        assert HWT905_TTL_Dataparser.decode_angular_frame(frame)[0] == roll
+
+    path = tmp_path / "capture.bin"
+    path.write_bytes(data)
+    from_file = HWT905_TTL_Dataparser.decode_file(path)
+    assert list(from_file.valid) == list(block.valid)
+
+
+def test_decode_block_resyncs_inside_a_frame_with_a_missing_byte():
+    angle = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\xc0\x00\x20")
+    magnetic = HWT905_TTL_Dataparser.build_frame(
+        MAGNETIC_FIELD_OUTPUT, b"\x00\x00\x10\x00\x00\x00"
+    )
+    # 1バイト欠けたフレームの直後のフレームを読み飛ばさないこと
+    data = angle + angle[:5] + angle[6:] + magnetic + angle + magnetic
+
+    block = HWT905_TTL_Dataparser.decode_block(data)
+
+    expected = [frame[1] for frame in HWT905StreamDecoder().feed(data)]
+    assert expected == [0x53, 0x54, 0x53, 0x54]
+    assert list(block.frame_type[block.valid]) == expected
+    assert list(block.valid).count(False) == 1
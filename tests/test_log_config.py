@@ -0,0 +1,70 @@
+import logging
+
+from src.log_config import (
+    PACKET_LOGGER,
+    RateLimitFilter,
+    configure_logging,
+    stop_logging,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_record(msg="data received: %r", args=(b"U",)):
+    return logging.LogRecord(PACKET_LOGGER, logging.DEBUG, __file__, 1, msg, args, None)
+
+
+def test_rate_limit_reports_suppressed_count():
+    clock = FakeClock()
+    rate_filter = RateLimitFilter(rate=2.0, clock=clock)
+
+    passed = [rate_filter.filter(make_record()) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+
+    # 1秒後に通したログに、捨てた件数を付け足す
+    clock.now = 1.0
+    record = make_record()
+    assert rate_filter.filter(record) is True
+    assert record.getMessage() == "data received: b'U' (+3 suppressed)"
+    assert rate_filter.suppressed == 3
+
+
+def test_suppressed_count_on_message_without_args():
+    rate_filter = RateLimitFilter(rate=0, sample_every=2)
+    rate_filter.filter(make_record())
+
+    record = make_record("buffer 100% full", ())
+    assert rate_filter.filter(record) is True
+    assert record.getMessage() == "buffer 100% full (+1 suppressed)"
+
+
+def test_sampling_keeps_every_nth_record():
+    rate_filter = RateLimitFilter(rate=0, sample_every=3)
+
+    passed = [rate_filter.filter(make_record()) for _ in range(6)]
+
+    assert passed == [False, False, True, False, False, True]
+
+
+class Unprintable:
+    def __repr__(self):
+        raise AssertionError("formatted on the caller's thread")
+
+
+def test_records_are_written_by_the_listener(tmp_path):
+    path = tmp_path / "logs" / "apps.log"
+    configure_logging(str(path), packet_rate=0)
+    try:
+        logging.getLogger("src.example").info("opened %s", "COM3")
+        # 出力されないレベルでは引数を文字列にしない
+        logging.getLogger(PACKET_LOGGER).log(5, "data received: %r", Unprintable())
+    finally:
+        stop_logging()
+
+    assert "src.example - INFO - opened COM3" in path.read_text()
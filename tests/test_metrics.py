@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from src.hwt905_ttl_dataparser import ANGLE_OUTPUT, HWT905_TTL_Dataparser
+from src.metrics import MetricsRegistry, pipeline_registry, serve_metrics
+from src.receive_queue import DROP_OLDEST
+from src.serial_communication_async import AsyncSerialManager, DataProcessor
+from src.timing import LatencyTracer
+
+ANGLE = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\xc0\x00\x20")
+
+
+@pytest.mark.asyncio
+async def test_snapshot_covers_port_decoder_and_queue():
+    manager = AsyncSerialManager(
+        "COM9", 9600, queue_size=1, overflow_policy=DROP_OLDEST
+    )
+    processor = DataProcessor(manager.result_queue)
+    registry = pipeline_registry(manager, processor)
+
+    manager.on_data_received(b"\x00" + ANGLE)
+    manager.on_data_received(ANGLE[:-1] + b"\x00" + ANGLE)
+    await processor.read_batch()
+
+    snapshot = registry.snapshot()
+    labels = 'device="",port="COM9"'
+    assert snapshot[f"hwt905_bytes_received_total{{{labels}}}"] == 34
+    assert snapshot["hwt905_queue_dropped_total"] == 1
+    assert snapshot["hwt905_queue_depth"] == 0
+    frames = 'hwt905_frames_decoded_total{device="",frame_type="0x53"}'
+    assert snapshot[frames] == 1
+    # 壊れたフレームはチェックサムエラーと読み飛ばしに数える
+    assert snapshot['hwt905_checksum_errors_total{device=""}'] == 1
+    assert snapshot['hwt905_resync_bytes_total{device=""}'] == 11
+
+
+@pytest.mark.asyncio
+async def test_tracer_latency_quantiles():
+    manager = AsyncSerialManager("COM9", 9600)
+    processor = DataProcessor(manager.result_queue, tracer=LatencyTracer())
+    registry = pipeline_registry(manager, processor)
+
+    manager.on_data_received(ANGLE * 3)
+    await processor.read_batch()
+
+    snapshot = registry.snapshot()
+    assert snapshot['hwt905_latency_frames_total{stage="queue"}'] == 3
+    assert snapshot['hwt905_latency_seconds{quantile="0.99",stage="decode"}'] > 0
+    # 描画していない段階は分位数を出さない
+    assert 'hwt905_latency_seconds{quantile="0.50",stage="draw"}' not in snapshot
+
+
+@pytest.mark.asyncio
+async def test_prometheus_endpoint():
+    registry = MetricsRegistry()
+    registry.watch_processor(DataProcessor(asyncio.Queue()))
+    server = await serve_metrics(registry, port=0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = (await reader.read()).decode()
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    assert response.startswith("HTTP/1.1 200 OK")
+    assert "# TYPE hwt905_checksum_errors_total counter" in response
+    assert 'hwt905_checksum_errors_total{device=""} 0.0' in response
@@ -0,0 +1,118 @@
+import asyncio
+import configparser
+
+import pytest
+
+from src.hwt905_records import AngleRecord
+from src.hwt905_ttl_dataparser import HWT905_TTL_Dataparser
+from src.multi_device import MultiDeviceManager
+from src.replay import PtyReplay
+from src.serial_communication_async import DataProcessor, DeviceChunk
+
+
+def angle_frame(roll: int) -> bytes:
+    return HWT905_TTL_Dataparser.build_frame(0x53, roll.to_bytes(2, "little", signed=True))
+
+
+@pytest.mark.asyncio
+async def test_from_config():
+    config = configparser.ConfigParser()
+    config.read_string(
+        """
+[serial_set]
+portname = COM3
+[device:left]
+portname = /dev/ttyUSB0
+baudrate = 115200
+[device:right]
+portname = /dev/ttyUSB1
+"""
+    )
+    manager = MultiDeviceManager.from_config(config)
+
+    assert sorted(manager.managers) == ["left", "right"]
+    assert manager.managers["left"].baudrate == 115200
+    assert manager.managers["right"].port == "/dev/ttyUSB1"
+    assert manager.managers["left"].result_queue is manager.result_queue
+
+
+@pytest.mark.asyncio
+async def test_devices_share_pipeline_and_dead_port_does_not_stall():
+    ptys = {"a": PtyReplay("unused"), "b": PtyReplay("unused")}
+    devices = {name: {"port": pty.port, "baudrate": 9600} for name, pty in ptys.items()}
+    # 存在しないポートは再接続を繰り返すだけで、他のポートを止めない
+    devices["dead"] = {"port": "/dev/does-not-exist", "baudrate": 9600}
+    manager = MultiDeviceManager(devices, reconnect_delay=0.01)
+    processor = DataProcessor(manager.result_queue)
+    task = asyncio.create_task(manager.run())
+
+    try:
+        await asyncio.sleep(0.1)
+        # 一つのフレームを二回に分けて送り、デバイスごとに結合されることを確認する
+        frame_a, frame_b = angle_frame(8192), angle_frame(-8192)
+        await ptys["a"].write(frame_a[:5])
+        await ptys["b"].write(frame_b[:5])
+        await asyncio.sleep(0.05)
+        await ptys["a"].write(frame_a[5:])
+        await ptys["b"].write(frame_b[5:])
+
+        rolls = {}
+        while len(rolls) < 2:
+            await asyncio.wait_for(processor.read_sensor_data(), 2)
+            for record in processor.records:
+                if isinstance(record, AngleRecord):
+                    rolls[processor.device_id] = record.roll
+        assert rolls == {"a": 45.0, "b": -45.0}
+
+        stats = manager.stats()
+        assert stats["a"]["bytes_received"] == 11
+        assert stats["a"]["connected"] is True
+        assert stats["dead"]["connected"] is False
+        assert stats["dead"]["reconnects"] > 0
+    finally:
+        task.cancel()
+        await task
+        await manager.close_connection()
+        for pty in ptys.values():
+            pty.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_settings_close_the_port_before_reconnecting():
+    pty = PtyReplay("unused")
+    manager = MultiDeviceManager(
+        {"a": {"port": pty.port, "baudrate": 9600}}, reconnect_delay=0.01
+    )
+    device = manager.managers["a"]
+    transports = []
+
+    async def apply_sensor_settings():
+        transports.append(device.transport)
+        if len(transports) == 1:
+            raise OSError("write failed")
+
+    device.apply_sensor_settings = apply_sensor_settings
+    task = asyncio.create_task(manager.run())
+    try:
+        while len(transports) < 2:
+            await asyncio.sleep(0.01)
+        # 設定に失敗したポートは閉じてから開き直す
+        assert transports[0].is_closing()
+        assert not transports[1].is_closing()
+        assert manager.stats()["a"]["errors"] == 1
+    finally:
+        task.cancel()
+        await task
+        await manager.close_connection()
+        pty.close()
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_tagged():
+    manager = MultiDeviceManager({"x": {"port": "unused", "baudrate": 9600}})
+    manager.managers["x"].on_data_received(b"\x55")
+
+    chunk = manager.result_queue.get_nowait()
+    assert isinstance(chunk, DeviceChunk)
+    assert chunk.device_id == "x"
+    assert chunk.data == b"\x55"
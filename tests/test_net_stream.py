@@ -0,0 +1,178 @@
+import asyncio
+import configparser
+
+import numpy as np
+import pytest
+
+from src.broadcast import BroadcastBus
+from src.hwt905_records import (
+    AngleRecord,
+    GpsPositionRecord,
+    MagneticFieldRecord,
+    TimeRecord,
+)
+from src.metrics import MetricsRegistry
+from src.net_stream import (
+    SAMPLE_DTYPE,
+    DeviceTable,
+    StreamServer,
+    encode_batch,
+    packetize,
+    parse_packet,
+    start_stream_server,
+)
+from src.stream_client import (
+    StreamBatch,
+    StreamClient,
+    open_tcp_stream,
+    open_udp_stream,
+)
+
+
+def angles(count, start=0):
+    records = []
+    for i in range(start, start + count):
+        record = AngleRecord(float(i), -1.5, 90.0, 3)
+        record.timestamp_ns = 1_000_000 * i
+        records.append(record)
+    return records
+
+
+async def until(condition, timeout=1.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.005)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_samples_round_trip_through_packets():
+    devices = DeviceTable()
+    magnetic = MagneticFieldRecord(100, -20, 3, 25.5)
+    batch = {
+        "left": angles(2) + [TimeRecord(24, 1, 2, 3, 4, 5, 6), magnetic],
+        None: [GpsPositionRecord(139.5, 35.25)],
+    }
+    samples = encode_batch(batch, devices)
+    assert SAMPLE_DTYPE.itemsize == 44
+    # 時刻フレームは送らない
+    assert len(samples) == 4
+
+    packets, sequence = packetize(samples, 7, 2 * SAMPLE_DTYPE.itemsize)
+    assert sequence == 9 and len(packets) == 2
+    kind, first, payload = parse_packet(packets[1])
+    assert first == 8
+
+    decoded = StreamBatch(first, samples, devices.ids).records()
+    assert decoded["left"] == angles(2) + [magnetic]
+    assert decoded["left"][1].timestamp_ns == 1_000_000
+    position = decoded[None][0]
+    assert np.isnan(samples["values"][3, 2:]).all()
+    assert (position.longitude, position.latitude) == (139.5, 35.25)
+
+    with pytest.raises(ValueError):
+        parse_packet(b"XX" + packets[0][2:])
+
+
+def test_gps_position_keeps_full_precision():
+    devices = DeviceTable()
+    position = GpsPositionRecord(139.7671234567, 35.6812345678)
+    samples = encode_batch({None: [position]}, devices)
+    (decoded,) = StreamBatch(0, samples, devices.ids).records()[None]
+    # float32では経度の小数第5位以下が失われる
+    assert (decoded.longitude, decoded.latitude) == (139.7671234567, 35.6812345678)
+
+
+def test_stream_client_needs_a_packet_reader():
+    with pytest.raises(TypeError):
+        StreamClient()
+
+
+@pytest.mark.asyncio
+async def test_tcp_clients_share_one_encoding():
+    bus = BroadcastBus()
+    server = await StreamServer(bus, tcp_port=0).start()
+    try:
+        clients = [await open_tcp_stream(*server.tcp_address) for _ in range(5)]
+        await until(lambda: len(server.tcp_clients) == 5)
+
+        await bus.publish({"left": angles(3)})
+        for client in clients:
+            batch = await asyncio.wait_for(client.read(), 1)
+            assert batch.records() == {"left": angles(3)}
+        await bus.publish({"right": angles(2, start=3)})
+        for client in clients:
+            batch = await asyncio.wait_for(client.read(), 1)
+            assert batch.records() == {"right": angles(2, start=3)}
+            assert client.devices == ["left", "right"]
+            assert client.lost == 0
+        assert server.samples_sent == 5
+
+        for client in clients:
+            await client.close()
+        await until(lambda: not server.tcp_clients)
+    finally:
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_tcp_client_is_skipped():
+    bus = BroadcastBus()
+    server = await StreamServer(bus, tcp_port=0, high_water=0).start()
+    try:
+        client = await open_tcp_stream(*server.tcp_address)
+        await until(lambda: server.tcp_clients)
+        (writer,) = server.tcp_clients
+        # 送信バッファが空かないクライアントを模す
+        writer.transport.get_write_buffer_size = lambda: 1
+        server.broadcast({None: angles(1)})
+        writer.transport.get_write_buffer_size = lambda: 0
+        server.broadcast({None: angles(1, start=1)})
+
+        batch = await asyncio.wait_for(client.read(), 1)
+        assert batch.records() == {None: angles(1, start=1)}
+        assert server.dropped_packets == 1 and client.lost == 1
+        await client.close()
+    finally:
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_udp_clients_subscribe_and_receive_datagrams():
+    bus = BroadcastBus()
+    server = await StreamServer(bus, udp_port=0, datagram_size=12 + 44 * 10).start()
+    client = await open_udp_stream(*server.udp_address)
+    try:
+        await until(lambda: server.udp_clients)
+        await bus.publish({"left": angles(25)})
+
+        received = []
+        while len(received) < 25:
+            batch = await asyncio.wait_for(client.read(), 1)
+            assert len(batch) <= 10
+            received.extend(batch.records()["left"])
+        assert received == angles(25)
+        assert client.devices == ["left"] and client.lost == 0
+
+        await client.close()
+        await until(lambda: not server.udp_clients)
+    finally:
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_server_from_config_and_metrics():
+    bus = BroadcastBus()
+    config = configparser.ConfigParser()
+    assert await start_stream_server(config, bus) is None
+
+    config.read_string("[stream]\ntcpport = 0\nudpport = 0\n")
+    assert await start_stream_server(config, bus) is None
+
+    server = StreamServer(bus, tcp_port=0)
+    registry = MetricsRegistry()
+    registry.watch_stream(server)
+    server.broadcast({None: angles(4)})
+    snapshot = registry.snapshot()
+    assert snapshot['hwt905_stream_clients{transport="tcp"}'] == 0
+    assert snapshot["hwt905_stream_samples_total"] == 4
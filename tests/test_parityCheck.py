@@ -4,11 +4,11 @@ from src.serial_communication_async import DataParser, HWT905_TTL_Dataparser
 
 
 @pytest.mark.asyncio
-async def test_parity_check():
+async def test_parity_check_delimiters():
     # 正常なケース
     assert await DataParser.parity_check(b"A,123,321*B", b"A", b"*", 0) == "00"
-    # startText と endText が同じ場合、処理が正しく行われるか
-    assert await DataParser.parity_check(b"A*A", b"A", b"A", 0) == "00"
+    # startText と endText が同じ場合、startTextの次のendTextまでを計算する
+    assert await DataParser.parity_check(b"A*A", b"A", b"A", 0) == "2a"
     # 空のlineData
     assert await DataParser.parity_check(b"", b"\x02", b"*", 0) == "00"
     # initialValue に初期値以外を設定
@@ -16,18 +16,18 @@ async def test_parity_check():
     expected_value = format(initial_value, "02x")
     # startTextとendTextが連続している場合（処理されるデータなし）
     assert (
-        await DataParser.parity_check(b"A*B", b"A", b"B", initial_value)
+        await DataParser.parity_check(b"AB", b"A", b"B", initial_value)
         == expected_value
     )
 
 
 @pytest.mark.asyncio
 async def test_parity_check():
-    # startTextがNoneの場合
-    assert await DataParser.parity_check(b"ABCDEF", None, b"*", 0) == False
+    # startTextがNoneの場合、先頭から計算する
+    assert await DataParser.parity_check(b"ABCDEF", None, b"*", 0) == "07"
 
-    # endTextが見つからない場合
-    assert await DataParser.parity_check(b"ABCDEF", b"A", b"Z", 0) == "00"
+    # endTextが見つからない場合、最後まで計算する
+    assert await DataParser.parity_check(b"ABCDEF", b"A", b"Z", 0) == "46"
 
     # startTextが見つからない場合
     assert await DataParser.parity_check(b"ABCDEF*", b"X", b"*") == "00"
@@ -39,6 +39,17 @@ async def test_parity_check():
     assert await DataParser.parity_check(None, b"A", b"*", 0) == False
 
 
+@pytest.mark.asyncio
+async def test_parity_check_nmea_sentence():
+    sentence = b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n"
+
+    # bytes、bytearray、1バイトずつのリストのどれでも同じ結果になる
+    assert await DataParser.parity_check(sentence, b"$", b"*") == "47"
+    assert await DataParser.parity_check(bytearray(sentence), b"$", b"*") == "47"
+    byte_list = [sentence[i : i + 1] for i in range(len(sentence))]
+    assert await DataParser.parity_check(byte_list, b"$", b"*") == "47"
+
+
 @pytest.mark.asyncio
 async def test_prity_check_with_real_data():
     test_data = b"UQ\xff\xff\xe3\xff\x06\x08\n\x0b\xa9UR\x00\x00\x00\x00\x00\x00\n\x0b\xbcUS\x94\xfe\x08\x00\xfd\x06\xccF"
@@ -0,0 +1,81 @@
+import pytest
+from matplotlib.figure import Figure
+
+from src.gui import AngularPlotter, DirectionPlotter
+from src.hwt905_records import AngleRecord, MagneticFieldRecord
+
+
+def test_angular_plotter_rescales_only_when_data_leaves_limits():
+    plotter = AngularPlotter(history=50, grow_only=True)
+    plotter.set_ax(Figure().add_subplot())
+
+    # 0.1秒間隔で46サンプル: 最新を0とした4.5秒分
+    for i in range(46):
+        plotter.add_data([10.0, -10.0, 0.0], timestamp=i * 0.1)
+    assert plotter.update_plot(None) is True
+    assert plotter.ax.get_xlim() == pytest.approx((-4.5 * 1.25, 0.0))
+    assert plotter.roll_line.get_xdata()[-1] == 0.0
+
+    # x軸は時間幅が表示幅を超えたときだけ広げる
+    plotter.add_data([20.0, -20.0, 5.0], timestamp=4.6)
+    assert plotter.update_plot(None) is True
+    assert plotter.ax.get_xlim() == pytest.approx((-4.5 * 1.25, 0.0))
+    y_min, y_max = plotter.ax.get_ylim()
+    assert y_min < -20.0 and y_max > 20.0
+
+    # 範囲内のデータでは軸を変更しない
+    plotter.add_data([15.0, -15.0, 1.0], timestamp=4.7)
+    assert plotter.update_plot(None) is False
+    assert plotter.roll_text.get_text() == "Roll: 15.00"
+
+
+def test_angular_plotter_y_limits_shrink_after_a_spike_by_default():
+    plotter = AngularPlotter(history=5)
+    plotter.set_ax(Figure().add_subplot())
+
+    plotter.add_data([90.0, 0.0, 0.0], timestamp=0.0)
+    plotter.update_plot(None)
+    assert plotter.ax.get_ylim()[1] >= 90.0
+
+    # スパイクが履歴から消えると、軸も元の範囲に戻る
+    for i in range(1, 6):
+        plotter.add_data([1.0, -1.0, 0.0], timestamp=i * 0.1)
+    assert plotter.update_plot(None) is True
+    assert plotter.ax.get_ylim()[1] < 2.0
+
+
+def test_direction_plotter_artists_created_up_front():
+    plotter = DirectionPlotter()
+    plotter.set_ax(Figure().add_subplot())
+
+    assert plotter.arrow is not None
+    assert plotter.magnetic_strength_text is not None
+
+    plotter.add_data([90.0, 12.5])
+    assert plotter.update_plot(None) is False
+    assert plotter.magnetic_strength_text.get_text() == "Magnetic Strength: 12.50"
+
+
+def test_plotters_take_every_record_of_a_batch():
+    angular = AngularPlotter(history=10)
+    direction = DirectionPlotter()
+    records = [AngleRecord(float(i), -float(i), 0.0, 1) for i in range(4)]
+    records.insert(2, MagneticFieldRecord(0, 16, 0, 25.0))
+
+    assert angular.add_records(records) == 4
+    assert direction.add_records(records) is True
+
+    # 最後の1件だけでなく、全サンプルが履歴に入る
+    assert list(angular.roll_data) == [0.0, 1.0, 2.0, 3.0]
+    assert list(angular.pitch_data) == [0.0, -1.0, -2.0, -3.0]
+    assert direction.magnetic_strength == 16.0
+
+
+def test_angular_plotter_uses_record_timestamps():
+    plotter = AngularPlotter(history=10)
+    records = [AngleRecord(0.0, 0.0, 0.0, 1) for _ in range(3)]
+    for i, record in enumerate(records):
+        record.timestamp_ns = 1_000_000_000 + i * 5_000_000
+
+    plotter.add_records(records)
+    assert plotter.time_data.tolist() == pytest.approx([1.0, 1.005, 1.01])
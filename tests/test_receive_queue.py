@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from src.receive_queue import DROP_OLDEST, LATEST, FlowControlQueue
+from src.serial_communication_async import AsyncSerialCommunicator
+
+
+class FakeTransport:
+    def __init__(self) -> None:
+        self.reading = True
+
+    def pause_reading(self):
+        self.reading = False
+
+    def resume_reading(self):
+        self.reading = True
+
+
+@pytest.mark.asyncio
+async def test_data_received_feeds_queue_with_backpressure():
+    transport = FakeTransport()
+    queue = FlowControlQueue(high_water=4, low_water=1)
+    queue.set_flow_control(transport.pause_reading, transport.resume_reading)
+    protocol = AsyncSerialCommunicator(data_callback=queue.put_nowait)
+
+    for i in range(4):
+        protocol.data_received(bytes([i]))
+
+    # high_waterに達したら読み込みを停止する
+    assert queue.qsize() == 4
+    assert transport.reading is False
+
+    assert await queue.get() == b"\x00"
+    assert await queue.get() == b"\x01"
+    assert transport.reading is False
+
+    # low_water以下になったら読み込みを再開する
+    assert queue.get_nowait() == b"\x02"
+    assert transport.reading is True
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_keeps_newest_items():
+    queue = FlowControlQueue(maxsize=3, policy=DROP_OLDEST)
+
+    for i in range(5):
+        queue.put_nowait(i)
+
+    assert [queue.get_nowait() for _ in range(3)] == [2, 3, 4]
+    assert queue.dropped == 2
+    # 捨てた分は処理済みとして数えるので、join()は取り出した分だけを待つ
+    for _ in range(3):
+        queue.task_done()
+    await asyncio.wait_for(queue.join(), 1)
+
+
+@pytest.mark.asyncio
+async def test_latest_value_wins():
+    queue = FlowControlQueue(maxsize=10, policy=LATEST)
+
+    for i in range(5):
+        await queue.put(i)
+
+    # 表示用途では最新の1件だけが残る
+    assert queue.maxsize == 1
+    assert queue.get_nowait() == 4
+    assert queue.dropped == 4
+
+
+@pytest.mark.asyncio
+async def test_block_policy_offer_counts_dropped_and_put_waits():
+    queue = FlowControlQueue(maxsize=2)
+
+    assert queue.offer(1) is True
+    assert queue.offer(2) is True
+    assert queue.offer(3) is False
+    assert queue.dropped == 1
+
+    putter = asyncio.create_task(queue.put(3))
+    await asyncio.sleep(0)
+    assert not putter.done()
+
+    assert queue.get_nowait() == 1
+    await asyncio.wait_for(putter, 1)
+    assert [queue.get_nowait() for _ in range(2)] == [2, 3]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        FlowControlQueue(policy="spill")
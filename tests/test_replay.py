@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import pytest
+
+from src.capture import CaptureWriter
+from src.hwt905_ttl_dataparser import ANGLE_OUTPUT, HWT905_TTL_Dataparser
+from src.replay import CaptureReplaySource, PtyReplay
+from src.serial_communication_async import AsyncSerialManager, DataProcessor
+
+ANGLE_FRAME = HWT905_TTL_Dataparser.build_frame(
+    ANGLE_OUTPUT, b"\x00\x40\x00\xc0\x00\x20"
+)
+
+
+def write_capture(path, interval_ns=0):
+    writer = CaptureWriter(path)
+    # フレームを二つのチャンクに分割して記録する
+    for i in range(5):
+        writer.write(ANGLE_FRAME[:4], i * interval_ns + 1)
+        writer.write(ANGLE_FRAME[4:], i * interval_ns + 2)
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_replay_source_feeds_data_processor(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path)
+    source = CaptureReplaySource(path, speed=None)
+    processor = DataProcessor(source.result_queue)
+
+    await source.run()
+    assert source.chunks_replayed == 10
+    results = [await processor.read_sensor_data() for _ in range(10)]
+
+    angles = [angular for angular, _ in results if angular[0] is not None]
+    assert angles == [(90.0, -90.0, 45.0)] * 5
+
+
+@pytest.mark.asyncio
+async def test_replay_speed(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, interval_ns=50_000_000)
+    source = CaptureReplaySource(path, speed=4.0)
+
+    started = time.monotonic()
+    await source.run()
+    # 記録は200ms分、4倍速で約50ms
+    assert 0.04 <= time.monotonic() - started < 0.2
+
+
+@pytest.mark.asyncio
+async def test_pty_replay_through_serial_asyncio(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, interval_ns=1_000_000)
+    replay = PtyReplay(path, speed=None)
+    manager = AsyncSerialManager(replay.port, 9600, event_driven=True)
+    processor = DataProcessor(manager.result_queue)
+    assert await manager.open_serial_connection()
+
+    try:
+        await replay.run()
+        # ptyではまとめて届くことがあるので、デコードしたフレーム数で確認する
+        while processor.decoder.frames_decoded < 5:
+            angular, _ = await asyncio.wait_for(processor.read_sensor_data(), 2)
+        assert angular == (90.0, -90.0, 45.0)
+        assert replay.bytes_replayed == 5 * len(ANGLE_FRAME)
+    finally:
+        manager.transport.close()
+        replay.close()
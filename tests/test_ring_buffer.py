@@ -0,0 +1,36 @@
+import numpy as np
+
+from src.ring_buffer import RingBuffer
+
+
+def test_append_keeps_latest_samples_in_order():
+    buffer = RingBuffer(3, ("time", "roll"))
+    for i in range(5):
+        buffer.append((i, i * 10))
+
+    assert len(buffer) == 3
+    assert list(buffer.view("time")) == [2, 3, 4]
+    assert list(buffer.view("roll")) == [20, 30, 40]
+    assert buffer.latest("roll") == 40
+    # ビューはコピーではなく連続した配列
+    assert buffer.view("roll").flags["C_CONTIGUOUS"]
+    assert np.shares_memory(buffer.view("roll"), buffer._data)
+
+
+def test_extend_matches_append():
+    appended = RingBuffer(4, ("time", "roll"))
+    extended = RingBuffer(4, ("time", "roll"))
+    samples = np.array([np.arange(7), np.arange(7) * 2.0])
+    for i in range(7):
+        appended.append(samples[:, i])
+    extended.extend(samples[:, :2])
+    extended.extend(samples[:, 2:])
+
+    assert list(extended.view("roll")) == list(appended.view("roll"))
+    assert list(extended.view("time")) == [3, 4, 5, 6]
+
+
+def test_empty_buffer():
+    buffer = RingBuffer(2, ("time",))
+    assert len(buffer.view("time")) == 0
+    assert buffer.latest("time") is None
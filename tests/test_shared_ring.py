@@ -0,0 +1,95 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from src.gui_process import ANGLE_COLUMNS, angle_rows, magnetic_rows
+from src.hwt905_records import AngleRecord, MagneticFieldRecord
+from src.shared_ring import SharedRingBuffer
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRingBuffer.create(4, ANGLE_COLUMNS)
+    yield ring
+    ring.close()
+    ring.unlink()
+
+
+def test_reader_attached_by_name_sees_new_rows(ring):
+    reader = SharedRingBuffer.attach(ring.name, ring.capacity, ANGLE_COLUMNS)
+    try:
+        ring.write([[0.0, 1.0, 2.0, 3.0], [0.1, 4.0, 5.0, 6.0]])
+        assert reader.read().tolist() == [[0.0, 1.0, 2.0, 3.0], [0.1, 4.0, 5.0, 6.0]]
+
+        # 読み込み済みの行は二度返さない
+        assert len(reader.read()) == 0
+        ring.write([[0.2, 7.0, 8.0, 9.0]])
+        assert reader.read()[:, 1].tolist() == [7.0]
+    finally:
+        reader.close()
+
+
+def test_reader_skips_overwritten_rows(ring):
+    reader = SharedRingBuffer.attach(ring.name, ring.capacity, ANGLE_COLUMNS)
+    try:
+        block = np.column_stack([np.arange(10.0)] * 4)
+        ring.write(block[:3])
+        ring.write(block[3:])
+
+        # 容量を超えた分は失われ、overrunsに数える
+        assert reader.read()[:, 0].tolist() == [6.0, 7.0, 8.0, 9.0]
+        assert reader.overruns == 6
+        assert ring.written == 10
+    finally:
+        reader.close()
+
+
+def test_reader_drops_rows_torn_by_a_write_in_progress(ring):
+    reader = SharedRingBuffer.attach(ring.name, ring.capacity, ANGLE_COLUMNS)
+    try:
+        ring.write(np.column_stack([np.arange(4.0)] * 4))
+        # 書き込み側が行4〜5を書き始めた (行0〜1を上書き中) が、まだ公開していない
+        ring._writing[0] = 6
+        ring._data[0, 0] = 4.0
+
+        assert reader.read()[:, 0].tolist() == [2.0, 3.0]
+        assert reader.overruns == 2
+    finally:
+        reader.close()
+
+
+def test_attaching_process_does_not_unlink_the_segment(ring):
+    code = (
+        "import sys\n"
+        "from src.shared_ring import SharedRingBuffer\n"
+        "reader = SharedRingBuffer.attach(sys.argv[1], 4, ('a', 'b', 'c', 'd'))\n"
+        "reader.close()\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code, ring.name], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert "leaked" not in result.stderr
+    # 子プロセスの終了後も共有メモリは残っている
+    SharedRingBuffer.attach(ring.name, ring.capacity, ANGLE_COLUMNS).close()
+
+
+def test_rows_built_from_records():
+    records = [
+        AngleRecord(1.0, 2.0, 3.0, 1),
+        MagneticFieldRecord(0, 16, 0, 25.0),
+        AngleRecord(4.0, 5.0, 6.0, 1),
+    ]
+
+    assert angle_rows(records, 0.5).tolist() == [
+        [0.5, 1.0, 2.0, 3.0],
+        [0.5, 4.0, 5.0, 6.0],
+    ]
+    assert magnetic_rows(records, 0.5).tolist() == [[0.5, 90.0, 16.0]]
+    assert angle_rows([], 0.5).shape == (0, 4)
+
+    # 受信時刻を持つレコードはその時刻で書き込む
+    records[0].timestamp_ns = 2_000_000_000
+    assert angle_rows(records, 0.5)[:, 0].tolist() == [2.0, 0.5]
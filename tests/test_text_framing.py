@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from src.serial_communication_async import DataParser, SerialCommunication
+from src.text_framing import TextDecoder, TextFramer, iter_messages
+
+GGA = b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n"
+RMC = b"$GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W*6A\r\n"
+
+
+def test_nmea_sentences_split_across_chunks():
+    framer = TextFramer.nmea()
+    stream = b"noise" + GGA + RMC
+
+    messages = []
+    for i in range(0, len(stream), 7):
+        messages += framer.feed(memoryview(stream)[i : i + 7])
+
+    assert [message.payload[:5] for message in messages] == [b"GPGGA", b"GPRMC"]
+    assert [message.checksum for message in messages] == [0x47, 0x6A]
+    assert all(message.valid for message in messages)
+    assert framer.skipped_bytes == 5
+
+
+def test_nmea_bad_checksum_and_cut_sentence():
+    framer = TextFramer.nmea()
+
+    # 途中で切れた文は次の$から読み直す
+    messages = framer.feed(b"$GPGGA,1235" + GGA.replace(b"*47", b"*48"))
+
+    assert len(messages) == 1
+    assert messages[0].valid is False
+    assert messages[0].payload.startswith(b"GPGGA,123519")
+    assert framer.checksum_errors == 1
+
+
+def test_stx_etx_messages():
+    framer = TextFramer.stx_etx()
+
+    messages = framer.feed(b"\x02HELLO*1\x03xx\x02WOR") + framer.feed(b"LD\x03")
+
+    assert [message.body for message in messages] == [b"HELLO*1", b"WORLD"]
+    assert messages[0].valid is None
+    assert messages[0].text() == "HELLO*1"
+
+
+def test_text_decoder_waits_for_split_character():
+    decoder = TextDecoder()
+    data = "角度\r".encode()
+
+    assert decoder.decode(data[:4]) == "角"
+    assert decoder.decode(data[4:]) == "度CR (Carriage Return)\r"
+
+
+@pytest.mark.asyncio
+async def test_byte_to_ascii_accepts_bytes_and_byte_lists():
+    data = b"\x02AB\r\nC\x03D"
+    expected = "STX (Start of Text)\x02ABCR (Carriage Return)\rLF (Line Feed)\nCETX (End of Text)"
+
+    assert await DataParser.byte_to_ascii(data) == expected
+    byte_list = [data[i : i + 1] for i in range(len(data))]
+    assert await DataParser.byte_to_ascii(byte_list) == expected
+
+
+class FakeSerial:
+    def __init__(self, chunks) -> None:
+        self.chunks = list(chunks)
+        self.timeout = 0.05
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size):
+        return self.chunks.pop(0)
+
+
+class FakeTransport:
+    def __init__(self, chunks) -> None:
+        self.serial = FakeSerial(chunks)
+
+
+@pytest.mark.asyncio
+async def test_read_line_without_blocking_readline():
+    communication = SerialCommunication(FakeTransport([b"AB", b"C\nDE\n"]))
+
+    assert await communication.read_line_as_bytes() == [b"A", b"B", b"C", b"\n"]
+    message = await communication.read_message(timeout=0.05)
+    assert message.body == b"DE"
+    assert await communication.read_message(timeout=0.01) is None
+
+
+@pytest.mark.asyncio
+async def test_iter_messages_from_queue():
+    queue = asyncio.Queue()
+    for chunk in (GGA[:20], GGA[20:] + RMC):
+        queue.put_nowait(chunk)
+
+    messages = iter_messages(queue, TextFramer.nmea())
+    first = await messages.__anext__()
+    second = await messages.__anext__()
+    await messages.aclose()
+
+    assert first.checksum == 0x47
+    assert second.checksum == 0x6A
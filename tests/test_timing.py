@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from src.hwt905_records import TIME_OUTPUT, AngleRecord, TimeRecord
+from src.hwt905_ttl_dataparser import (
+    ANGLE_OUTPUT,
+    HWT905_TTL_Dataparser,
+    HWT905StreamDecoder,
+)
+from src.serial_communication_async import DataProcessor, DeviceChunk
+from src.timing import LatencyHistogram, LatencyTracer, SensorClock
+
+ANGLE_FRAME = HWT905_TTL_Dataparser.build_frame(ANGLE_OUTPUT, b"\x00\x40\x00\xc0")
+
+
+def time_record(millisecond, arrival_ns):
+    record = TimeRecord(24, 1, 2, 3, 4, 5, millisecond)
+    record.timestamp_ns = arrival_ns
+    return record
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for _ in range(98):
+        histogram.record(0.001)
+    histogram.record_many([0.5, 1.0])
+
+    assert histogram.count == 100
+    # ビンの幅 (1桁20分割) の精度で求める
+    assert histogram.percentile(50) == pytest.approx(0.001, rel=0.13)
+    assert histogram.percentile(99) == pytest.approx(0.5, rel=0.13)
+    assert histogram.percentile(100) == 1.0
+    assert histogram.mean == pytest.approx((0.098 + 1.5) / 100)
+
+
+def test_sensor_clock_uses_least_delayed_time_frame():
+    base = 1_000_000_000
+    clock = SensorClock(slew_ns=0)
+    # センサー時刻は10ms間隔、受信の遅延は5ms, 1ms, 3ms
+    records = [
+        time_record(0, base + 5_000_000),
+        time_record(10, base + 11_000_000),
+        AngleRecord(0.0, 0.0, 0.0, 1),
+        time_record(20, base + 23_000_000),
+    ]
+    records[2].timestamp_ns = base + 12_000_000
+    first_sensor_ns = records[0].epoch_ns()
+
+    clock.align(records)
+
+    offset = base + 1_000_000 - first_sensor_ns
+    assert records[0].timestamp_ns == base + 5_000_000
+    assert records[1].timestamp_ns == first_sensor_ns + 10_000_000 + offset
+    # 時刻フレームの後のレコードはそのセンサー時刻にそろえる
+    assert records[2].timestamp_ns == records[1].timestamp_ns
+    assert records[3].timestamp_ns == records[1].timestamp_ns + 10_000_000
+
+
+def test_sensor_clock_ignores_unset_time():
+    clock = SensorClock()
+    record = time_record(0, 42)
+    record.month = 0
+
+    clock.align([record])
+    assert record.timestamp_ns == 42
+    assert clock.offset_ns is None
+
+
+def test_decoder_stamps_frames_with_completing_chunk():
+    decoder = HWT905StreamDecoder()
+
+    assert decoder.decode(ANGLE_FRAME[:5], timestamp_ns=1) == []
+    (record,) = decoder.decode(ANGLE_FRAME[5:] + ANGLE_FRAME[:3], timestamp_ns=2)
+    assert record.timestamp_ns == 2
+
+
+@pytest.mark.asyncio
+async def test_read_batch_keeps_arrival_times_and_traces_latency():
+    queue = asyncio.Queue()
+    tracer = LatencyTracer()
+    processor = DataProcessor(queue, tracer=tracer)
+    for arrival_ns in (100, 200):
+        queue.put_nowait(DeviceChunk(None, arrival_ns, ANGLE_FRAME * 2))
+    queue.put_nowait(ANGLE_FRAME)
+
+    batch = await processor.read_batch()
+
+    stamps = [record.timestamp_ns for record in batch[None]]
+    assert stamps[:4] == [100, 100, 200, 200]
+    # タイムスタンプのないチャンクは取り出した時刻になる
+    assert stamps[4] > 200
+    assert tracer.histograms["queue"].count == 5
+    assert tracer.histograms["decode"].count == 5
+    assert tracer.summary()["draw"]["count"] == 0
+
+
+def test_time_frame_decodes_to_epoch():
+    frame = HWT905_TTL_Dataparser.build_frame(
+        TIME_OUTPUT, bytes([24, 1, 2, 3, 4, 5]) + (250).to_bytes(2, "little")
+    )
+    (record,) = HWT905StreamDecoder().decode(frame)
+    assert record.epoch_ns() % 1_000_000_000 == 250_000_000